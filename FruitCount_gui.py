@@ -1,36 +1,47 @@
+import time
+
+# Startup milestones are measured from here, before the imports below
+STARTED = time.perf_counter()
+
+import argparse
+import os
 import sys
-import cv2
-import numpy as np
-import pyrealsense2 as rs
-from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton, QTextEdit, QGridLayout, QWidget, QFileDialog, QMessageBox, QTabWidget, QVBoxLayout, QHBoxLayout, QFrame, QGroupBox, QScrollArea
+from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton, QTextEdit, QGridLayout, QWidget, QFileDialog, QMessageBox, QTabWidget, QVBoxLayout, QHBoxLayout, QFrame
 from PyQt5.QtCore import QTimer
-from PyQt5.QtGui import QImage, QPixmap, QFont
+from PyQt5.QtGui import QFont
+
+# OpenCV, numpy and the analysis modules are imported where first needed, so the window can show without them
+from frame_capture import CONNECTING, RETRYING, RUNNING, CaptureThread
+from frame_view import FrameView
+from instrumentation import METRICS, timed
 
 class FruitDetectionApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, source=None, width=640, height=480, pipeline=None, tracker=None, store=None, serial=None):
         super().__init__()
         self.setWindowTitle("Fruit Analysis and Defect Detection")
         self.setGeometry(100, 100, 1600, 900)
         self.setStyleSheet("background-color: #f0f0f5; font-family: Arial;")
 
-        # RealSense camera setup
-        self.pipeline = rs.pipeline()
-        self.config = rs.config()
-        self.config.enable_stream(rs.stream.color, 640, 480, rs.format.bgr8, 30)
-        self.config.enable_stream(rs.stream.depth, 640, 480, rs.format.z16, 30)
-        try:
-            self.pipeline.start(self.config)
-        except Exception as e:
-            self.display_error(f"RealSense camera not connected: {e}")
-            sys.exit()
-
-        # Create labels with full size to prevent cropping
-        self.live_feed_label = QLabel("Live Feed", self)
+        # GUI-free analysis stages, shared with the batch runner; built on first use unless given
+        self._analysis = pipeline
+
+        # RealSense camera setup (or a replay/synthetic source); a dedicated thread owns it and connects in the
+        # background, so the window is up at once and works offline on files until a camera is found
+        self.capture = CaptureThread(width, height, 30, source=source, serial=serial)
+        self.capture.start(wait=False)
+        self.camera_state = None
+        self.last_frame_seq = 0
+        # Display-only arrays rewritten every tick; the views only read them while painting, between ticks
+        self.overlay_buffer = None
+        self.depth_display = None
+
+        # Frame views wrap the numpy buffers directly and let Qt scale them on paint
+        self.live_feed_label = FrameView("Connecting to the camera...", self)
         self.live_feed_label.setFixedSize(640, 480)
         self.live_feed_label.setFrameShape(QFrame.Box)
         self.live_feed_label.setStyleSheet("background-color: #000; color: #fff; font-weight: bold; padding: 5px;")
 
-        self.depth_feed_label = QLabel("Depth Feed", self)
+        self.depth_feed_label = FrameView("Depth Feed", self)
         self.depth_feed_label.setFixedSize(640, 480)
         self.depth_feed_label.setFrameShape(QFrame.Box)
         self.depth_feed_label.setStyleSheet("background-color: #000; color: #fff; font-weight: bold; padding: 5px;")
@@ -39,37 +50,42 @@ class FruitDetectionApp(QMainWindow):
         self.capture_button.setStyleSheet("background-color: #4CAF50; color: white; font-weight: bold; padding: 10px;")
         self.capture_button.clicked.connect(self.capture_image)
 
-        self.load_button = QPushButton("Load Image from File")
+        self.load_button = QPushButton("Load Images from Files")
         self.load_button.setStyleSheet("background-color: #2196F3; color: white; font-weight: bold; padding: 10px;")
         self.load_button.clicked.connect(self.load_image)
 
-        self.analysis_text = QTextEdit("Detailed Analysis:\n", self)
+        self.load_folder_button = QPushButton("Load Folder")
+        self.load_folder_button.setStyleSheet("background-color: #2196F3; color: white; font-weight: bold; padding: 10px;")
+        self.load_folder_button.clicked.connect(self.load_folder)
+
+        # Loaded files are decoded and analyzed a few images ahead once the first file is opened
+        self.images = None
+        self.pending_load = None
+        self.recorded_paths = set()
+        self.load_timer = QTimer()
+        self.load_timer.timeout.connect(self.poll_loaded_image)
+
+        # Continuous counting on a worker pool, created when first started; results are drawn over the live feed
+        self.live_analyzer = None
+        # Stable fruit IDs across analyzed frames, so a fruit in view is counted once; built on first use unless given
+        self._tracker = tracker
+        self.live_button = QPushButton("Start Live Counting")
+        self.live_button.setCheckable(True)
+        self.live_button.setStyleSheet("background-color: #FF9800; color: white; font-weight: bold; padding: 10px;")
+        self.live_button.toggled.connect(self.toggle_live_counting)
+
+        # Only the latest analysis is shown here; the history lives in the results store
+        self.analysis_text = QTextEdit("Detailed Analysis:\n")
         self.analysis_text.setReadOnly(True)
+        self.analysis_text.setMaximumHeight(110)
         self.analysis_text.setFont(QFont("Arial", 10))
         self.analysis_text.setStyleSheet("background-color: #f9f9f9; color: #333; padding: 5px; border: 1px solid #ccc;")
 
-        # Labels for analysis images with full size
-        self.threshold_label = QLabel("Threshold Image", self)
-        self.threshold_label.setFixedSize(640, 480)
-        self.threshold_label.setFrameShape(QFrame.Box)
-        self.threshold_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
+        # Camera connection state, next to the frame statistics
+        self.camera_status = QLabel()
+        self.statusBar().addPermanentWidget(self.camera_status)
 
-        self.final_output_label = QLabel("Final Output", self)
-        self.final_output_label.setFixedSize(640, 480)
-        self.final_output_label.setFrameShape(QFrame.Box)
-        self.final_output_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
-
-        self.count_output_label = QLabel("Count Output Image", self)
-        self.count_output_label.setFixedSize(640, 480)
-        self.count_output_label.setFrameShape(QFrame.Box)
-        self.count_output_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
-
-        self.defective_depth_label = QLabel("Defective Depth Image", self)
-        self.defective_depth_label.setFixedSize(640, 480)
-        self.defective_depth_label.setFrameShape(QFrame.Box)
-        self.defective_depth_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
-
-        # Tabs for organizing screens
+        # Tabs for organizing screens; Analysis and Reports are built when first needed
         self.tabs = QTabWidget(self)
         self.setCentralWidget(self.tabs)
         self.tab_live_feed = QWidget()
@@ -78,6 +94,10 @@ class FruitDetectionApp(QMainWindow):
         self.tabs.addTab(self.tab_live_feed, "Live Feed")
         self.tabs.addTab(self.tab_analysis, "Analysis")
         self.tabs.addTab(self.tab_reports, "Reports")
+        self.tabs.currentChanged.connect(self.build_tab)
+        self.threshold_label = None
+        self.reports_view = None
+        self.store = store
 
         # Live Feed tab layout with scroll area for better view
         live_feed_layout = QGridLayout()
@@ -85,85 +105,227 @@ class FruitDetectionApp(QMainWindow):
         live_feed_layout.addWidget(self.depth_feed_label, 0, 2, 1, 2)
         live_feed_layout.addWidget(self.capture_button, 1, 1)
         live_feed_layout.addWidget(self.load_button, 1, 2)
+        live_feed_layout.addWidget(self.load_folder_button, 1, 3)
+        live_feed_layout.addWidget(self.live_button, 2, 1, 1, 2)
         self.tab_live_feed.setLayout(live_feed_layout)
+        self.update_camera_state()
 
-        # Analysis tab layout
-        analysis_layout = QVBoxLayout()
-        analysis_group = QGroupBox("Analysis")
-        analysis_group.setStyleSheet("font-weight: bold; padding: 10px;")
-        analysis_layout.addWidget(self.analysis_text)
-        analysis_group.setLayout(analysis_layout)
-
-        images_layout = QGridLayout()
-        images_layout.addWidget(self.threshold_label, 0, 0)
-        images_layout.addWidget(self.final_output_label, 0, 1)
-        images_layout.addWidget(self.count_output_label, 1, 0)
-        images_layout.addWidget(self.defective_depth_label, 1, 1)
-        self.tab_analysis.setLayout(images_layout)
-
-        # Reports tab layout
-        reports_layout = QVBoxLayout()
-        reports_layout.addWidget(QLabel("Reports & Summaries"))
-        reports_layout.addWidget(self.analysis_text)
-        self.tab_reports.setLayout(reports_layout)
+        self.metrics_timer = QTimer()
+        self.metrics_timer.timeout.connect(self.update_metrics_view)
 
         # Timer for live feed
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(30)
 
-    # The rest of your methods remain unchanged.
+    @property
+    def analysis(self):
+        if self._analysis is None:
+            from fruit_pipeline import FruitAnalysisPipeline
 
+            self._analysis = FruitAnalysisPipeline()
+        return self._analysis
 
+    @property
+    def tracker(self):
+        if self._tracker is None:
+            from fruit_tracker import FruitTracker
 
-    def update_frame(self):
-        # Wait for a frame and retrieve the color and depth frames
-        frames = self.pipeline.wait_for_frames()
-        color_frame = frames.get_color_frame()
-        depth_frame = frames.get_depth_frame()
+            self._tracker = FruitTracker()
+        return self._tracker
+
+    def build_tab(self, index):
+        if self.tabs.widget(index) is self.tab_analysis:
+            self.build_analysis_tab()
+        elif self.tabs.widget(index) is self.tab_reports:
+            self.build_reports_tab()
+
+    def build_analysis_tab(self):
+        """Create the analysis views on first use: when the tab is opened or there is a result to show."""
+        if self.threshold_label is not None:
+            return
+
+        # Views for analysis images
+        self.threshold_label = FrameView("Threshold Image")
+        self.threshold_label.setFixedSize(640, 480)
+        self.threshold_label.setFrameShape(QFrame.Box)
+        self.threshold_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
+
+        self.final_output_label = FrameView("Final Output")
+        self.final_output_label.setFixedSize(640, 480)
+        self.final_output_label.setFrameShape(QFrame.Box)
+        self.final_output_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
 
-        if not color_frame or not depth_frame:
-            return  # Skip this frame if something goes wrong
+        self.count_output_label = FrameView("Count Output Image")
+        self.count_output_label.setFixedSize(640, 480)
+        self.count_output_label.setFrameShape(QFrame.Box)
+        self.count_output_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
 
-        color_image = np.asanyarray(color_frame.get_data())
-        depth_image = np.asanyarray(depth_frame.get_data())
+        self.defective_depth_label = FrameView("Defective Depth Image")
+        self.defective_depth_label.setFixedSize(640, 480)
+        self.defective_depth_label.setFrameShape(QFrame.Box)
+        self.defective_depth_label.setStyleSheet("background-color: #ddd; color: #555; font-weight: bold; padding: 5px;")
 
-        # Convert color image to QImage for display
-        image = cv2.cvtColor(color_image, cv2.COLOR_BGR2RGB)
-        h, w, ch = image.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(image.data, w, h, bytes_per_line, QImage.Format_RGB888)
+        self.prev_button = QPushButton("< Previous")
+        self.prev_button.clicked.connect(lambda: self.step_image(-1))
+        self.next_button = QPushButton("Next >")
+        self.next_button.clicked.connect(lambda: self.step_image(1))
+        self.image_position_label = QLabel("No images loaded")
 
-        # Resize image based on label size
-        resize_percentage = min(self.live_feed_label.width() / w, self.live_feed_label.height() / h) * 100
-        self.display_image(self.live_feed_label, image, resize_percentage)
+        # Analysis tab layout
+        images_layout = QGridLayout()
+        images_layout.addWidget(self.threshold_label, 0, 0)
+        images_layout.addWidget(self.final_output_label, 0, 1)
+        images_layout.addWidget(self.count_output_label, 1, 0)
+        images_layout.addWidget(self.defective_depth_label, 1, 1)
+        navigation_layout = QHBoxLayout()
+        navigation_layout.addWidget(self.prev_button)
+        navigation_layout.addWidget(self.image_position_label)
+        navigation_layout.addStretch()
+        navigation_layout.addWidget(self.next_button)
+        images_layout.addLayout(navigation_layout, 2, 0, 1, 2)
+        self.tab_analysis.setLayout(images_layout)
+        self.update_image_navigation()
 
-        # Convert depth image to grayscale for display
-        depth_image = cv2.convertScaleAbs(depth_image, alpha=0.03)  # Adjust alpha for better visibility
-        depth_image_color = cv2.cvtColor(depth_image, cv2.COLOR_GRAY2RGB)
-        depth_image_rgb = cv2.cvtColor(depth_image_color, cv2.COLOR_BGR2RGB)
-        qt_depth_image = QImage(depth_image_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
+    def build_reports_tab(self):
+        if self.reports_view is not None:
+            return
+        from reports_view import ReportsView
 
-        # Resize depth image based on label size
-        self.display_image(self.depth_feed_label, depth_image_rgb, resize_percentage)
+        # Reports tab layout: the latest analysis, then paged views of the stored results
+        self.reports_view = ReportsView(self.store)
+        reports_layout = QVBoxLayout()
+        reports_layout.addWidget(QLabel("Reports & Summaries"))
+        reports_layout.addWidget(self.analysis_text)
+        if self.store is not None:
+            reports_layout.addWidget(self.reports_view)
+
+        # Live stage latencies and counters
+        self.metrics_view = QLabel("Performance metrics will appear here.")
+        self.metrics_view.setFont(QFont("Courier New", 9))
+        self.metrics_view.setStyleSheet("background-color: #f9f9f9; color: #333; padding: 5px; border: 1px solid #ccc;")
+        reports_layout.addWidget(QLabel("Performance"))
+        reports_layout.addWidget(self.metrics_view)
+        self.tab_reports.setLayout(reports_layout)
 
-    def capture_image(self):
-        frames = self.pipeline.wait_for_frames()
-        color_frame = frames.get_color_frame()
-        depth_frame = frames.get_depth_frame()
+        self.update_metrics_view()
+        self.metrics_timer.start(1000)
 
-        if not color_frame or not depth_frame:
+    def update_camera_state(self):
+        """Follow the capture thread's connection state: enable the camera controls or fall back to offline mode."""
+        state = (self.capture.state, self.capture.attempts)
+        if state == self.camera_state:
+            return
+        self.camera_state = state
+        running = self.capture.state == RUNNING
+        self.capture_button.setEnabled(running)
+        self.live_button.setEnabled(running)
+        self.camera_status.setToolTip(self.capture.error or "")
+        if running:
+            self.analysis.set_camera(self.capture.depth_scale, self.capture.intrinsics)
+            self.camera_status.setText("Camera: connected")
+            METRICS.gauge("startup_camera_ms", round((self.capture.connected_at - STARTED) * 1000, 1))
+        elif self.capture.state == CONNECTING:
+            self.camera_status.setText("Camera: connecting...")
+        else:
+            if self.capture.state == RETRYING:
+                self.camera_status.setText(f"Camera: not found, retrying every {self.capture.retry_interval:g} s "
+                                           f"(attempt {self.capture.attempts})")
+            else:
+                self.camera_status.setText("Camera: unavailable")
+            self.live_feed_label.clear("No camera: offline mode.\nLoad images or a folder to analyze them.")
+            self.depth_feed_label.clear("Depth Feed")
+
+    def mark_window_shown(self):
+        elapsed = time.perf_counter() - STARTED
+        METRICS.gauge("startup_window_ms", round(elapsed * 1000, 1))
+        print(f"Window shown {elapsed * 1000:.0f} ms after start", flush=True)
+
+    @timed("update_frame")
+    def update_frame(self):
+        self.update_camera_state()
+
+        # Take the newest frame pair from the capture thread without blocking
+        frame = self.capture.latest()
+        if frame is None or frame.seq == self.last_frame_seq:
+            return  # Nothing new since the last tick
+        first = self.last_frame_seq == 0
+        self.last_frame_seq = frame.seq
+
+        # Frames come from the capture thread, which has loaded these already
+        import cv2
+        import numpy as np
+        from buffer_pool import reuse
+
+        color_image = frame.color
+        depth_image = frame.depth
+
+        # Hand the frame to the live analysis workers and overlay the newest finished result
+        if self.live_analyzer is not None and self.live_analyzer.running:
+            self.live_analyzer.submit(frame.seq, frame.color)
+            seq, summary = self.live_analyzer.latest()
+            if summary is not None:
+                from fruit_tracker import draw_tracks
+
+                if seq > self.tracker.last_seq:
+                    self.record_new_tracks(seq, self.tracker.update(seq, summary))
+                # Draw on a copy; the captured frame is shared with the analysis path
+                self.overlay_buffer = reuse(self.overlay_buffer, color_image.shape)
+                np.copyto(self.overlay_buffer, color_image)
+                color_image = draw_tracks(self.overlay_buffer, self.tracker)
+
+        # Show the BGR frame as-is; the view skips work while its tab is hidden
+        self.live_feed_label.set_frame(color_image, frame.seq)
+
+        # Scale depth to 8 bits for display only when someone can see it
+        if self.depth_feed_label.isVisible():
+            self.depth_display = cv2.convertScaleAbs(depth_image, dst=reuse(self.depth_display, depth_image.shape),
+                                                     alpha=0.03)  # Adjust alpha for better visibility
+            self.depth_feed_label.set_frame(self.depth_display, frame.seq)
+
+        self.capture.mark_displayed(frame)
+        if first:
+            elapsed = time.perf_counter() - STARTED
+            METRICS.gauge("startup_first_frame_ms", round(elapsed * 1000, 1))
+            print(f"First frame shown {elapsed * 1000:.0f} ms after start "
+                  f"(camera connected after {(self.capture.connected_at - STARTED) * 1000:.0f} ms)", flush=True)
+        status = self.capture.stats_text()
+        if self.live_analyzer is not None and self.live_analyzer.running:
+            status += "  |  " + self.live_analyzer.stats_text() + "  |  " + self.tracker.stats_text()
+        self.statusBar().showMessage(status)
+
+    def toggle_live_counting(self, enabled):
+        if enabled:
+            if self.live_analyzer is None:
+                # Imported here: the worker pool and shared-memory transport aren't needed before live counting
+                from live_analysis import LiveAnalyzer
+
+                self.live_analyzer = LiveAnalyzer(target_fps=5.0, pipeline_config=self.analysis.config())
+            self.tracker.reset()
+            self.live_analyzer.start()
+            self.live_button.setText("Stop Live Counting")
+        else:
+            self.live_analyzer.stop()
+            self.live_button.setText("Start Live Counting")
+
+    @timed("capture_image")
+    def capture_image(self):
+        # Analyze the same newest frame the live view is showing
+        frame = self.capture.latest()
+        if frame is None:
             self.display_error("Failed to capture frames.")
             return
 
-        color_image = np.asanyarray(color_frame.get_data())
+        # Grayscale, threshold, blur and contours are computed once and shared by every stage
+        ctx = self.analysis.context(frame.color, frame.depth)
+        self.build_analysis_tab()
 
         # Process image for fruit counting and labeling
-        threshold_image, labeled_image, fruit_count = self.process_and_label_fruits(color_image)
+        threshold_image, labeled_image, fruit_count = self.process_and_label_fruits(ctx)
 
         # Perform faulty detection (circle detection)
-        faulty_image, faulty_count = self.detect_faulty_fruits(color_image)
-        faulty_depth_image = self.detect_faulty_depth(depth_frame)
+        faulty_image, faulty_count = self.detect_faulty_fruits(ctx)
+        faulty_depth_image, depth_faulty_count = self.detect_faulty_depth(ctx)
 
         # Display the thresholded image with numbering on it
         self.display_image(self.threshold_label, threshold_image)
@@ -178,134 +340,187 @@ class FruitDetectionApp(QMainWindow):
         self.display_image(self.defective_depth_label, faulty_depth_image)
 
         # Update the overall report with the count
-        self.update_overall_report(fruit_count, faulty_count)
+        self.update_overall_report(fruit_count, faulty_count, depth_faulty_count, "capture", f"frame {frame.seq}")
 
     def load_image(self):
-        filename, _ = QFileDialog.getOpenFileName(self, "Select an Image", "", "Image Files (*.png *.jpg *.jpeg)")
-        if filename:
-            color_image = cv2.imread(filename)
-
-            # Process image for fruit counting and labeling
-            threshold_image, labeled_image, fruit_count = self.process_and_label_fruits(color_image)
-
-            # Perform faulty detection (circle detection)
-            faulty_image, faulty_count = self.detect_faulty_fruits(color_image)
-
-            # Display the thresholded image with numbering on it
-            self.display_image(self.threshold_label, threshold_image)
-
-            # Display the final output image with contours and faulty fruits
-            self.display_image(self.final_output_label, faulty_image)
+        filenames, _ = QFileDialog.getOpenFileNames(self, "Select Images", "", "Image Files (*.png *.jpg *.jpeg)")
+        if filenames:
+            self.show_images(sorted(filenames))
+
+    def load_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select a Folder of Images")
+        if folder:
+            from batch_analyze import collect_images
+
+            paths = collect_images([folder])
+            if not paths:
+                self.display_error(f"No images found in {folder}")
+                return
+            self.show_images(paths)
+
+    def show_images(self, paths):
+        """Start reviewing a new list of files from its first image."""
+        if self.images is None:
+            from image_queue import ImageQueue
+
+            self.images = ImageQueue(self.analysis)
+        self.build_analysis_tab()
+        self.recorded_paths.clear()
+        self.show_loaded_image(self.images.set_paths(paths))
+
+    def step_image(self, delta):
+        if self.images is not None and len(self.images):
+            self.show_loaded_image(self.images.step(delta))
+
+    def show_loaded_image(self, future):
+        self.update_image_navigation()
+        self.pending_load = future
+        if future.done():
+            self.poll_loaded_image()  # Prefetched: show it right away
+        else:
+            self.image_position_label.setText(self.image_position_label.text() + "  (analyzing...)")
+            self.load_timer.start(20)
+
+    def poll_loaded_image(self):
+        future = self.pending_load
+        if future is None or not future.done():
+            return
+        self.load_timer.stop()
+        self.pending_load = None
+        self.update_image_navigation()
+        if future.cancelled():
+            return
+        try:
+            entry = future.result()
+        except Exception as e:
+            # A bad file in a folder shouldn't stop the review with a dialog per file
+            for view in (self.threshold_label, self.final_output_label, self.count_output_label,
+                         self.defective_depth_label):
+                view.clear("Could not analyze this image")
+            self.analysis_text.setPlainText(f"Detailed Analysis:\n{e}")
+            return
+        self.display_loaded_image(entry)
 
-            # Display the count output image with fruit count overlay
-            self.display_image(self.count_output_label, labeled_image)
+    @timed("display_loaded_image")
+    def display_loaded_image(self, entry):
+        result = entry["result"]
 
-            # Display the defective depth image
-            self.display_image(self.defective_depth_label, faulty_image)
+        # Display the thresholded image with numbering on it
+        self.display_image(self.threshold_label, result["threshold_image"])
 
-            # Update the overall report with the count
-            self.update_overall_report(fruit_count, faulty_count)
+        # Display the final output image with contours and faulty fruits
+        self.display_image(self.final_output_label, result["faulty_image"])
 
+        # Display the count output image with fruit count overlay
+        self.display_image(self.count_output_label, result["labeled_image"])
+
+        # A file has no depth to grade
+        self.defective_depth_label.clear("No depth for loaded images")
+
+        # Update the overall report with the count; a file is stored once per review, however often it's shown
+        print(f"Total fruits counted: {result['fruit_count']}")
+        record = entry["path"] not in self.recorded_paths
+        self.recorded_paths.add(entry["path"])
+        self.update_overall_report(result["fruit_count"], result["faulty_count"], kind="load", source=entry["path"],
+                                   record=record)
+
+    def update_image_navigation(self):
+        count = len(self.images) if self.images is not None else 0
+        self.prev_button.setEnabled(count > 0 and self.images.index > 0)
+        self.next_button.setEnabled(count > 0 and self.images.index < count - 1)
+        if count:
+            self.image_position_label.setText(os.path.basename(self.images.path) + "  |  " + self.images.stats_text())
+        else:
+            self.image_position_label.setText("No images loaded")
+
+    @timed("process_and_label_fruits")
     def process_and_label_fruits(self, color_image):
-        # Convert to grayscale
-        gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
-
-        # Apply a threshold to create a binary image
-        _, thresh = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-
-        # Define a kernel for morphological operations
-        kernel = np.ones((3, 3), np.uint8)
-
-        # Apply closing to close small gaps within objects
-        closed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-
-        # Apply opening to separate overlapping objects
-        opened = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel)
-
-        # Find contours on the processed binary image
-        contours, _ = cv2.findContours(opened, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        # Count the contours, assuming each contour is a fruit
-        fruit_count = len(contours)
+        threshold_image, labeled_image, fruit_count = self.analysis.process_and_label_fruits(color_image)
         print(f"Total fruits counted: {fruit_count}")
+        return threshold_image, labeled_image, fruit_count
 
-        # Copy the threshold image for labeling (apply numbering on threshold)
-        threshold_with_numbers = np.copy(thresh)
-
-        # Loop through each contour and add a number on the threshold image
-        for i, contour in enumerate(contours):
-            # Get the center of the contour
-            M = cv2.moments(contour)
-            if M["m00"] != 0:
-                cX = int(M["m10"] / M["m00"])
-                cY = int(M["m01"] / M["m00"])
-                cv2.putText(threshold_with_numbers, str(i + 1), (cX - 10, cY - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-        # Return processed image and count
-        return threshold_with_numbers, color_image, fruit_count
-
+    @timed("detect_faulty_fruits")
     def detect_faulty_fruits(self, color_image):
-        # Detect faulty fruits (example using circle detection)
-        gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (15, 15), 0)
-
-        # Detect circles using Hough Circle Transform
-        circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, 1, 30, param1=50, param2=30, minRadius=10, maxRadius=60)
-
-        faulty_image = np.copy(color_image)
-        faulty_count = 0
-
-        if circles is not None:
-            circles = np.uint16(np.around(circles))
-            for i in circles[0, :]:
-                center = (i[0], i[1])
-                radius = i[2]
-                cv2.circle(faulty_image, center, radius, (0, 255, 0), 2)  # Draw circle
-                cv2.rectangle(faulty_image, (center[0] - 5, center[1] - 5), (center[0] + 5, center[1] + 5), (0, 0, 255), 3)  # Draw center
-
-                faulty_count += 1
-
-        return faulty_image, faulty_count
-
-    def detect_faulty_depth(self, depth_frame):
-        depth_image = np.asanyarray(depth_frame.get_data())
-        depth_image_colored = cv2.convertScaleAbs(depth_image, alpha=0.03)
-        return depth_image_colored
-
-    def update_overall_report(self, fruit_count, faulty_count):
-        self.analysis_text.append(f"Total Fruits Counted: {fruit_count}")
-        self.analysis_text.append(f"Faulty Fruits Detected: {faulty_count}")
-
-    def display_image(self, label, image, resize_percentage=100):
-        """Converts the OpenCV image to QImage, resizes it, and sets it to the given QLabel."""
-        # Resize image based on the percentage
-        resized_image = self.resize_image(image, resize_percentage)
-        
-        # Convert the resized image to RGB
-        image_rgb = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
-        
-        # Get the new dimensions after resizing
-        h, w, ch = image_rgb.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(image_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        
-        # Set the QImage to QLabel
-        label.setPixmap(QPixmap.fromImage(qt_image))
-
-    def resize_image(self, image, percentage=100):
-        """Resize the image based on the percentage."""
-        width = int(image.shape[1] * percentage / 100)
-        height = int(image.shape[0] * percentage / 100)
-        resized_image = cv2.resize(image, (width, height))
-        return resized_image
+        return self.analysis.detect_faulty_fruits(color_image)
+
+    @timed("detect_faulty_depth")
+    def detect_faulty_depth(self, ctx):
+        result = self.analysis.detector("depth").run(ctx)
+        return result.get("faulty_depth_image"), result.get("depth_faulty_count", 0)
+
+    def update_overall_report(self, fruit_count, faulty_count, depth_faulty_count=None, kind="capture", source=None,
+                              record=True):
+        lines = ["Detailed Analysis:", f"Total Fruits Counted: {fruit_count}", f"Faulty Fruits Detected: {faulty_count}"]
+        if depth_faulty_count is not None:
+            lines.append(f"Depth Defects Detected: {depth_faulty_count}")
+        self.analysis_text.setPlainText("\n".join(lines))
+        if self.store is not None and record:
+            self.store.record(kind, fruit_count, faulty_count, depth_faulty_count or 0, source)
+
+    def record_new_tracks(self, seq, tracks):
+        # Live counting stores each fruit once, when its track starts
+        new = [track for track in tracks if track.first_seq == seq]
+        if new and self.store is not None:
+            self.store.record("live", len(new), sum(bool(track.faulty) for track in new), source=f"frame {seq}")
+
+    @timed("display_image")
+    def display_image(self, view, image):
+        """Hands the OpenCV image to a FrameView, which displays it without copying."""
+        view.set_frame(image)
+
+    def update_metrics_view(self):
+        # Only format the tables while someone is looking at them
+        if self.reports_view is None or not self.tab_reports.isVisible():
+            return
+        if METRICS.enabled:
+            self.metrics_view.setText(METRICS.report_text())
+        if self.store is not None:
+            self.reports_view.refresh()
+
+    def closeEvent(self, event):
+        """Stop the capture thread and release the camera when the window closes."""
+        self.timer.stop()
+        self.load_timer.stop()
+        if self.images is not None:
+            self.images.stop()
+        if self.live_analyzer is not None:
+            self.live_analyzer.stop()
+        self.capture.stop()
+        if self.store is not None:
+            self.store.stop()
+        super().closeEvent(event)
 
     def display_error(self, message):
         """Display an error message in a message box."""
         QMessageBox.critical(self, "Error", message)
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = FruitDetectionApp()
+    from fruit_pipeline import add_pipeline_arguments, pipeline_from_args
+    from frame_source import RESOLUTIONS, add_source_arguments, open_source
+    from fruit_tracker import add_tracker_arguments, tracker_from_args
+    from results_store import add_store_arguments, store_from_args
+    from instrumentation import add_metrics_arguments, start_exporter
+
+    parser = argparse.ArgumentParser(description="Fruit analysis and defect detection GUI")
+    add_source_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_tracker_arguments(parser)
+    add_store_arguments(parser)
+    add_metrics_arguments(parser)
+    args, qt_args = parser.parse_known_args()
+    exporter = start_exporter(args)
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    width, height = RESOLUTIONS[args.resolution]
+    # The camera itself (by --serial, or the first one found) is opened by the capture thread
+    source = None
+    if args.replay or args.synthetic:
+        source = open_source(args.replay, args.synthetic, args.mode, width, height)
+    window = FruitDetectionApp(source, width, height, pipeline_from_args(args), tracker_from_args(args),
+                               store_from_args(args), args.serial)
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    QTimer.singleShot(0, window.mark_window_shown)  # Runs once the first paint has been processed
+    status = app.exec_()
+    if exporter is not None:
+        exporter.stop()
+    sys.exit(status)
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""Headless batch fruit counting and defect grading over archived images.
+
+Usage:
+    python batch_analyze.py <directory or glob> [...] --output results.jsonl
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+
+from fruit_pipeline import add_pipeline_arguments, pipeline_from_args, summarize
+from instrumentation import METRICS, add_metrics_arguments, start_exporter
+from results_store import add_store_arguments, store_from_args
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# One pipeline per worker process, created by init_worker
+_pipeline = None
+
+
+def collect_images(inputs):
+    """Expand directories and glob patterns into a sorted list of image paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item, recursive=True)
+        paths.extend(path for path in candidates
+                     if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(set(paths))
+
+
+def init_worker(args):
+    global _pipeline
+    # Each process already owns a core, so keep OpenCV from oversubscribing them
+    cv2.setNumThreads(1)
+    _pipeline = pipeline_from_args(args, buffer_pool=True)  # Only summaries leave analyze_file
+
+
+def analyze_file(path):
+    """Analyze one image file and return a JSON-serializable record."""
+    start = time.perf_counter()
+    color_image = cv2.imread(path)
+    if color_image is None:
+        return {"image": path, "error": "could not decode image"}
+
+    record = {"image": path, "width": color_image.shape[1], "height": color_image.shape[0]}
+    ctx = _pipeline.context(color_image)
+    record.update(summarize(_pipeline.analyze(ctx)))
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    if ctx.timings:
+        record["stage_ms"] = {stage: round(seconds * 1000, 3) for stage, seconds in ctx.timings.items()}
+    return record
+
+
+def run_batch(paths, output, workers, chunksize=4, args=None, store=None):
+    """Spread the images over a process pool and write one JSON line per image.
+
+    args carries the add_pipeline_arguments options used to build each worker's pipeline;
+    with a ResultsStore every analyzed image is also recorded there.
+    """
+    if args is None:
+        args = argparse.Namespace(pyramid=None, roi_defects=False, profile=None, distance_peaks=False,
+                                  watershed=False)
+    start = time.perf_counter()
+    processed = failed = 0
+
+    with open(output, "w") as out, multiprocessing.Pool(workers, initializer=init_worker, initargs=(args,)) as pool:
+        for record in pool.imap_unordered(analyze_file, paths, chunksize=chunksize):
+            out.write(json.dumps(record) + "\n")
+            processed += 1
+            if "error" in record:
+                failed += 1
+                METRICS.incr("images_failed")
+                continue
+
+            # Workers time their own stages; fold them into this process's metrics for export
+            METRICS.incr("images_processed")
+            if store is not None:
+                store.record("batch", record.get("fruit_count", 0), record.get("faulty_count", 0),
+                             record.get("depth_faulty_count", 0), record["image"])
+            METRICS.observe("batch.image", record["elapsed_ms"] / 1000)
+            for stage, ms in record.get("stage_ms", {}).items():
+                METRICS.observe(stage, ms / 1000)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "images": processed,
+        "failed": failed,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "images_per_second": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count and grade fruit images without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="image directories or glob patterns")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSON-lines file to write")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: number of cores)")
+    parser.add_argument("--chunksize", type=int, default=4, help="images handed to a worker at a time")
+    add_pipeline_arguments(parser)
+    add_store_arguments(parser, default="")  # Batch runs only write a database when asked to
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    paths = collect_images(args.inputs)
+    if not paths:
+        print("No images found.", file=sys.stderr)
+        return 1
+
+    exporter = start_exporter(args)
+    store = store_from_args(args)
+    try:
+        stats = run_batch(paths, args.output, max(1, args.workers), args.chunksize, args, store)
+    finally:
+        if store is not None:
+            store.stop()
+        if exporter is not None:
+            exporter.stop()
+    print(f"Processed {stats['images']} images ({stats['failed']} failed) with {stats['workers']} workers "
+          f"in {stats['elapsed_s']:.2f}s: {stats['images_per_second']:.2f} images/second")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,502 @@
+"""Benchmarks for every detection path on the bundled image and synthetic frames.
+
+Usage:
+    python benchmark.py                          # run and print a report
+    python benchmark.py --output bench.json      # also save the results
+    python benchmark.py --baseline bench.json    # compare against saved results
+    python benchmark.py --accuracy               # fruit counts of each method against the known count
+    python benchmark.py --allocations            # bytes allocated per frame with and without the buffer pool
+    python benchmark.py --startup                # GUI import times, time to window and to first frame
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import Deetction_faulty
+import GUI_code
+from color_lut import FRUIT_CLASSES, label_image, segmenter_for
+from fruit_pipeline import (CircleDefectDetector, DepthDefectDetector, DistancePeakDetector, FrameContext,
+                            FruitAnalysisPipeline, FruitCountDetector, RoiCircleDefectDetector, WatershedCountDetector,
+                            summarize)
+from frame_source import RESOLUTIONS, synthetic_frame
+from region_stats import depth_stats, label_regions
+from tuning_profile import make_profile, scaled_profile
+
+# Fruits per 640x480 worth of area, scaled up with the resolution
+DENSITIES = {"sparse": 5, "medium": 20, "dense": 60}
+DEPTH_SCALE = 0.001
+
+# Fruits in Original_Image.jpg counted by eye, including the ones cut by the border; the default
+# profile finds all of them
+ORIGINAL_FRUITS = 27
+
+# (method, result key, pipeline options) compared by --accuracy
+ACCURACY_METHODS = [
+    ("contours", "fruit_count", {}),
+    ("watershed", "fruit_count", {"watershed": True}),
+    ("hough", "faulty_count", {}),
+    ("hough_roi", "faulty_count", {"roi_defects": True}),
+    ("peaks", "faulty_count", {"distance_peaks": True}),
+]
+
+
+class StageTimer:
+    """Collects the duration of each named stage of one run."""
+
+    def __init__(self):
+        self.times = {}
+
+    def __call__(self, stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.times[stage] = time.perf_counter() - start
+        return result
+
+
+def otsu_count_path(t, color_image, depth_image):
+    """Otsu + morphology counter (Try.py, process_and_label_fruits)."""
+    ctx = FrameContext(color_image)
+    for stage in ("gray", "otsu", "morphology", "contours"):
+        t(stage, ctx.get, stage)
+    t("label", FruitCountDetector().run, ctx)
+
+
+def pyramid_count_path(t, color_image, depth_image, scale=0.5):
+    """Coarse-to-fine counter: segment at half resolution, refine inside the fruits."""
+    ctx = FruitAnalysisPipeline(pyramid_scale=scale).context(color_image)
+    for stage in ("gray", "coarse_gray", "coarse_segmentation", "refine_rois", "otsu", "morphology", "contours"):
+        t(stage, ctx.get, stage)
+    t("label", FruitCountDetector().run, ctx)
+
+
+def hough_path(t, color_image, depth_image):
+    """Blurred-gray Hough circles (detect_faulty_fruits)."""
+    ctx = FrameContext(color_image)
+    for stage in ("gray", "blurred"):
+        t(stage, ctx.get, stage)
+    t("hough", CircleDefectDetector().run, ctx)
+
+
+def hough_roi_path(t, color_image, depth_image):
+    """Hough circles inside the padded segmentation boxes, on a thread pool.
+
+    The segmentation stages are listed for completeness; in the pipeline they are
+    shared with the counter, so compare the "hough" stage against hough/blurred.
+    """
+    ctx = FrameContext(color_image)
+    for stage in ("gray", "otsu", "morphology", "contours", "boxes"):
+        t(stage, ctx.get, stage)
+    t("hough", RoiCircleDefectDetector().run, ctx)
+
+
+def distance_peaks_path(t, color_image, depth_image):
+    """Fruit circles from the peaks of the mask's distance transform (--distance-peaks).
+
+    The segmentation stages are shared with the counter in the pipeline, so compare
+    distance + peaks against hough/blurred + hough.
+    """
+    ctx = FrameContext(color_image)
+    for stage in ("gray", "otsu", "morphology", "distance", "peaks"):
+        t(stage, ctx.get, stage)
+    t("draw", DistancePeakDetector().run, ctx)
+
+
+def watershed_count_path(t, color_image, depth_image):
+    """Counter that splits touching fruits with a watershed seeded at the distance peaks (--watershed)."""
+    ctx = FrameContext(color_image)
+    for stage in ("gray", "otsu", "morphology", "distance", "peaks"):
+        t(stage, ctx.get, stage)
+    t("watershed", WatershedCountDetector().run, ctx)
+
+
+def hsv_hough_path(t, color_image, depth_image):
+    """HSV mask + masked Hough circles (Deetction_faulty.py)."""
+    mask = t("hsv_mask", Deetction_faulty.hsv_mask, color_image)
+    _, gray_blurred = t("masked_gray", Deetction_faulty.masked_gray, color_image, mask)
+    t("hough", Deetction_faulty.find_circles, gray_blurred)
+
+
+def hsv_hough_roi_path(t, color_image, depth_image):
+    """HSV mask + Hough circles only around the masked regions."""
+    mask = t("hsv_mask", Deetction_faulty.hsv_mask, color_image)
+    t("hough", Deetction_faulty.find_circles_in_mask, color_image, mask)
+
+
+def color_labels_path(t, color_image, depth_image):
+    """Red apple / orange / areca nut label map through the precompiled color table."""
+    segmenter = segmenter_for(FRUIT_CLASSES)  # Built once per process, outside the timed stages
+    t("lut_labels", segmenter.labels, color_image)
+
+
+def hsv_labels_path(t, color_image, depth_image):
+    """The same label map from one HSV conversion and one inRange per class."""
+    t("hsv_labels", label_image, color_image, FRUIT_CLASSES)
+
+
+def hsv_depth_path(t, color_image, depth_image):
+    """HSV red mask + per-fruit depth statistics (GUI_code.py)."""
+    mask = t("hsv_mask", GUI_code.red_fruit_mask, color_image)
+    regions = t("label", label_regions, mask, 500)
+    t("depth_stats", depth_stats, regions, depth_image, DEPTH_SCALE)
+
+
+def depth_defects_path(t, color_image, depth_image):
+    """Per-fruit sphere fit on the aligned depth (the Defective Depth panel)."""
+    ctx = FrameContext(color_image, depth_image)
+    for stage in ("gray", "otsu", "morphology", "regions", "depth_u8"):
+        t(stage, ctx.get, stage)
+    t("sphere_fit", DepthDefectDetector().run, ctx)
+
+
+PATHS = {
+    "otsu_count": otsu_count_path,
+    "pyramid_count": pyramid_count_path,
+    "hough": hough_path,
+    "hough_roi": hough_roi_path,
+    "distance_peaks": distance_peaks_path,
+    "watershed_count": watershed_count_path,
+    "hsv_hough": hsv_hough_path,
+    "hsv_hough_roi": hsv_hough_roi_path,
+    "color_labels": color_labels_path,
+    "hsv_labels": hsv_labels_path,
+    "hsv_depth": hsv_depth_path,
+    "depth_defects": depth_defects_path,
+}
+
+
+def scenarios(include_synthetic=True, seed=0):
+    """Yield (name, color_image, depth_image) for every benchmark input."""
+    color_image = cv2.imread("Original_Image.jpg")
+    if color_image is not None:
+        # The bundled photo has no depth; pair it with a flat tray
+        yield "Original_Image.jpg", color_image, np.full(color_image.shape[:2], 800, np.uint16)
+    if not include_synthetic:
+        return
+    rng = np.random.default_rng(seed)
+    for res_name, (w, h) in RESOLUTIONS.items():
+        area_factor = (w * h) / (640 * 480)
+        for density_name, fruits in DENSITIES.items():
+            color_image, depth_image = synthetic_frame(w, h, int(fruits * area_factor), rng)
+            yield f"synthetic_{res_name}_{density_name}", color_image, depth_image
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000.0
+    return {"p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)), "mean": float(ms.mean())}
+
+
+def run_path(path, color_image, depth_image, iterations, warmup):
+    for _ in range(warmup):
+        path(StageTimer(), color_image, depth_image)
+
+    stage_samples = {}
+    totals = []
+    for _ in range(iterations):
+        t = StageTimer()
+        start = time.perf_counter()
+        path(t, color_image, depth_image)
+        totals.append(time.perf_counter() - start)
+        for stage, seconds in t.times.items():
+            stage_samples.setdefault(stage, []).append(seconds)
+
+    # Peak memory from a separate traced run so tracing overhead doesn't skew the timings
+    tracemalloc.start()
+    path(StageTimer(), color_image, depth_image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = percentiles(totals)
+    return {
+        "stages": {stage: percentiles(samples) for stage, samples in stage_samples.items()},
+        "total": total,
+        "fps": 1000.0 / total["mean"] if total["mean"] else 0.0,
+        "peak_memory_mb": peak / 1e6,
+    }
+
+
+def run_benchmarks(paths, iterations=30, warmup=3, include_synthetic=True):
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "opencv_threads": cv2.getNumThreads(),
+        },
+        "results": {},
+    }
+    for scenario, color_image, depth_image in scenarios(include_synthetic):
+        for name in paths:
+            key = f"{name}/{scenario}"
+            results["results"][key] = run_path(PATHS[name], color_image, depth_image, iterations, warmup)
+            r = results["results"][key]
+            print(f"{key:45s} p50 {r['total']['p50']:8.2f} ms  p99 {r['total']['p99']:8.2f} ms  "
+                  f"{r['fps']:8.1f} fps  peak {r['peak_memory_mb']:7.2f} MB")
+    return results
+
+
+def accuracy_scenarios(include_synthetic=True, seed=0):
+    """Yield (name, color_image, expected count, profile) for the accuracy report.
+
+    The synthetic count is the number of fruits drawn; in the dense trays some are
+    hidden under others, so every method is expected to fall short there. Fruit
+    radii grow with the width, so the count grows with the area over the squared
+    scale to keep the tray as crowded as at 640x480.
+    """
+    color_image = cv2.imread("Original_Image.jpg")
+    if color_image is not None:
+        yield "Original_Image.jpg", color_image, ORIGINAL_FRUITS, make_profile()
+    if not include_synthetic:
+        return
+    rng = np.random.default_rng(seed)
+    for res_name, (w, h) in RESOLUTIONS.items():
+        scale = w / 640
+        coverage_factor = (w * h) / (640 * 480) / scale ** 2
+        for density_name, fruits in DENSITIES.items():
+            count = int(fruits * coverage_factor)
+            color_image, _ = synthetic_frame(w, h, count, rng)
+            # The default pixel parameters are meant for 640-wide frames
+            yield f"synthetic_{res_name}_{density_name}", color_image, count, scaled_profile(make_profile(), scale)
+
+
+def run_accuracy(iterations=10, include_synthetic=True):
+    """Count and latency of every ACCURACY_METHODS entry, each computing its intermediates from scratch."""
+    report = {}
+    for scenario, color_image, expected, profile in accuracy_scenarios(include_synthetic):
+        row = {"expected": expected}
+        for method, key, options in ACCURACY_METHODS:
+            pipeline = FruitAnalysisPipeline(profile=profile, **options)
+            detector = pipeline.detector("count" if key == "fruit_count" else "faulty")
+            samples = []
+            for _ in range(iterations):
+                ctx = pipeline.context(color_image)
+                start = time.perf_counter()
+                ctx.require(detector.requires)
+                result = detector.run(ctx)
+                samples.append(time.perf_counter() - start)
+            row[method] = {"count": result[key], "error": result[key] - expected,
+                           "p50": float(np.percentile(samples, 50) * 1000.0)}
+        report[scenario] = row
+        counts = "  ".join(f"{method} {row[method]['count']:3d} ({row[method]['error']:+4d}) {row[method]['p50']:7.2f} ms"
+                           for method, _, _ in ACCURACY_METHODS)
+        print(f"{scenario:30s} expected {expected:3d}  {counts}")
+    return report
+
+
+def _allocation_sites(before, after, top):
+    # Source lines holding the most new memory at the end of the frame
+    stats = [s for s in after.compare_to(before, "lineno") if s.size_diff > 0][:top]
+    return [{"site": f"{s.traceback[0].filename.rsplit('/', 1)[-1]}:{s.traceback[0].lineno}",
+             "mb": s.size_diff / 1e6, "blocks": s.count_diff} for s in stats]
+
+
+def run_allocations(frames=60, fps=30, include_synthetic=True, top=5):
+    """Memory allocated per analyzed frame, with and without the buffer pool, traced by tracemalloc.
+
+    A frame's intermediates and result images stay alive until the frame is done,
+    so the traced peak above what was held before the frame counts what it
+    allocated; scratch memory OpenCV frees inside a call is not seen. The sites
+    are the source lines holding the most new memory at the end of the last
+    frame. Frame times come from separate untraced runs.
+    """
+    report = {}
+    for scenario, color_image, depth_image in scenarios(include_synthetic):
+        row = {}
+        for mode, pooled in (("allocating", False), ("pooled", True)):
+            pipeline = FruitAnalysisPipeline(buffer_pool=pooled)
+            # Warm up: the pool fills during the first frames, as it would at the start of a stream
+            for _ in range(3):
+                summarize(pipeline.analyze(color_image, depth_image))
+            samples = []
+            for _ in range(frames):
+                start = time.perf_counter()
+                summarize(pipeline.analyze(color_image, depth_image))
+                samples.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            per_frame = []
+            ctx = result = before = None
+            for i in range(frames):
+                ctx = result = None  # The caller is done with the previous frame
+                held = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                if i == frames - 1:
+                    before = tracemalloc.take_snapshot()
+                ctx = pipeline.context(color_image, depth_image)
+                result = pipeline.analyze(ctx)
+                per_frame.append(tracemalloc.get_traced_memory()[1] - held)
+            # Taken while the last frame's intermediates are still alive
+            sites = _allocation_sites(before, tracemalloc.take_snapshot(), top)
+            tracemalloc.stop()
+            del ctx, result
+
+            mb = float(np.median(per_frame)) / 1e6
+            row[mode] = {"mb_per_frame": mb, "mb_per_s": mb * fps, "frame_ms": percentiles(samples), "sites": sites}
+        report[scenario] = row
+        a, p = row["allocating"], row["pooled"]
+        print(f"{scenario:30s} allocating {a['mb_per_frame']:7.2f} MB/frame ({a['mb_per_s']:7.1f} MB/s at {fps} fps)  "
+              f"pooled {p['mb_per_frame']:7.2f} MB/frame ({p['mb_per_s']:7.1f} MB/s)  "
+              f"p50/p99 {a['frame_ms']['p50']:.2f}/{a['frame_ms']['p99']:.2f} -> "
+              f"{p['frame_ms']['p50']:.2f}/{p['frame_ms']['p99']:.2f} ms")
+    return report
+
+
+def print_allocation_sites(report):
+    for scenario, row in report.items():
+        for mode, r in row.items():
+            sites = "  ".join(f"{s['site']} {s['mb']:.2f} MB" for s in r["sites"])
+            print(f"{scenario:30s} {mode:10s} {sites}")
+
+
+def import_times(module="FruitCount_gui"):
+    """(total ms, {direct import: cumulative ms}) of importing module, from python -X importtime."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, check=True).stderr
+    direct = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name[1] != " ":
+            # A top-level import; children are listed before their parent
+            if name.strip() == module:
+                return int(cumulative) / 1000.0, direct
+            direct = {}
+        elif name[3] != " ":
+            direct[name.strip()] = int(cumulative) / 1000.0
+    raise RuntimeError(f"{module} not found in the -X importtime output")
+
+
+def _gui_milestones(args, timeout=30.0):
+    # Launch the GUI and note when it reports its window and first frame; wall time includes interpreter startup
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "FruitCount_gui.py"] + args, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True, env=env)
+    milestones = {}
+    try:
+        expected = ("window", "first_frame") if "--synthetic" in args else ("window",)
+        for line in process.stdout:
+            if line.startswith("Window shown"):
+                milestones["window"] = (time.perf_counter() - start) * 1000.0
+            elif line.startswith("First frame shown"):
+                milestones["first_frame"] = (time.perf_counter() - start) * 1000.0
+            if all(name in milestones for name in expected) or time.perf_counter() - start > timeout:
+                break
+    finally:
+        process.kill()
+        process.wait()
+    return milestones
+
+
+def run_startup(runs=5):
+    """GUI import breakdown, then time to window and first frame with synthetic frames and with the camera.
+
+    Without a camera (or librealsense) the second case only reaches the window, in offline mode.
+    """
+    total, direct = import_times()
+    print(f"import FruitCount_gui: {total:.1f} ms")
+    for name, ms in sorted(direct.items(), key=lambda item: -item[1])[:12]:
+        print(f"  {name:30s} {ms:8.1f} ms")
+
+    report = {"import_ms": total, "imports": direct}
+    for case, args in (("synthetic", ["--synthetic"]), ("camera", [])):
+        samples = [_gui_milestones(args) for _ in range(runs)]
+        report[case] = {name: percentiles([s[name] / 1000.0 for s in samples if name in s])
+                        for name in ("window", "first_frame") if any(name in s for s in samples)}
+        print(f"{case:10s} " + "  ".join(f"{name} p50 {r['p50']:7.1f} ms (p99 {r['p99']:.1f})"
+                                        for name, r in report[case].items()))
+    return report
+
+
+def print_stages(results):
+    for key, r in results["results"].items():
+        stages = "  ".join(f"{stage} {s['p50']:.2f}" for stage, s in r["stages"].items())
+        print(f"{key:45s} {stages}")
+
+
+def compare(results, baseline, threshold=0.10):
+    """Print p50 changes against a baseline; returns the keys that regressed beyond threshold."""
+    regressions = []
+    for key, r in results["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        before, after = base["total"]["p50"], r["total"]["p50"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key:45s} {before:8.2f} -> {after:8.2f} ms ({change:+.1%}){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fruit detection paths.")
+    parser.add_argument("--paths", nargs="+", choices=sorted(PATHS), default=list(PATHS))
+    parser.add_argument("-n", "--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="only the bundled image")
+    parser.add_argument("--stages", action="store_true", help="print per-stage p50 latencies")
+    parser.add_argument("-o", "--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against results saved with --output")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown that counts as a regression")
+    parser.add_argument("--accuracy", action="store_true",
+                        help="only compare the fruit counts and latency of the counting and circle methods")
+    parser.add_argument("--allocations", action="store_true",
+                        help="only compare the memory allocated per frame with and without the buffer pool")
+    parser.add_argument("--startup", action="store_true",
+                        help="only measure the GUI's import time and time to window and first frame")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        report = run_startup(min(args.iterations, 10))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"startup": report}, f, indent=2)
+        return 0
+
+    if args.allocations:
+        report = run_allocations(args.iterations, include_synthetic=not args.quick)
+        if args.stages:
+            print_allocation_sites(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"allocations": report}, f, indent=2)
+        return 0
+
+    if args.accuracy:
+        report = run_accuracy(args.iterations, not args.quick)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"accuracy": report}, f, indent=2)
+        return 0
+
+    results = run_benchmarks(args.paths, args.iterations, args.warmup, not args.quick)
+    if args.stages:
+        print_stages(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Reusable numpy buffers, handed out by shape and dtype, for OpenCV dst= outputs.
+
+    pool = BufferPool()
+    gray = cv2.cvtColor(color, cv2.COLOR_BGR2GRAY, dst=pool.acquire(color.shape[:2]))
+    ...
+    pool.release(gray)   # the next acquire of that shape and dtype returns the same array
+
+At 30 fps every stage allocating a fresh frame-sized array adds up to hundreds
+of megabytes a second of short-lived allocations; with a pool the arrays are
+allocated during the first frames and then only reused. A released array must
+no longer be used by its previous owner.
+"""
+import collections
+
+import numpy as np
+
+
+def reuse(buffer, shape, dtype=np.uint8):
+    """buffer if it has that shape and dtype, otherwise a new array to keep for the next call."""
+    if buffer is not None and buffer.shape == tuple(shape) and buffer.dtype == dtype:
+        return buffer
+    return np.empty(shape, dtype)
+
+
+class BufferPool:
+    """Free lists of arrays keyed by (shape, dtype). Not thread-safe; use one pool per thread."""
+
+    def __init__(self):
+        self._free = collections.defaultdict(list)
+        self.allocated = 0
+        self.reused = 0
+        self.allocated_bytes = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """An uninitialized array of that shape and dtype, reused if one was released."""
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        free = self._free[(shape, dtype)]
+        if free:
+            self.reused += 1
+            return free.pop()
+        buffer = np.empty(shape, dtype)
+        self.allocated += 1
+        self.allocated_bytes += buffer.nbytes
+        return buffer
+
+    def release(self, buffer):
+        self._free[(buffer.shape, buffer.dtype)].append(buffer)
+
+    def clear(self):
+        """Drop every free buffer, e.g. after the frame size changed."""
+        self._free.clear()
+
+    def free_bytes(self):
+        return sum(buffer.nbytes for free in self._free.values() for buffer in free)
+
+    def stats_text(self):
+        return (f"Buffers allocated: {self.allocated} ({self.allocated_bytes / 2 ** 20:.1f} MB)  "
+                f"Reused: {self.reused}")
@@ -0,0 +1,94 @@
+import math
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QFrame, QGridLayout, QLabel, QMainWindow, QVBoxLayout, QWidget
+
+from buffer_pool import reuse
+from frame_view import FrameView
+
+
+def draw_overlay(image, summary):
+    """Draw the counted fruits and detected circles from a summary onto image in place."""
+    for number, cX, cY in summary.get("centroids", []):
+        cv2.putText(image, str(number), (cX - 10, cY - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+    for x, y, radius in summary.get("circles", []):
+        cv2.circle(image, (x, y), radius, (0, 255, 0), 2)
+    cv2.putText(image, f"Fruits: {summary.get('fruit_count', 0)}  Faulty: {summary.get('faulty_count', 0)}",
+                (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    return image
+
+
+class CameraGrid(QWidget):
+    """One tile per camera: its live frame with the newest analysis drawn over it, and its counts below."""
+
+    def __init__(self, captures, analyzer, columns=None, tile_size=(480, 360), parent=None):
+        super().__init__(parent)
+        self.captures = captures
+        self.analyzer = analyzer
+        self.views = {}
+        self.labels = {}
+        self._shown = {}
+        self._overlays = {}
+
+        columns = columns or math.ceil(math.sqrt(len(captures)))
+        grid = QGridLayout()
+        for i, name in enumerate(captures):
+            view = FrameView(name, self)
+            view.setFixedSize(*tile_size)
+            view.setFrameShape(QFrame.Box)
+            view.setStyleSheet("background-color: #000; color: #fff; font-weight: bold; padding: 5px;")
+            label = QLabel(name)
+            label.setFont(QFont("Arial", 9))
+
+            cell = QVBoxLayout()
+            cell.addWidget(QLabel(f"<b>{name}</b>"))
+            cell.addWidget(view)
+            cell.addWidget(label)
+            grid.addLayout(cell, i // columns, i % columns)
+            self.views[name] = view
+            self.labels[name] = label
+        self.setLayout(grid)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(30)
+
+    def refresh(self):
+        for name, capture in self.captures.items():
+            frame = capture.latest()
+            if frame is None or frame.seq == self._shown.get(name):
+                continue  # Nothing new from this camera since the last tick
+            self._shown[name] = frame.seq
+
+            image = frame.color
+            _, summary = self.analyzer.latest(name)
+            if summary is not None:
+                # Draw on a copy; the captured frame may still be on its way to a worker
+                overlay = self._overlays[name] = reuse(self._overlays.get(name), image.shape)
+                np.copyto(overlay, image)
+                image = draw_overlay(overlay, summary)
+            self.views[name].set_frame(image, frame.seq)
+            capture.mark_displayed(frame)
+            self.labels[name].setText(self.analyzer.stats[name].text())
+
+
+class CameraGridWindow(QMainWindow):
+    def __init__(self, captures, analyzer):
+        super().__init__()
+        self.setWindowTitle("Fruit Analysis - Inspection Stations")
+        self.setStyleSheet("background-color: #f0f0f5; font-family: Arial;")
+        self.grid = CameraGrid(captures, analyzer, parent=self)
+        self.setCentralWidget(self.grid)
+        self.analyzer = analyzer
+
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(lambda: self.statusBar().showMessage(self.analyzer.stats_text()))
+        self.status_timer.start(1000)
+
+    def closeEvent(self, event):
+        self.grid.timer.stop()
+        self.status_timer.stop()
+        super().closeEvent(event)
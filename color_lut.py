@@ -0,0 +1,104 @@
+"""Multi-class color segmentation through one precomputed BGR lookup table.
+
+Every class is an HSV or BGR range. The ranges are compiled once into a table
+with one class label per 24-bit BGR color, so labeling a frame is a single
+gather: no per-frame HSV conversion and no inRange pass per class. Since every
+color is classified exactly as cvtColor + inRange would classify it, the label
+map matches the per-class masks pixel for pixel.
+
+    segmenter = segmenter_for(FRUIT_CLASSES)
+    labels = segmenter.labels(frame)             # uint8, 0 = background, k = classes[k - 1]
+    red = segmenter.mask(labels, "red_apple")    # 0/255 mask for one class
+
+An HSV range whose lower hue is above its upper hue wraps around 180, which is
+how red (both ends of OpenCV's 0-179 hue scale) is written.
+"""
+import collections
+import functools
+import sys
+
+import cv2
+import numpy as np
+
+ColorClass = collections.namedtuple("ColorClass", ["name", "lower", "upper", "space"], defaults=["hsv"])
+
+RED_APPLE = ColorClass("red_apple", (170, 120, 70), (10, 255, 255))
+ORANGE = ColorClass("orange", (11, 120, 70), (25, 255, 255))
+ARECA_NUT = ColorClass("areca_nut", (10, 14, 128), (33, 238, 255))
+
+# Earlier classes win where ranges overlap
+FRUIT_CLASSES = (RED_APPLE, ORANGE, ARECA_NUT)
+
+
+def _class_mask(color_class, bgr, hsv):
+    lower, upper = np.array(color_class.lower), np.array(color_class.upper)
+    if color_class.space == "bgr":
+        return cv2.inRange(bgr, lower, upper)
+    if color_class.space != "hsv":
+        raise ValueError(f"Unknown color space {color_class.space!r} for class {color_class.name!r}")
+    if lower[0] <= upper[0]:
+        return cv2.inRange(hsv, lower, upper)
+    # Hue wraps around: [lower, 179] or [0, upper]
+    high = cv2.inRange(hsv, lower, np.array([179, upper[1], upper[2]]))
+    low = cv2.inRange(hsv, np.array([0, lower[1], lower[2]]), upper)
+    return cv2.bitwise_or(high, low)
+
+
+def label_image(image, classes):
+    """Reference labeling with one HSV conversion and one inRange per class; used to build the table."""
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    labels = np.zeros(image.shape[:2], np.uint8)
+    for k in range(len(classes), 0, -1):
+        # Lower labels are written last so they win overlaps
+        labels[_class_mask(classes[k - 1], image, hsv) > 0] = k
+    return labels
+
+
+def build_table(classes):
+    """Class label of every 24-bit color, indexed by b | g << 8 | r << 16."""
+    table = np.empty(1 << 24, np.uint8)
+    # One 256x256 image of every (g, b) pair per red value keeps the build at a few MB
+    g, b = np.mgrid[0:256, 0:256].astype(np.uint8)
+    plane = np.empty((256, 256, 3), np.uint8)
+    plane[..., 0], plane[..., 1] = b, g
+    for r in range(256):
+        plane[..., 2] = r
+        table[r << 16:(r + 1) << 16] = label_image(plane, classes).ravel()
+    return table
+
+
+class ColorSegmenter:
+    def __init__(self, classes):
+        if len(classes) > 255:
+            raise ValueError("At most 255 color classes fit in a uint8 label map")
+        self.classes = tuple(ColorClass(*c) for c in classes)
+        self.names = ["background"] + [c.name for c in self.classes]
+        self.table = build_table(self.classes)
+
+    def labels(self, image):
+        """uint8 class label per pixel of a BGR image."""
+        if sys.byteorder == "little":
+            # Padding to BGRA makes every pixel one uint32 whose low three bytes are b | g << 8 | r << 16
+            bgra = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+            index = bgra.view(np.uint32)[..., 0]
+            np.bitwise_and(index, 0xFFFFFF, out=index)
+        else:
+            index = image[..., 0] | (image[..., 1].astype(np.uint32) << 8) | (image[..., 2].astype(np.uint32) << 16)
+        return np.take(self.table, index, mode="clip")
+
+    def label_of(self, name):
+        return self.names.index(name)
+
+    def mask(self, labels, name):
+        """0/255 mask of one class from a label map."""
+        return cv2.compare(labels, self.label_of(name), cv2.CMP_EQ)
+
+    def counts(self, labels):
+        """Pixels per label, background first."""
+        return np.bincount(labels.ravel(), minlength=len(self.names))
+
+
+@functools.lru_cache(maxsize=8)
+def segmenter_for(classes=FRUIT_CLASSES):
+    """Shared segmenter for a tuple of classes; the table is built once per process."""
+    return ColorSegmenter(classes)
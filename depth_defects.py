@@ -0,0 +1,163 @@
+"""Per-fruit surface defects from the aligned depth image.
+
+Every fruit is modelled as a sphere. The valid depth pixels inside each fruit
+region are back-projected to camera coordinates, all fruits are fitted at once
+with an algebraic least-squares sphere fit, and pixels that lie more than
+`tolerance_m` off their fruit's sphere are flagged: farther than the sphere is
+a dent or soft bruise, nearer is a bump or a stuck object. Pixels seen at a
+grazing angle (surface normal more than ~60 degrees from the viewing ray) are
+left out, since their depth is the least reliable on any stereo sensor.
+
+Only fruit pixels are gathered from the depth map; the per-fruit sums of the
+normal equations are accumulated with np.bincount, so there is no Python loop
+over fruits or pixels.
+"""
+import cv2
+import numpy as np
+
+
+def default_intrinsics(width, height):
+    """Pinhole (fx, fy, cx, cy) of a RealSense color stream when the device can't be asked."""
+    f = 600.0 * width / 640
+    return f, f, width / 2.0, height / 2.0
+
+
+def fit_spheres(idx, points, n, weights=None):
+    """Least-squares sphere per region; returns (centers (3, n), radii (n,)).
+
+    points is (3, N) with the region index of every point in idx. Solves
+    x^2 + y^2 + z^2 = 2ax + 2by + 2cz + k for (a, b, c, k) in each region.
+    """
+    w = np.ones(idx.size) if weights is None else weights
+    design = (2 * points[0], 2 * points[1], 2 * points[2], w)
+    target = w * (points ** 2).sum(axis=0)
+
+    # Per-region normal equations; the weight is folded into the constant column and the target
+    ata = np.empty((n, 4, 4))
+    atb = np.empty((n, 4))
+    for i in range(4):
+        atb[:, i] = np.bincount(idx, weights=design[i] * target if i < 3 else target, minlength=n)
+        wi = design[i] * w if i < 3 else w
+        for j in range(i, 4):
+            ata[:, i, j] = ata[:, j, i] = np.bincount(idx, weights=wi * design[j] if j < 3 else wi, minlength=n)
+    # A small ridge keeps regions with too few (or coplanar) points solvable; their fit is discarded anyway
+    ata += np.eye(4) * 1e-9
+    solution = np.linalg.solve(ata, atb[..., None])[..., 0]
+    centers = solution[:, :3].T
+    radii = np.sqrt(np.maximum(solution[:, 3] + (centers ** 2).sum(axis=0), 0))
+    return centers, radii
+
+
+def _deviation(idx, points, centers, radii):
+    # Signed distance inside the sphere (positive: farther from the camera than the surface)
+    # and the cosine between the surface normal and the viewing axis
+    offset = points - centers[:, idx]
+    distance = np.sqrt((offset ** 2).sum(axis=0))
+    facing = -offset[2] / np.maximum(distance, 1e-9)
+    return radii[idx] - distance, facing
+
+
+def sphere_defects(regions, depth_image, depth_scale=0.001, intrinsics=None, tolerance_m=0.003,
+                   erode=5, min_pixels=50, defect_fraction=0.02, step=None, min_facing=0.5, fit_stride=4):
+    """Per-fruit deviation from a fitted sphere.
+
+    Fruits are sampled every `step` pixels in each direction (by default one
+    step per 640 pixels of width, so a 1080p frame costs what a VGA frame does)
+    and the defect mask is scaled back up to the depth image size. The spheres
+    are fitted on every fit_stride-th of those pixels, which leaves hundreds of
+    points even on a small fruit; every sampled pixel is still scored.
+
+    Returns a dict of arrays aligned with the regions ("score" is the fraction of
+    scored pixels off the sphere, "rms_mm" and "max_mm" the residuals, "defective"
+    the verdict; NaN / False for fruits with fewer than min_pixels valid pixels)
+    and a uint8 mask of the flagged pixels.
+    """
+    n = len(regions)
+    height, width = depth_image.shape
+    result = {"score": np.full(n, np.nan), "rms_mm": np.full(n, np.nan), "max_mm": np.full(n, np.nan),
+              "radius_mm": np.full(n, np.nan), "defective": np.zeros(n, bool)}
+    if n == 0:
+        return result, np.zeros((height, width), np.uint8)
+
+    # Drop the rim, where depth mixes fruit and background, before fitting
+    inside = regions.labels > 0
+    if erode:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (erode, erode))
+        inside = cv2.erode(inside.view(np.uint8), kernel).view(bool)
+
+    step = step or max(1, width // 640)
+    labels = regions.labels[::step, ::step]
+    depth = depth_image[::step, ::step]
+    grid_width = labels.shape[1]
+
+    index_of_label = np.zeros(int(regions.label_ids.max()) + 1, np.int32)
+    index_of_label[regions.label_ids] = np.arange(1, n + 1, dtype=np.int32)
+
+    # Gather the fruit pixels once; everything below works on these only
+    flat = np.flatnonzero(inside[::step, ::step].ravel() & (depth.ravel() > 0))
+    idx = index_of_label[labels.ravel()[flat]] - 1
+    keep = idx >= 0
+    flat, idx = flat[keep], idx[keep]
+    defect_grid = np.zeros(labels.shape, np.uint8)
+    if flat.size == 0:
+        return result, np.zeros((height, width), np.uint8)
+
+    fx, fy, cx, cy = intrinsics or default_intrinsics(width, height)
+    v, u = np.divmod(flat, grid_width)
+    u, v = u * step, v * step
+    z = depth.ravel()[flat] * (depth_scale * 1000.0)  # millimeters
+    points = np.stack(((u - cx) * z / fx, (v - cy) * z / fy, z))
+
+    # Fit, then refit without the points that are clearly off the surface so a dent doesn't pull the sphere.
+    # The gathered pixels are in raster order, so a plain stride samples every fruit evenly
+    tolerance_mm = tolerance_m * 1000.0
+    fit_idx = idx[::fit_stride]
+    counts = np.maximum(np.bincount(fit_idx, minlength=n), 1)
+    # Center each fruit's sample for a well-conditioned fit
+    means = np.stack([np.bincount(fit_idx, weights=points[k, ::fit_stride], minlength=n) / counts for k in range(3)])
+    fit_points = points[:, ::fit_stride] - means[:, fit_idx]
+    centers, radii = fit_spheres(fit_idx, fit_points, n)
+    deviation, facing = _deviation(fit_idx, fit_points, centers, radii)
+    inliers = ((np.abs(deviation) <= 2 * tolerance_mm) & (facing >= min_facing)).astype(np.float64)
+    centers, radii = fit_spheres(fit_idx, fit_points, n, inliers)
+    centers += means
+    deviation, facing = _deviation(idx, points, centers, radii)
+
+    # Score only the pixels that face the camera
+    scored = facing >= min_facing
+    off = (np.abs(deviation) > tolerance_mm) & scored
+    scored_counts = np.bincount(idx, weights=scored, minlength=n)
+    fitted = scored_counts * (step * step) >= min_pixels
+    off &= fitted[idx]
+
+    flagged = np.bincount(idx, weights=off, minlength=n)
+    sq = np.bincount(idx, weights=np.where(scored, deviation ** 2, 0), minlength=n)
+    worst = np.zeros(n)
+    np.maximum.at(worst, idx, np.where(scored, np.abs(deviation), 0))
+
+    result["score"][fitted] = flagged[fitted] / scored_counts[fitted]
+    result["rms_mm"][fitted] = np.sqrt(sq[fitted] / scored_counts[fitted])
+    result["max_mm"][fitted] = worst[fitted]
+    result["radius_mm"][fitted] = radii[fitted]
+    result["defective"][fitted] = result["score"][fitted] >= defect_fraction
+    defect_grid.ravel()[flat[off]] = 255
+    if step == 1:
+        return result, defect_grid
+    defect_mask = cv2.resize(defect_grid, None, fx=step, fy=step, interpolation=cv2.INTER_NEAREST)
+    return result, np.ascontiguousarray(defect_mask[:height, :width])
+
+
+def draw_depth_defects(depth_u8, regions, result, defect_mask, out=None):
+    """Gray depth image (drawn into out, if given) with flagged pixels in red and a score next to every fruit."""
+    overlay = cv2.cvtColor(depth_u8, cv2.COLOR_GRAY2BGR, dst=out)
+    # Paint the flagged pixels red with masked saturating ops instead of a boolean-index copy
+    cv2.subtract(overlay, (255, 255, 0, 0), dst=overlay, mask=defect_mask)
+    cv2.add(overlay, (0, 0, 255, 0), dst=overlay, mask=defect_mask)
+    for i, (x, y, w, h) in enumerate(regions.boxes):
+        score = result["score"][i]
+        if np.isnan(score):
+            continue
+        color = (0, 0, 255) if result["defective"][i] else (0, 255, 0)
+        cv2.rectangle(overlay, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(overlay, f"{score:.0%}", (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return overlay
@@ -0,0 +1,128 @@
+"""Fruit centers and radii from the distance transform of the fruit mask.
+
+Inside a round fruit the distance to the nearest background pixel peaks at the
+center, and the peak value is the radius of the largest inscribed circle. Two
+touching fruits merge into one blob in the mask but keep two peaks, separated
+by the saddle where they touch. Peaks are taken as local maxima of the
+distance map, then suppressed greedily from the largest down: a peak closer
+than min_dist to a kept one, or inside its circle, is the same fruit.
+
+The peaks can also seed a marker-based watershed that splits each merged blob
+into one region per fruit, for counting.
+"""
+import cv2
+import numpy as np
+
+from region_stats import Regions
+
+
+def fill_holes(mask, max_area=None):
+    """The mask with its holes up to max_area pixels filled (glare, stalks); all holes if max_area is None.
+
+    Larger holes are kept: in a dense tray they are the gaps between fruits
+    that touch all around, and filling them would merge the ring into one disc.
+    """
+    contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    filled = np.zeros_like(mask)
+    if not contours:
+        return filled
+    # With RETR_CCOMP, top-level contours are outer borders and their children are holes
+    outer = hierarchy[0, :, 3] < 0
+    cv2.drawContours(filled, [c for c, o in zip(contours, outer) if o], -1, 255, cv2.FILLED)
+    if max_area is not None:
+        holes = [c for c, o in zip(contours, outer) if not o and cv2.contourArea(c) > max_area]
+        cv2.drawContours(filled, holes, -1, 0, cv2.FILLED)
+    return filled
+
+
+def distance_map(mask, max_hole_area=None):
+    """Euclidean distance from every fruit pixel to the background (float32), ignoring small holes."""
+    return cv2.distanceTransform(fill_holes(mask, max_hole_area), cv2.DIST_L2, 5)
+
+
+def distance_peaks(distance, min_radius=10, max_radius=None, min_dist=30):
+    """(N, 3) float32 array of (x, y, radius), largest first.
+
+    A peak is a pixel no lower than anything in the square of half-width
+    min_radius around it (a square kernel keeps the dilation separable, which
+    is an order of magnitude faster than a disc at 1080p); plateaus, such as
+    the ridge of an elongated fruit, count once at their centroid.
+    """
+    size = 2 * max(1, int(min_radius)) + 1
+    maxima = (distance >= cv2.dilate(distance, np.ones((size, size), np.uint8))) & (distance >= min_radius)
+    maxima = maxima.view(np.uint8)
+    count, components = cv2.connectedComponents(maxima, connectivity=8)
+    if count <= 1:
+        return np.zeros((0, 3), np.float32)
+
+    # Centroids from the few maximum pixels; connectedComponentsWithStats would scan the whole frame again
+    points = cv2.findNonZero(maxima).reshape(-1, 2)
+    owner = components[points[:, 1], points[:, 0]]
+    pixels = np.bincount(owner, minlength=count)[1:]
+    centers = np.column_stack([np.bincount(owner, weights=points[:, 0], minlength=count)[1:],
+                               np.bincount(owner, weights=points[:, 1], minlength=count)[1:]]) / pixels[:, None]
+    cols = np.clip(np.rint(centers[:, 0]).astype(np.int32), 0, distance.shape[1] - 1)
+    rows = np.clip(np.rint(centers[:, 1]).astype(np.int32), 0, distance.shape[0] - 1)
+    peaks = np.column_stack([centers, distance[rows, cols]]).astype(np.float32)
+    if max_radius:
+        np.minimum(peaks[:, 2], max_radius, out=peaks[:, 2])
+    peaks = peaks[np.argsort(-peaks[:, 2], kind="stable")]
+
+    # Greedy suppression, largest fruit first
+    kept = []
+    for x, y, r in peaks:
+        if all((x - kx) ** 2 + (y - ky) ** 2 >= max(min_dist, kr) ** 2 for kx, ky, kr in kept):
+            kept.append((x, y, r))
+    return np.array(kept, np.float32).reshape(-1, 3)
+
+
+def watershed_split(color_image, mask, peaks, marker_fraction=0.5):
+    """Split the mask into one region per peak; returns an int32 label image (0 = background).
+
+    Each peak seeds a disc of marker_fraction times its radius; everything the
+    dilated mask doesn't reach is background. The flooding follows the color
+    edges of the image, so a region ends where its fruit's skin does.
+    """
+    markers = np.zeros(mask.shape, np.int32)
+    background = len(peaks) + 1
+    reach = cv2.dilate(mask, np.ones((3, 3), np.uint8), iterations=2)
+    markers[reach == 0] = background
+    for label, (x, y, r) in enumerate(peaks, start=1):
+        cv2.circle(markers, (int(round(x)), int(round(y))), max(1, int(r * marker_fraction)), label, -1)
+
+    cv2.watershed(color_image, markers)
+    # Ridge pixels (-1) and the background marker both become background; nothing outside the mask is a fruit
+    markers[(markers < 0) | (markers == background) | (mask == 0)] = 0
+    return markers
+
+
+def split_regions(labels, count, min_area=0):
+    """Regions for labels 1..count of a watershed label image, dropping those up to min_area pixels.
+
+    Watershed ridges separate the regions, so each 4-connected component of
+    the label image belongs to exactly one label and the per-label statistics
+    can be merged from OpenCV's component statistics instead of scanning the
+    image once per label.
+    """
+    n, components, stats, centroids = cv2.connectedComponentsWithStats((labels > 0).view(np.uint8), connectivity=4)
+    owner = np.zeros(n, np.int64)
+    owner[components.ravel()] = labels.ravel()
+    owner, stats, centroids = owner[1:], stats[1:], centroids[1:]
+
+    areas = np.bincount(owner, weights=stats[:, cv2.CC_STAT_AREA], minlength=count + 1)
+    safe = np.maximum(areas, 1)
+    cx = np.bincount(owner, weights=stats[:, cv2.CC_STAT_AREA] * centroids[:, 0], minlength=count + 1) / safe
+    cy = np.bincount(owner, weights=stats[:, cv2.CC_STAT_AREA] * centroids[:, 1], minlength=count + 1) / safe
+    x0 = np.full(count + 1, np.iinfo(np.int32).max)
+    y0 = np.full(count + 1, np.iinfo(np.int32).max)
+    x1 = np.zeros(count + 1, np.int64)
+    y1 = np.zeros(count + 1, np.int64)
+    np.minimum.at(x0, owner, stats[:, cv2.CC_STAT_LEFT])
+    np.minimum.at(y0, owner, stats[:, cv2.CC_STAT_TOP])
+    np.maximum.at(x1, owner, stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH])
+    np.maximum.at(y1, owner, stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT])
+
+    ids = np.flatnonzero(areas > max(min_area, 0))
+    ids = ids[ids > 0]
+    boxes = np.stack([x0[ids], y0[ids], x1[ids] - x0[ids], y1[ids] - y0[ids]], axis=1).astype(np.int32)
+    return Regions(labels, areas[ids].astype(np.int64), boxes, np.stack([cx[ids], cy[ids]], axis=1), ids)
@@ -0,0 +1,188 @@
+import collections
+import threading
+import time
+
+from instrumentation import METRICS
+
+# One aligned color/depth pair, stamped with the time it left the source
+Frame = collections.namedtuple("Frame", ["seq", "timestamp", "color", "depth"])
+
+# Connection states of a CaptureThread
+CONNECTING = "connecting"
+RUNNING = "running"
+RETRYING = "retrying"
+UNAVAILABLE = "unavailable"
+
+
+class CaptureThread(threading.Thread):
+    """Owns a frame source and keeps a small ring of the newest frame pairs.
+
+    Consumers call latest() which never blocks; frames that are superseded before
+    anyone reads them are counted as drops. The source defaults to the RealSense
+    camera but can be a recording or synthetic frames (see frame_source).
+
+    on_frame, if given, is called from the capture thread with every new Frame,
+    e.g. to hand it to an analysis pool without polling.
+
+    start(wait=False) returns at once and leaves connecting to the thread, which
+    retries every retry_interval seconds while the camera is missing, and again
+    after a failed read such as an unplugged camera; state, error and attempts
+    describe the progress for a status display.
+    """
+
+    def __init__(self, width=640, height=480, fps=30, buffer_size=4, source=None, on_frame=None, name="frame-capture",
+                 serial=None, retry_interval=2.0):
+        super().__init__(name=name, daemon=True)
+        # The RealSense source is built when connecting, so importing librealsense happens there too
+        self.source = source
+        self._camera = (width, height, fps, serial)
+        self.on_frame = on_frame
+        self.retry_interval = retry_interval
+        self.state = CONNECTING
+        self.error = None
+        self.attempts = 0
+        self.connected_at = None
+
+        self._ring = collections.deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._seq = 0
+        self._last_read_seq = 0
+
+        # Statistics reported to the GUI
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.stalls = 0
+        self.read_errors = 0
+        self.finished = False
+        self._latencies = collections.deque(maxlen=100)
+
+    @property
+    def depth_scale(self):
+        from frame_source import FrameSource
+
+        return (self.source or FrameSource).depth_scale
+
+    @property
+    def intrinsics(self):
+        from frame_source import FrameSource
+
+        return (self.source or FrameSource).intrinsics
+
+    def start(self, wait=True):
+        """Start the source, synchronously by default so connection errors reach the caller."""
+        if wait:
+            self._connect()
+        super().start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=2)
+        if self.state == RUNNING:
+            self.source.stop()
+
+    def _connect(self):
+        self.attempts += 1
+        if self.source is None:
+            # Imported here so OpenCV and numpy load on the capture thread, not before the GUI shows
+            from frame_source import RealSenseSource
+
+            width, height, fps, serial = self._camera
+            self.source = RealSenseSource(width, height, fps, serial=serial)
+        self.source.start()
+        self.connected_at = time.perf_counter()
+        self.error = None
+        self.state = RUNNING
+
+    def _connect_with_retry(self):
+        while not self._stop_event.is_set():
+            try:
+                self._connect()
+                return True
+            except ImportError as e:
+                # No librealsense: nothing will change by trying again
+                self.error = str(e)
+                self.state = UNAVAILABLE
+                return False
+            except Exception as e:
+                self.error = str(e)
+                self.state = RETRYING
+                METRICS.incr("capture_connect_failures")
+                self._stop_event.wait(self.retry_interval)
+        return False
+
+    def run(self):
+        if self.state != RUNNING and not self._connect_with_retry():
+            return
+        while not self._stop_event.is_set():
+            try:
+                with METRICS.stage("capture.read"):
+                    item = self.source.read()
+            except RuntimeError:
+                # The camera stalled; only this thread waits for it
+                self.stalls += 1
+                METRICS.incr("capture_stalls")
+                continue
+            except Exception as e:
+                # The device was unplugged or the recording is unreadable: reconnect like at startup
+                self.read_errors += 1
+                METRICS.incr("capture_read_errors")
+                self.error = str(e)
+                self.state = RETRYING
+                try:
+                    self.source.stop()
+                except Exception:
+                    pass  # Already gone with the device
+                if self._stop_event.wait(self.retry_interval) or not self._connect_with_retry():
+                    return
+                continue
+
+            if item is None:
+                # A finite recording has ended
+                self.finished = True
+                return
+
+            color_image, depth_image, _ = item
+            with self._lock:
+                self._seq += 1
+                frame = Frame(self._seq, time.perf_counter(), color_image, depth_image)
+                self._ring.append(frame)
+                self.frames_captured += 1
+            METRICS.incr("frames_captured")
+            if self.on_frame is not None:
+                self.on_frame(frame)
+
+    def latest(self):
+        """Return the newest frame pair, or None if nothing has been captured yet."""
+        with self._lock:
+            if not self._ring:
+                return None
+            frame = self._ring[-1]
+            if frame.seq > self._last_read_seq:
+                # Every frame between the last one read and this one was never seen
+                dropped = frame.seq - self._last_read_seq - 1
+                self.frames_dropped += dropped
+                self._last_read_seq = frame.seq
+                if dropped:
+                    METRICS.incr("frames_dropped", dropped)
+            METRICS.gauge("capture_queue_depth", len(self._ring))
+            return frame
+
+    def mark_displayed(self, frame):
+        """Record the capture-to-display latency of a frame that was just shown."""
+        latency = time.perf_counter() - frame.timestamp
+        self._latencies.append(latency)
+        METRICS.observe("capture_to_display", latency)
+
+    def latency_ms(self):
+        if not self._latencies:
+            return 0.0
+        return 1000.0 * sum(self._latencies) / len(self._latencies)
+
+    def stats_text(self):
+        text = (f"Captured: {self.frames_captured}  Dropped: {self.frames_dropped}  "
+                f"Stalls: {self.stalls}  Capture-to-display: {self.latency_ms():.1f} ms")
+        if self.read_errors:
+            text += f"  Read errors: {self.read_errors}"
+        return text
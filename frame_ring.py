@@ -0,0 +1,308 @@
+"""A ring of preallocated frame slots in shared memory, so frames reach worker processes without pickling.
+
+    ring = FrameRing(slots=8, color_shape=(480, 640, 3), depth_shape=(480, 640))
+    index = ring.write(seq, color, depth)        # one copy into a free slot; None if every slot is in use
+    pool.submit(work, ring.spec(), index, seq)   # only three small values cross the process boundary
+
+    # in the worker
+    ring = FrameRing.attach(spec)
+    color, depth = ring.read(index, seq)         # numpy views of the slot, no copy
+    ...
+    ring.intact(index, seq)                      # False if the slot was overwritten meanwhile
+    ring.release(index, seq)                     # the slot can be written again
+
+Each slot has a header of (seq, state). The writer marks a slot busy, sets its
+seq to 0 while copying and to the frame's seq once the frame is complete; a
+reader holding (index, seq) checks the header before and after using the views.
+A slot is written again only once released, unless the writer asks to
+overwrite the oldest busy slot when none is free; its readers then see a
+different seq and drop the frame. Only one process writes (the capture side).
+Releasing is allowed from any process; a release for an old seq is ignored.
+
+Compare the transport cost with multiprocessing.Queue:
+    python frame_ring.py --frames 600
+"""
+import argparse
+import collections
+import multiprocessing
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+FREE = 0
+BUSY = 1
+_SEQ = 0
+_STATE = 1
+_ALIGN = 64
+
+
+class FrameOverwritten(RuntimeError):
+    """The slot was reused for a newer frame before the reader was done with it."""
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class FrameRing:
+    def __init__(self, slots=8, color_shape=(480, 640, 3), depth_shape=None, name=None, create=True):
+        """Create a ring (create=True) or map the existing one called name."""
+        self.slots = slots
+        self.color_shape = tuple(color_shape)
+        self.depth_shape = tuple(depth_shape) if depth_shape else None
+
+        # Layout: header, timestamps, color slots, depth slots, each 64-byte aligned
+        header_bytes = slots * 2 * 8
+        offsets = [0, _aligned(header_bytes)]
+        offsets.append(_aligned(offsets[1] + slots * 8))
+        color_bytes = slots * int(np.prod(self.color_shape))
+        offsets.append(_aligned(offsets[2] + color_bytes))
+        depth_bytes = slots * int(np.prod(self.depth_shape)) * 2 if self.depth_shape else 0
+        size = offsets[3] + depth_bytes
+
+        self.owner = create
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        buf = self.shm.buf
+        self.header = np.ndarray((slots, 2), np.int64, buf, offsets[0])
+        self.timestamps = np.ndarray((slots,), np.float64, buf, offsets[1])
+        self.color = np.ndarray((slots,) + self.color_shape, np.uint8, buf, offsets[2])
+        self.depth = np.ndarray((slots,) + self.depth_shape, np.uint16, buf, offsets[3]) if self.depth_shape else None
+        if create:
+            self.header[:] = 0
+
+        self._lock = threading.Lock()  # Several threads of the writing process may write
+        self.written = 0
+        self.dropped = 0
+        self.overwritten = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        """Picklable description for FrameRing.attach in another process."""
+        return {"name": self.name, "slots": self.slots, "color_shape": self.color_shape,
+                "depth_shape": self.depth_shape}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec["slots"], spec["color_shape"], spec["depth_shape"], name=spec["name"], create=False)
+
+    def fits(self, color, depth=None):
+        return color.shape == self.color_shape and (depth is None or depth.shape == self.depth_shape)
+
+    def free_slots(self):
+        return int(np.count_nonzero(self.header[:, _STATE] == FREE))
+
+    def write(self, seq, color, depth=None, timestamp=0.0, overwrite=False):
+        """Copy a frame into a free slot and return its index; None when every slot is in use.
+
+        seq must be positive and unique within the ring. With overwrite, the busy
+        slot holding the oldest frame is reused instead of returning None.
+        """
+        with self._lock:
+            free = np.flatnonzero(self.header[:, _STATE] == FREE)
+            if len(free):
+                index = int(free[0])
+            elif overwrite:
+                index = int(np.argmin(self.header[:, _SEQ]))
+                self.overwritten += 1
+            else:
+                self.dropped += 1
+                return None
+
+            # seq 0 while copying: a reader of the previous frame in this slot no longer matches
+            self.header[index, _SEQ] = 0
+            self.header[index, _STATE] = BUSY
+            np.copyto(self.color[index], color)
+            if depth is not None and self.depth is not None:
+                np.copyto(self.depth[index], depth)
+            self.timestamps[index] = timestamp
+            self.header[index, _SEQ] = seq
+            self.written += 1
+        return index
+
+    def read(self, index, seq):
+        """(color, depth) views of the slot, or None if it no longer holds frame seq. depth is None without depth."""
+        if self.header[index, _SEQ] != seq:
+            return None
+        return self.color[index], (self.depth[index] if self.depth is not None else None)
+
+    def intact(self, index, seq):
+        """True while the slot still holds frame seq; check after using the views from read()."""
+        return self.header[index, _SEQ] == seq
+
+    def release(self, index, seq):
+        """Let the writer reuse the slot; ignored if it was already overwritten with another frame."""
+        if self.header[index, _SEQ] == seq:
+            self.header[index, _STATE] = FREE
+
+    def close(self):
+        # The arrays export the buffer, so they have to go before the mapping can be closed
+        self.header = self.timestamps = self.color = self.depth = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def stats_text(self):
+        return (f"Slots free: {self.free_slots()}/{self.slots}  Written: {self.written}  "
+                f"Dropped: {self.dropped}  Overwritten: {self.overwritten}")
+
+
+class FrameChannel:
+    """One producer's frames into a FrameRing that is replaced when the frame size changes.
+
+    write() returns (ring, index) to send as (ring.spec(), index, seq), or None
+    when every slot is in use; release() once the worker is done. Releases for a
+    ring that has since been replaced are ignored.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.ring = None
+        self._lock = threading.Lock()
+
+    def write(self, seq, color, depth=None):
+        with self._lock:
+            if self.ring is None or not self.ring.fits(color, depth):
+                if self.ring is not None:
+                    self.ring.close()
+                self.ring = FrameRing(self.slots, color.shape, depth.shape if depth is not None else None)
+            index = self.ring.write(seq, color, depth, time.perf_counter())
+            return None if index is None else (self.ring, index)
+
+    def release(self, ring, index, seq):
+        with self._lock:
+            if ring is self.ring:
+                ring.release(index, seq)
+
+    def close(self):
+        with self._lock:
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+
+# Rings mapped by this worker process, by name, least recently used first. A producer replaces
+# its ring when the frame size changes, so the oldest mappings are closed rather than kept forever
+_attached = collections.OrderedDict()
+MAX_ATTACHED = 16
+
+
+def attached_ring(spec):
+    """The ring described by spec, mapped once per process."""
+    ring = _attached.get(spec["name"])
+    if ring is not None:
+        _attached.move_to_end(spec["name"])
+        return ring
+    ring = _attached[spec["name"]] = FrameRing.attach(spec)
+    while len(_attached) > MAX_ATTACHED:
+        _, oldest = _attached.popitem(last=False)
+        try:
+            oldest.close()
+        except BufferError:
+            pass  # A frame view is still alive somewhere; the mapping goes with the last view
+    return ring
+
+
+def _queue_consumer(queue, results):
+    latencies = []
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        seq, color, depth, timestamp = item
+        int(color[0, 0, 0]) + int(depth[0, 0])  # Touch the frame as a worker would
+        latencies.append(time.perf_counter() - timestamp)
+    results.put((time.process_time(), latencies))
+
+
+def _ring_consumer(spec, queue, results):
+    ring = FrameRing.attach(spec)
+    latencies = []
+    overwritten = 0
+    frame = color = depth = None
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        index, seq = item
+        frame = ring.read(index, seq)
+        if frame is None:
+            overwritten += 1
+            continue
+        color, depth = frame
+        int(color[0, 0, 0]) + int(depth[0, 0])
+        if not ring.intact(index, seq):
+            overwritten += 1
+        latencies.append(time.perf_counter() - ring.timestamps[index])
+        ring.release(index, seq)
+    del frame, color, depth
+    ring.close()
+    results.put((time.process_time(), latencies, overwritten))
+
+
+def _report(name, frames, elapsed, producer_cpu, consumer_cpu, latencies):
+    ms = np.asarray(latencies) * 1000.0
+    print(f"{name:18s} {frames / elapsed:8.1f} frames/s  producer {producer_cpu / frames * 1e6:7.1f} us/frame  "
+          f"consumer {consumer_cpu / frames * 1e6:7.1f} us/frame  latency p50 {np.percentile(ms, 50):6.2f} ms  "
+          f"p99 {np.percentile(ms, 99):6.2f} ms")
+
+
+def benchmark(frames=600, width=640, height=480, slots=8):
+    """Send frames unpaced to one consumer process through each transport and print the costs per frame."""
+    from frame_source import synthetic_frame
+
+    color, depth = synthetic_frame(width, height, 20, np.random.default_rng(0))
+    print(f"{frames} frames of {width}x{height} color + depth ({(color.nbytes + depth.nbytes) / 1e6:.2f} MB per pair)")
+
+    # multiprocessing.Queue: pickled by the producer's feeder thread, unpickled by the consumer
+    queue, results = multiprocessing.Queue(maxsize=slots), multiprocessing.Queue()
+    consumer = multiprocessing.Process(target=_queue_consumer, args=(queue, results))
+    consumer.start()
+    cpu, start = time.process_time(), time.perf_counter()
+    for seq in range(1, frames + 1):
+        queue.put((seq, color, depth, time.perf_counter()))
+    queue.put(None)
+    consumer_cpu, latencies = results.get()
+    elapsed, producer_cpu = time.perf_counter() - start, time.process_time() - cpu
+    consumer.join()
+    _report("multiprocessing.Queue", frames, elapsed, producer_cpu, consumer_cpu, latencies)
+
+    # Shared-memory ring: one copy into a slot, only (index, seq) through the queue
+    ring = FrameRing(slots, color.shape, depth.shape)
+    queue, results = multiprocessing.Queue(), multiprocessing.Queue()
+    consumer = multiprocessing.Process(target=_ring_consumer, args=(ring.spec(), queue, results))
+    consumer.start()
+    cpu, start = time.process_time(), time.perf_counter()
+    for seq in range(1, frames + 1):
+        index = ring.write(seq, color, depth, time.perf_counter())
+        while index is None:
+            time.sleep(0.0001)  # Every slot is still being read
+            index = ring.write(seq, color, depth, time.perf_counter())
+        queue.put((index, seq))
+    queue.put(None)
+    consumer_cpu, latencies, overwritten = results.get()
+    elapsed, producer_cpu = time.perf_counter() - start, time.process_time() - cpu
+    consumer.join()
+    _report("shared-memory ring", frames, elapsed, producer_cpu, consumer_cpu, latencies)
+    print(f"Ring: {ring.stats_text()}  Overwrites seen by the consumer: {overwritten}")
+    ring.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare frame transport through shared memory and a queue.")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--slots", type=int, default=8)
+    args = parser.parse_args(argv)
+    benchmark(args.frames, args.width, args.height, args.slots)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
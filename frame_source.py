@@ -0,0 +1,352 @@
+"""Frame sources: live RealSense, on-disk recordings and synthetic frames.
+
+Record a camera session and replay it without the camera:
+    python frame_source.py record session_dir --frames 300
+    python frame_source.py info session_dir
+    python frame_source.py replay session_dir --mode fast
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+REALTIME = "realtime"
+FIXED = "fixed"
+FAST = "fast"
+PLAYBACK_MODES = (REALTIME, FIXED, FAST)
+
+
+class FrameSource:
+    """Produces aligned (color, depth, timestamp) triples.
+
+    color is HxWx3 uint8 BGR, depth is HxW uint16 in device units (multiply by
+    depth_scale for meters) and timestamp is in seconds. read() returns None once
+    a finite source is exhausted and raises RuntimeError when a live device stalls.
+    intrinsics is the color camera's (fx, fy, cx, cy) in pixels, or None if unknown.
+    """
+
+    width = 640
+    height = 480
+    fps = 30
+    depth_scale = 0.001
+    intrinsics = None
+
+    def start(self):
+        pass
+
+    def read(self):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+    def __iter__(self):
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
+
+
+# Largest depth mode of the D400 series; higher color modes are paired with it and aligned up
+MAX_DEPTH_SIZE = (1280, 720)
+
+
+class RealSenseSource(FrameSource):
+    def __init__(self, width=640, height=480, fps=30, serial=None, timeout_ms=1000):
+        # Imported here so recordings and synthetic frames work without librealsense
+        import pyrealsense2 as rs
+
+        self.width, self.height, self.fps = width, height, fps
+        self.serial = serial
+        self.timeout_ms = timeout_ms
+        self.pipeline = rs.pipeline()
+        self.config = rs.config()
+        if serial:
+            self.config.enable_device(serial)
+        self.config.enable_stream(rs.stream.color, width, height, rs.format.bgr8, fps)
+        depth_width, depth_height = min((width, height), MAX_DEPTH_SIZE)
+        self.config.enable_stream(rs.stream.depth, depth_width, depth_height, rs.format.z16, fps)
+        # Map depth pixels onto the color image so both arrays share coordinates
+        self.align = rs.align(rs.stream.color)
+
+    def start(self):
+        import pyrealsense2 as rs
+
+        profile = self.pipeline.start(self.config)
+        self.depth_scale = profile.get_device().first_depth_sensor().get_depth_scale()
+        # Depth is aligned to color, so the color intrinsics apply to both
+        i = profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+        self.intrinsics = (i.fx, i.fy, i.ppx, i.ppy)
+
+    def read(self):
+        frames = self.align.process(self.pipeline.wait_for_frames(self.timeout_ms))
+        color_frame = frames.get_color_frame()
+        depth_frame = frames.get_depth_frame()
+        if not color_frame or not depth_frame:
+            raise RuntimeError("Incomplete frame set")
+
+        # Copy out of the librealsense frame pool so the camera can recycle its buffers
+        color_image = np.array(color_frame.get_data(), copy=True)
+        depth_image = np.array(depth_frame.get_data(), copy=True)
+        return color_image, depth_image, frames.get_timestamp() / 1000.0
+
+    def stop(self):
+        self.pipeline.stop()
+
+
+class Recorder:
+    """Appends aligned frames to raw color/depth/timestamp files in a directory."""
+
+    def __init__(self, path, width, height, fps=30, depth_scale=0.001, intrinsics=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta = {"width": width, "height": height, "fps": fps, "depth_scale": depth_scale,
+                     "intrinsics": list(intrinsics) if intrinsics else None, "frames": 0}
+        self._color = open(os.path.join(path, "color.u8"), "wb")
+        self._depth = open(os.path.join(path, "depth.u16"), "wb")
+        self._timestamps = open(os.path.join(path, "timestamps.f64"), "wb")
+
+    def write(self, color_image, depth_image, timestamp):
+        self._color.write(np.ascontiguousarray(color_image, np.uint8).tobytes())
+        self._depth.write(np.ascontiguousarray(depth_image, np.uint16).tobytes())
+        self._timestamps.write(np.float64(timestamp).tobytes())
+        self.meta["frames"] += 1
+
+    def close(self):
+        for f in (self._color, self._depth, self._timestamps):
+            f.close()
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def record(source, path, frames):
+    """Record up to `frames` frames from a source into path."""
+    source.start()
+    try:
+        with Recorder(path, source.width, source.height, source.fps, source.depth_scale, source.intrinsics) as recorder:
+            for i, (color_image, depth_image, timestamp) in enumerate(source):
+                if i >= frames:
+                    break
+                recorder.write(color_image, depth_image, timestamp)
+    finally:
+        source.stop()
+    return recorder.meta
+
+
+class RecordedSource(FrameSource):
+    """Replays a recording through memory-mapped arrays; read() returns views, not copies.
+
+    mode is "realtime" (honor recorded timestamps), "fixed" (pace at `fps`) or
+    "fast" (no pacing, for throughput measurements).
+    """
+
+    def __init__(self, path, mode=REALTIME, fps=None, loop=False):
+        if mode not in PLAYBACK_MODES:
+            raise ValueError(f"Unknown playback mode {mode!r}; expected one of {PLAYBACK_MODES}")
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.mode = mode
+        self.loop = loop
+        self.width, self.height = self.meta["width"], self.meta["height"]
+        self.fps = fps or self.meta["fps"]
+        self.depth_scale = self.meta["depth_scale"]
+        self.intrinsics = tuple(self.meta["intrinsics"]) if self.meta.get("intrinsics") else None
+        self.frames = self.meta["frames"]
+        if self.frames == 0:
+            raise ValueError("recording has no frames")  # np.memmap cannot map an empty file
+
+        n, h, w = self.frames, self.height, self.width
+        self.color = np.memmap(os.path.join(path, "color.u8"), np.uint8, "r", shape=(n, h, w, 3))
+        self.depth = np.memmap(os.path.join(path, "depth.u16"), np.uint16, "r", shape=(n, h, w))
+        self.timestamps = np.memmap(os.path.join(path, "timestamps.f64"), np.float64, "r", shape=(n,))
+        self.position = 0
+        self._clock_start = None
+
+    def start(self):
+        self.position = 0
+        self._clock_start = None
+
+    def _pace(self, index):
+        if self.mode == FAST:
+            return
+        now = time.perf_counter()
+        if self._clock_start is None:
+            self._clock_start = now - self._offset(index)
+        delay = self._clock_start + self._offset(index) - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def _offset(self, index):
+        if self.mode == REALTIME:
+            return float(self.timestamps[index] - self.timestamps[0])
+        return index / self.fps
+
+    def read(self):
+        if self.position >= self.frames:
+            if not self.loop:
+                return None
+            self.position = 0
+            self._clock_start = None
+        index = self.position
+        self.position += 1
+        self._pace(index)
+        return self.color[index], self.depth[index], float(self.timestamps[index])
+
+
+def synthetic_frame(width=640, height=480, fruits=20, rng=None, radius=(18, 40)):
+    """Draw a tray of round fruits with a few dark blemishes and a matching depth map."""
+    rng = rng if rng is not None else np.random.default_rng()
+    color_image = np.full((height, width, 3), (200, 205, 210), np.uint8)
+    depth_image = np.full((height, width), 800, np.uint16)  # Tray 0.8 m from the camera
+
+    scale = width / 640
+    # Focal length of default_intrinsics, so fruit depth is a true sphere in camera coordinates
+    focal = 600.0 * scale
+    yy, xx = np.mgrid[0:height, 0:width]
+    for _ in range(fruits):
+        r = int(rng.integers(radius[0], radius[1]) * scale)
+        cx = int(rng.integers(r, max(r + 1, width - r)))
+        cy = int(rng.integers(r, max(r + 1, height - r)))
+        hue_bgr = (int(rng.integers(0, 60)), int(rng.integers(40, 140)), int(rng.integers(150, 230)))
+        cv2.circle(color_image, (cx, cy), r, hue_bgr, -1)
+
+        # Spherical cap in depth: the fruit top is closer to the camera than the tray
+        x0, x1, y0, y1 = max(cx - r, 0), min(cx + r + 1, width), max(cy - r, 0), min(cy + r + 1, height)
+        d2 = (xx[y0:y1, x0:x1] - cx) ** 2 + (yy[y0:y1, x0:x1] - cy) ** 2
+        inside = d2 <= r * r
+        cap = (800 - np.sqrt(np.maximum(r * r - d2, 0)) * 800 / focal).astype(np.uint16)
+        depth_image[y0:y1, x0:x1][inside] = np.minimum(depth_image[y0:y1, x0:x1][inside], cap[inside])
+
+        if rng.random() < 0.3:
+            # Blemish: a dark spot on the skin with a shallow dent under it
+            bx, by, br = cx + r // 3, cy - r // 4, max(2, r // 5)
+            cv2.circle(color_image, (bx, by), br, (30, 40, 50), -1)
+            dent = inside & ((xx[y0:y1, x0:x1] - bx) ** 2 + (yy[y0:y1, x0:x1] - by) ** 2 <= br * br)
+            depth_image[y0:y1, x0:x1][dent] += 6
+
+    # Sensor holes, as on real RealSense depth
+    depth_image[rng.random((height, width)) < 0.02] = 0
+    return color_image, depth_image
+
+
+class SyntheticSource(FrameSource):
+    """Generates `frames` synthetic frames (unbounded if None) from a fixed pool of variants."""
+
+    def __init__(self, width=640, height=480, fps=30, frames=None, fruits=20, variants=8, seed=0, mode=FAST):
+        self.width, self.height, self.fps = width, height, fps
+        self.frames = frames
+        self.mode = mode
+        self.fruits, self.variants, self.seed = fruits, variants, seed
+        self.pool = None
+        self.position = 0
+        self._clock_start = None
+
+    def start(self):
+        if self.pool is None:
+            # Pre-render a few variants so generation cost never shows up in measurements; done here rather
+            # than in __init__ so it runs on the capture thread when that starts the source
+            rng = np.random.default_rng(self.seed)
+            self.pool = [synthetic_frame(self.width, self.height, self.fruits, rng) for _ in range(self.variants)]
+        self.position = 0
+        self._clock_start = None
+
+    def read(self):
+        if self.frames is not None and self.position >= self.frames:
+            return None
+        if self.mode != FAST:
+            now = time.perf_counter()
+            if self._clock_start is None:
+                self._clock_start = now
+            delay = self._clock_start + self.position / self.fps - now
+            if delay > 0:
+                time.sleep(delay)
+        color_image, depth_image = self.pool[self.position % len(self.pool)]
+        self.position += 1
+        return color_image, depth_image, self.position / self.fps
+
+
+def open_source(replay=None, synthetic=False, mode=REALTIME, width=640, height=480, fps=30, loop=True, serial=None,
+                seed=0):
+    """Build the source selected on a command line: a replay, synthetic frames or the camera (by serial)."""
+    if replay:
+        return RecordedSource(replay, mode=mode, loop=loop)
+    if synthetic:
+        return SyntheticSource(width, height, fps, seed=seed, mode=FIXED if mode == REALTIME else mode)
+    return RealSenseSource(width, height, fps, serial=serial)
+
+
+def connected_serials():
+    """Serial numbers of the RealSense devices plugged in, in enumeration order."""
+    import pyrealsense2 as rs
+
+    return [device.get_info(rs.camera_info.serial_number) for device in rs.context().query_devices()]
+
+
+RESOLUTIONS = {"640x480": (640, 480), "1280x720": (1280, 720), "1920x1080": (1920, 1080)}
+
+
+def add_source_arguments(parser):
+    parser.add_argument("--replay", metavar="DIR", help="replay a recording instead of using the camera")
+    parser.add_argument("--synthetic", action="store_true", help="use generated frames instead of the camera")
+    parser.add_argument("--mode", choices=PLAYBACK_MODES, default=REALTIME, help="replay pacing")
+    parser.add_argument("--resolution", choices=sorted(RESOLUTIONS), default="640x480",
+                        help="color resolution of the camera or synthetic frames")
+    parser.add_argument("--serial", help="serial number of the RealSense device to use (default: the first found)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record, inspect and replay aligned color/depth streams.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="record frames from the camera (or --synthetic)")
+    rec.add_argument("path")
+    rec.add_argument("--frames", type=int, default=300)
+    rec.add_argument("--synthetic", action="store_true")
+    rec.add_argument("--width", type=int, default=640)
+    rec.add_argument("--height", type=int, default=480)
+    rec.add_argument("--fps", type=int, default=30)
+
+    info = commands.add_parser("info", help="describe a recording")
+    info.add_argument("path")
+
+    replay = commands.add_parser("replay", help="replay a recording and report throughput")
+    replay.add_argument("path")
+    replay.add_argument("--mode", choices=PLAYBACK_MODES, default=FAST)
+    replay.add_argument("--fps", type=float)
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        if args.synthetic:
+            source = SyntheticSource(args.width, args.height, args.fps, frames=args.frames)
+        else:
+            source = RealSenseSource(args.width, args.height, args.fps)
+        meta = record(source, args.path, args.frames)
+        print(f"Recorded {meta['frames']} frames to {args.path}")
+    elif args.command == "info":
+        source = RecordedSource(args.path)
+        duration = float(source.timestamps[-1] - source.timestamps[0]) if source.frames else 0.0
+        print(json.dumps(dict(source.meta, duration_s=round(duration, 3)), indent=2))
+    else:
+        source = RecordedSource(args.path, mode=args.mode, fps=args.fps)
+        source.start()
+        start = time.perf_counter()
+        count = sum(1 for _ in source)
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {count} frames in {elapsed:.3f}s ({count / elapsed if elapsed else 0:.1f} fps, mode={args.mode})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import time
+
+from PyQt5.QtCore import QRect, Qt, QTimer
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QFrame
+
+
+def wrap_array(image):
+    """Wrap a BGR or grayscale uint8 numpy image as a QImage that shares its memory."""
+    if not image.flags["C_CONTIGUOUS"]:
+        import numpy as np  # Loaded by whoever made the array; kept out of this module's import
+
+        image = np.ascontiguousarray(image)
+    h, w = image.shape[:2]
+    if image.ndim == 2:
+        fmt = QImage.Format_Grayscale8
+    elif image.shape[2] == 3:
+        fmt = QImage.Format_BGR888
+    else:
+        raise ValueError(f"Unsupported image shape {image.shape}")
+    # The QImage does not own the buffer, so the array is returned to be kept alive with it
+    return QImage(image.data, w, h, image.strides[0], fmt), image
+
+
+class FrameView(QFrame):
+    """Displays numpy frames without copying or converting them.
+
+    The frame is wrapped as a QImage in its native BGR888/Grayscale8 layout and
+    scaled by Qt at paint time. Repaints are skipped when the frame has not
+    changed or the widget is hidden, and capped at max_fps independently of how
+    often set_frame is called.
+    """
+
+    def __init__(self, text="", parent=None, max_fps=30):
+        super().__init__(parent)
+        self.text = text
+        self.max_fps = max_fps
+        self._image = None
+        self._buffer = None
+        self._key = None
+        self._last_repaint = 0.0
+        self.frames_shown = 0
+        self.frames_skipped = 0
+
+        # Fires once to paint a frame that arrived while throttled
+        self._pending = QTimer(self)
+        self._pending.setSingleShot(True)
+        self._pending.timeout.connect(self._repaint_now)
+
+    def set_frame(self, image, key=None):
+        """Show a new frame; key identifies the frame so repeats can be ignored."""
+        if key is not None and key == self._key:
+            self.frames_skipped += 1
+            return
+        self._key = key
+        self._image, self._buffer = wrap_array(image)
+
+        if not self.isVisible():
+            # Painted when the widget is shown again
+            self.frames_skipped += 1
+            return
+
+        interval = 1.0 / self.max_fps if self.max_fps else 0.0
+        wait = self._last_repaint + interval - time.perf_counter()
+        if wait > 0:
+            self.frames_skipped += 1
+            if not self._pending.isActive():
+                self._pending.start(int(wait * 1000) + 1)
+            return
+        self._repaint_now()
+
+    def clear(self, text=None):
+        """Drop the current frame and show text (or the original placeholder) instead."""
+        if text is not None:
+            self.text = text
+        self._image = self._buffer = self._key = None
+        self.update()
+
+    def _repaint_now(self):
+        self._last_repaint = time.perf_counter()
+        self.frames_shown += 1
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        painter = QPainter(self)
+        area = self.contentsRect()
+        if self._image is None:
+            painter.drawText(area, Qt.AlignCenter, self.text)
+            return
+
+        # Fit the frame into the widget keeping its aspect ratio; Qt does the scaling
+        w, h = self._image.width(), self._image.height()
+        scale = min(area.width() / w, area.height() / h)
+        target_w, target_h = int(w * scale), int(h * scale)
+        target = QRect(area.x() + (area.width() - target_w) // 2, area.y() + (area.height() - target_h) // 2,
+                       target_w, target_h)
+        painter.drawImage(target, self._image)
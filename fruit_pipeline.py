@@ -0,0 +1,747 @@
+import argparse
+import concurrent.futures
+import os
+import time
+
+import cv2
+import numpy as np
+
+from buffer_pool import BufferPool
+from color_lut import ColorClass, label_image, segmenter_for
+from depth_defects import draw_depth_defects, sphere_defects
+from distance_peaks import distance_map, distance_peaks, split_regions, watershed_split
+from instrumentation import METRICS
+from region_stats import label_regions
+from tuning_profile import load_profile, make_profile
+
+
+def _gray(ctx):
+    return cv2.cvtColor(ctx.color, cv2.COLOR_BGR2GRAY, dst=ctx.buffer(ctx.color.shape[:2]))
+
+
+def _hsv_mask(ctx):
+    # Profile-selected color classes instead of a gray threshold; every class counts as fruit
+    return cv2.compare(ctx.get("color_labels"), 0, cv2.CMP_GT)
+
+
+def _otsu(ctx):
+    if ctx.options.get("segmentation") == "hsv":
+        return _hsv_mask(ctx)
+    # Apply a threshold to create a binary image
+    level = ctx.options.get("threshold", 0)
+    gray = ctx.get("gray")
+    if level:
+        return cv2.threshold(gray, level, 255, _polarity(ctx), dst=ctx.buffer(gray.shape))[1]
+    _, thresh = cv2.threshold(gray, 128, 255, _polarity(ctx) + cv2.THRESH_OTSU, dst=ctx.buffer(gray.shape))
+    return thresh
+
+
+def _polarity(ctx):
+    # Dark fruit on a bright tray become the white pixels of the mask, and the other way round
+    return cv2.THRESH_BINARY_INV if ctx.options.get("dark_fruit", True) else cv2.THRESH_BINARY
+
+
+def _morph_kernel(ctx):
+    size = ctx.options.get("morph_kernel", 3)
+    return np.ones((size, size), np.uint8)
+
+
+def _morphology(ctx):
+    # Define a kernel for morphological operations
+    kernel = _morph_kernel(ctx)
+    thresh = ctx.get("otsu")
+
+    # Apply closing to close small gaps within objects
+    closed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, dst=ctx.buffer(thresh.shape))
+
+    # Apply opening to separate overlapping objects
+    return cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel, dst=ctx.buffer(thresh.shape))
+
+
+def _blurred(ctx):
+    size = ctx.options.get("blur_kernel", 15)
+    gray = ctx.get("gray")
+    return cv2.GaussianBlur(gray, (size, size), 0, dst=ctx.buffer(gray.shape))
+
+
+def _contours(ctx):
+    # Find contours on the processed binary image
+    contours, _ = cv2.findContours(ctx.get("morphology"), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+
+def _boxes(ctx):
+    # Bounding box (x, y, w, h) of every segmented fruit
+    contours = ctx.get("contours")
+    if not contours:
+        return np.zeros((0, 4), np.int32)
+    return np.array([cv2.boundingRect(contour) for contour in contours], np.int32)
+
+
+def _regions(ctx):
+    # Connected fruit regions of the segmentation mask, for per-fruit depth work
+    mask = ctx.get("morphology")
+    return label_regions(mask, min_area=ctx.options.get("min_region_area", 100), labels=ctx.buffer(mask.shape, np.int32))
+
+
+def _color_labels(ctx):
+    # Multi-class color label map (0 = background), one table lookup per pixel; see color_lut.
+    # Without configured classes, the profile's HSV range is the one class
+    classes = ctx.options.get("color_classes") or (
+        ColorClass("fruit", tuple(ctx.options["hsv_lower"]), tuple(ctx.options["hsv_upper"])),)
+    if not ctx.options.get("color_table", True):
+        return label_image(ctx.color, classes)  # Ranges that change every frame (the tuner) skip the table build
+    return segmenter_for(classes).labels(ctx.color)
+
+
+def _distance(ctx):
+    # Distance to the tray inside the fruit mask; peaks sit at the fruit centers. Holes smaller
+    # than the smallest fruit are glare or stalks, larger ones are tray showing between fruits
+    min_radius = ctx.options.get("min_radius", 10)
+    return distance_map(ctx.get("morphology"), np.pi * min_radius * min_radius)
+
+
+def _peaks(ctx):
+    return distance_peaks(ctx.get("distance"), ctx.options.get("min_radius", 10), ctx.options.get("max_radius", 60),
+                          ctx.options.get("hough_min_dist", 30))
+
+
+def _depth_u8(ctx):
+    if ctx.depth is None:
+        return None
+    return cv2.convertScaleAbs(ctx.depth, dst=ctx.buffer(ctx.depth.shape), alpha=0.03)
+
+
+# Every intermediate a detector may ask for, keyed by name
+INTERMEDIATES = {
+    "gray": _gray,
+    "otsu": _otsu,
+    "morphology": _morphology,
+    "blurred": _blurred,
+    "contours": _contours,
+    "boxes": _boxes,
+    "regions": _regions,
+    "distance": _distance,
+    "peaks": _peaks,
+    "color_labels": _color_labels,
+    "depth_u8": _depth_u8,
+}
+
+
+def merge_overlapping(rois):
+    """Merge (x0, y0, x1, y1) rectangles until none of them overlap."""
+    rois = [list(roi) for roi in rois]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rois[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return np.array(rois, np.int32).reshape(-1, 4)
+
+
+def _coarse_gray(ctx):
+    # Full-resolution gray is needed for refinement and defects anyway, so downscale that
+    scale = ctx.options["coarse_scale"]
+    return cv2.resize(ctx.get("gray"), None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _coarse_segmentation(ctx):
+    # Otsu threshold and morphology at the coarse level; returns the threshold and coarse boxes
+    level = ctx.options.get("threshold", 0)
+    flags = _polarity(ctx) if level else _polarity(ctx) + cv2.THRESH_OTSU
+    value, thresh = cv2.threshold(ctx.get("coarse_gray"), level or 128, 255, flags)
+    kernel = _morph_kernel(ctx)
+    closed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    opened = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel)
+    contours, _ = cv2.findContours(opened, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = np.array([cv2.boundingRect(contour) for contour in contours], np.int32).reshape(-1, 4)
+    return value, boxes
+
+
+def _refine_rois(ctx):
+    # Coarse boxes mapped to full resolution, padded, and merged so no pixel is refined twice
+    _, boxes = ctx.get("coarse_segmentation")
+    scale = ctx.options["coarse_scale"]
+    height, width = ctx.color.shape[:2]
+    full = np.round(boxes / scale).astype(np.int32)
+    return merge_overlapping(pad_boxes(full, ctx.options["refine_pad"], width, height))
+
+
+def _refine_everywhere(ctx):
+    # Refining region by region only pays off while the regions leave most of the frame empty
+    rois = ctx.get("refine_rois")
+    height, width = ctx.color.shape[:2]
+    area = ((rois[:, 2] - rois[:, 0]) * (rois[:, 3] - rois[:, 1])).sum()
+    return area > ctx.options.get("max_coverage", 0.5) * width * height
+
+
+def _pyramid_otsu(ctx):
+    # Full-resolution threshold only inside the refined regions, using the coarse Otsu level
+    value, _ = ctx.get("coarse_segmentation")
+    gray = ctx.get("gray")
+    if _refine_everywhere(ctx):
+        return cv2.threshold(gray, value, 255, _polarity(ctx), dst=ctx.buffer(gray.shape))[1]
+    thresh = ctx.zeros(gray.shape)
+    for x0, y0, x1, y1 in ctx.get("refine_rois"):
+        _, thresh[y0:y1, x0:x1] = cv2.threshold(gray[y0:y1, x0:x1], value, 255, _polarity(ctx))
+    return thresh
+
+
+def _pyramid_morphology(ctx):
+    if _refine_everywhere(ctx):
+        return _morphology(ctx)
+    kernel = _morph_kernel(ctx)
+    thresh = ctx.get("otsu")
+    opened = ctx.zeros(thresh.shape)
+    for x0, y0, x1, y1 in ctx.get("refine_rois"):
+        closed = cv2.morphologyEx(thresh[y0:y1, x0:x1], cv2.MORPH_CLOSE, kernel)
+        opened[y0:y1, x0:x1] = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel)
+    return opened
+
+
+# Coarse-to-fine variant: segment on a downscaled level, refine at full resolution inside the regions
+PYRAMID_INTERMEDIATES = dict(
+    INTERMEDIATES,
+    coarse_gray=_coarse_gray,
+    coarse_segmentation=_coarse_segmentation,
+    refine_rois=_refine_rois,
+    otsu=_pyramid_otsu,
+    morphology=_pyramid_morphology,
+)
+
+
+class FrameContext:
+    """Per-frame intermediates, each computed once on first use and shared by all detectors."""
+
+    def __init__(self, color_image, depth_image=None, intermediates=None, options=None, pool=None):
+        """With a BufferPool, intermediates and result images are written into pooled arrays until release()."""
+        self.color = color_image
+        self.depth = depth_image
+        self.intermediates = intermediates if intermediates is not None else INTERMEDIATES
+        self.options = options or {}
+        self.pool = pool
+        self._cache = {}
+        self._buffers = []
+        # Seconds spent computing each intermediate or detector, excluding nested work
+        self.timings = {}
+        self._nested = 0.0
+
+    def get(self, name):
+        if name not in self._cache:
+            if METRICS.enabled:
+                self._cache[name] = self.timed("ctx." + name, self.intermediates[name], self)
+            else:
+                self._cache[name] = self.intermediates[name](self)
+        return self._cache[name]
+
+    def timed(self, stage, fn, *args):
+        """Call fn, recording its own time (minus intermediates it triggered) under stage."""
+        outer_nested = self._nested
+        self._nested = 0.0
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            own = elapsed - self._nested
+            self._nested = outer_nested + elapsed
+            self.timings[stage] = own
+            METRICS.observe(stage, own)
+
+    def require(self, names):
+        """Compute the given intermediates up front."""
+        for name in names:
+            self.get(name)
+
+    def computed(self):
+        return list(self._cache)
+
+    def buffer(self, shape, dtype=np.uint8):
+        """A pooled dst= array for this frame, or None (OpenCV allocates) without a pool."""
+        if self.pool is None:
+            return None
+        buffer = self.pool.acquire(shape, dtype)
+        self._buffers.append(buffer)
+        return buffer
+
+    def zeros(self, shape, dtype=np.uint8):
+        buffer = self.buffer(shape, dtype)
+        if buffer is None:
+            return np.zeros(shape, dtype)
+        buffer.fill(0)
+        return buffer
+
+    def copy(self, image):
+        """A copy of image to draw on, in a pooled array when there is a pool."""
+        buffer = self.buffer(image.shape, image.dtype)
+        if buffer is None:
+            return np.copy(image)
+        np.copyto(buffer, image)
+        return buffer
+
+    def release(self):
+        """Return this frame's pooled arrays; its intermediates and result images must no longer be used."""
+        if self.pool is not None:
+            for buffer in self._buffers:
+                self.pool.release(buffer)
+        self._buffers = []
+        self._cache.clear()
+        self.color = self.depth = None
+
+    def invalidate(self, names):
+        """Forget the given intermediates so the next get() recomputes them, e.g. after an option changed."""
+        for name in names:
+            self._cache.pop(name, None)
+            self.timings.pop("ctx." + name, None)
+
+
+class FruitCountDetector:
+    name = "count"
+    requires = ("otsu", "contours", "boxes")
+
+    def run(self, ctx):
+        contours = ctx.get("contours")
+        boxes = ctx.get("boxes")
+
+        # Count the contours, assuming each contour is a fruit
+        fruit_count = len(contours)
+
+        # Copy the threshold image for labeling; the cached one is shared with other detectors
+        threshold_with_numbers = ctx.copy(ctx.get("otsu"))
+
+        # Loop through each contour and add a number on the threshold image
+        centroids = []
+        centroid_boxes = []
+        for i, contour in enumerate(contours):
+            # Get the center of the contour
+            M = cv2.moments(contour)
+            if M["m00"] != 0:
+                cX = int(M["m10"] / M["m00"])
+                cY = int(M["m01"] / M["m00"])
+                centroids.append((i + 1, cX, cY))
+                centroid_boxes.append(tuple(int(v) for v in boxes[i]))
+                cv2.putText(threshold_with_numbers, str(i + 1), (cX - 10, cY - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+        return {"threshold_image": threshold_with_numbers, "labeled_image": ctx.color, "fruit_count": fruit_count,
+                "centroids": centroids, "boxes": centroid_boxes}
+
+
+class WatershedCountDetector:
+    """One region per distance peak, so touching fruits that merge into one contour are counted apart.
+
+    The peaks seed a marker watershed on the color image (see distance_peaks);
+    regions up to min_region_area pixels, slivers left where two floods meet,
+    are not counted.
+    """
+
+    name = "count"
+    requires = ("otsu", "morphology", "peaks")
+
+    def run(self, ctx):
+        peaks = ctx.get("peaks")
+        labels = watershed_split(ctx.color, ctx.get("morphology"), peaks)
+        regions = split_regions(labels, len(peaks), ctx.options.get("min_region_area", 100))
+
+        threshold_with_numbers = ctx.copy(ctx.get("otsu"))
+        centroids = []
+        centroid_boxes = []
+        for i, ((x, y), box) in enumerate(zip(regions.centroids, regions.boxes)):
+            cX, cY = int(x), int(y)
+            centroids.append((i + 1, cX, cY))
+            centroid_boxes.append(tuple(int(v) for v in box))
+            cv2.putText(threshold_with_numbers, str(i + 1), (cX - 10, cY - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+        return {"threshold_image": threshold_with_numbers, "labeled_image": ctx.color, "fruit_count": len(regions),
+                "centroids": centroids, "boxes": centroid_boxes}
+
+
+def draw_circles(color_image, circles, out=None):
+    """Draw circles on a copy of the image (in out, if given); returns the image, count and (x, y, r) list."""
+    if out is None:
+        faulty_image = np.copy(color_image)
+    else:
+        faulty_image = out
+        np.copyto(faulty_image, color_image)
+    faulty_count = 0
+    found = []
+
+    if circles is not None:
+        circles = np.uint16(np.around(circles))
+        for i in circles[0, :]:
+            center = (int(i[0]), int(i[1]))
+            radius = int(i[2])
+            cv2.circle(faulty_image, center, radius, (0, 255, 0), 2)  # Draw circle
+            cv2.rectangle(faulty_image, (center[0] - 5, center[1] - 5), (center[0] + 5, center[1] + 5), (0, 0, 255), 3)  # Draw center
+
+            found.append((int(i[0]), int(i[1]), int(radius)))
+            faulty_count += 1
+
+    return faulty_image, faulty_count, found
+
+
+class CircleDefectDetector:
+    """Hough circles over the whole blurred frame."""
+
+    name = "faulty"
+    requires = ("blurred",)
+
+    def __init__(self, min_dist=30, param1=50, param2=30, min_radius=10, max_radius=60):
+        self.min_dist = min_dist
+        self.param1 = param1
+        self.param2 = param2
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+
+    def run(self, ctx):
+        # Detect circles using Hough Circle Transform
+        circles = cv2.HoughCircles(ctx.get("blurred"), cv2.HOUGH_GRADIENT, 1, self.min_dist, param1=self.param1,
+                                   param2=self.param2, minRadius=self.min_radius, maxRadius=self.max_radius)
+
+        faulty_image, faulty_count, found = draw_circles(ctx.color, circles, ctx.buffer(ctx.color.shape))
+        return {"faulty_image": faulty_image, "faulty_count": faulty_count, "circles": found}
+
+
+# Shared by every ROI detector; OpenCV releases the GIL so threads scale across cores
+_roi_executor = None
+
+
+def roi_executor():
+    global _roi_executor
+    if _roi_executor is None:
+        _roi_executor = concurrent.futures.ThreadPoolExecutor(os.cpu_count() or 1, thread_name_prefix="roi")
+    return _roi_executor
+
+
+def pad_boxes(boxes, pad, width, height, min_size=0):
+    """Grow (x, y, w, h) boxes by pad on every side and clip them to the frame as (x0, y0, x1, y1)."""
+    boxes = np.asarray(boxes, np.int32).reshape(-1, 4)
+    keep = (boxes[:, 2] >= min_size) & (boxes[:, 3] >= min_size)
+    boxes = boxes[keep]
+    x0 = np.clip(boxes[:, 0] - pad, 0, width)
+    y0 = np.clip(boxes[:, 1] - pad, 0, height)
+    x1 = np.clip(boxes[:, 0] + boxes[:, 2] + pad, 0, width)
+    y1 = np.clip(boxes[:, 1] + boxes[:, 3] + pad, 0, height)
+    return np.stack([x0, y0, x1, y1], axis=1)
+
+
+def suppress_duplicates(circles, min_dist):
+    """Drop circles whose center is within min_dist of one already kept (padded ROIs overlap)."""
+    kept = []
+    for circle in circles:
+        if all((circle[0] - k[0]) ** 2 + (circle[1] - k[1]) ** 2 >= min_dist * min_dist for k in kept):
+            kept.append(circle)
+    return kept
+
+
+def band_rois(rois, bands, overlap):
+    """Split the union of rois into horizontal bands that overlap by `overlap` rows."""
+    x0, y0 = rois[:, 0].min(), rois[:, 1].min()
+    x1, y1 = rois[:, 2].max(), rois[:, 3].max()
+    edges = np.linspace(y0, y1, bands + 1).astype(np.int32)
+    half = overlap // 2
+    return np.array([(x0, max(y0, top - half), x1, min(y1, bottom + half))
+                     for top, bottom in zip(edges[:-1], edges[1:])], np.int32)
+
+
+def find_circles_in_regions(gray, boxes, pad, blur=None, executor=None, parallel_min=2, min_dist=30,
+                            max_coverage=0.6, **hough):
+    """Run (optional blur and) HoughCircles only inside padded boxes, in parallel.
+
+    When the padded boxes would cover more than max_coverage of the frame (a dense
+    tray, where they overlap heavily) the union of the boxes is searched instead,
+    split into one overlapping band per core. Returns circles in frame coordinates
+    in the same (1, N, 3) layout as cv2.HoughCircles, or None when nothing was found.
+    """
+    height, width = gray.shape[:2]
+    rois = pad_boxes(boxes, pad, width, height, min_size=hough.get("minRadius", 0))
+    if len(rois) == 0:
+        return None
+
+    area = ((rois[:, 2] - rois[:, 0]) * (rois[:, 3] - rois[:, 1])).sum()
+    if area > max_coverage * width * height:
+        rois = band_rois(rois, os.cpu_count() or 1, 2 * pad)
+
+    def detect(roi):
+        x0, y0, x1, y1 = roi
+        patch = gray[y0:y1, x0:x1]
+        if blur is not None:
+            patch = blur(patch)
+        circles = cv2.HoughCircles(patch, cv2.HOUGH_GRADIENT, 1, min_dist, **hough)
+        if circles is None:
+            return []
+        # Map back from ROI to frame coordinates
+        return [(c[0] + x0, c[1] + y0, c[2]) for c in circles[0]]
+
+    if len(rois) >= parallel_min:
+        per_roi = list((executor or roi_executor()).map(detect, rois))
+    else:
+        per_roi = [detect(roi) for roi in rois]
+
+    found = suppress_duplicates([c for circles in per_roi for c in circles], min_dist)
+    if not found:
+        return None
+    return np.array([found], np.float32)
+
+
+class RoiCircleDefectDetector:
+    """Hough circles only inside the padded boxes of the segmented fruits.
+
+    The blur and the circle search skip the empty tray entirely, and the boxes are
+    spread over a thread pool. Circles centred outside every fruit region are no
+    longer reported. It only pays off on sparse trays: once the padded boxes cover
+    most of the frame the search falls back to bands over nearly all of it, and
+    is slower than CircleDefectDetector. Hence opt-in (roi_defects, --roi-defects).
+    """
+
+    name = "faulty"
+    requires = ("gray", "boxes")
+
+    def __init__(self, pad=None, executor=None, min_dist=30, param1=50, param2=30, min_radius=10, max_radius=60,
+                 blur_kernel=15):
+        self.min_dist = min_dist
+        self.param1 = param1
+        self.param2 = param2
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.blur_kernel = blur_kernel
+        # Enough context for the blur and a circle that overhangs its region
+        self.pad = max(self.max_radius // 2, blur_kernel // 2) if pad is None else pad
+        self.executor = executor
+
+    def run(self, ctx):
+        size = self.blur_kernel
+        circles = find_circles_in_regions(
+            ctx.get("gray"), ctx.get("boxes"), self.pad,
+            blur=lambda patch: cv2.GaussianBlur(patch, (size, size), 0), executor=self.executor,
+            min_dist=self.min_dist, param1=self.param1, param2=self.param2, minRadius=self.min_radius,
+            maxRadius=self.max_radius)
+
+        faulty_image, faulty_count, found = draw_circles(ctx.color, circles, ctx.buffer(ctx.color.shape))
+        return {"faulty_image": faulty_image, "faulty_count": faulty_count, "circles": found}
+
+
+class DistancePeakDetector:
+    """Fruit circles from the peaks of the mask's distance transform instead of a Hough search.
+
+    Touching fruits keep one peak each, and the cost is a distance transform and a
+    dilation rather than a gradient vote per radius, so it stays fast on large
+    frames. The circle is the largest one inside the fruit's mask, clamped to the
+    profile's radius range; min_dist and min_radius come from the profile as for Hough.
+    """
+
+    name = "faulty"
+    requires = ("peaks",)
+
+    def run(self, ctx):
+        peaks = ctx.get("peaks")
+        faulty_image, faulty_count, found = draw_circles(ctx.color, peaks[None] if len(peaks) else None,
+                                                         ctx.buffer(ctx.color.shape))
+        return {"faulty_image": faulty_image, "faulty_count": faulty_count, "circles": found}
+
+
+class DepthDefectDetector:
+    """Dents and bumps from each fruit's deviation from a fitted sphere; see depth_defects.
+
+    depth_scale and intrinsics describe the camera and are set from the frame
+    source once it is running.
+    """
+
+    name = "depth"
+    requires = ("regions", "depth_u8")
+
+    def __init__(self, depth_scale=0.001, intrinsics=None, tolerance_m=0.003, defect_fraction=0.02):
+        self.depth_scale = depth_scale
+        self.intrinsics = intrinsics
+        self.tolerance_m = tolerance_m
+        self.defect_fraction = defect_fraction
+
+    def run(self, ctx):
+        if ctx.depth is None:
+            return {}
+        regions = ctx.get("regions")
+        scores, defect_mask = sphere_defects(regions, ctx.depth, self.depth_scale, self.intrinsics,
+                                             self.tolerance_m, defect_fraction=self.defect_fraction)
+        overlay = draw_depth_defects(ctx.get("depth_u8"), regions, scores, defect_mask,
+                                     ctx.buffer(ctx.depth.shape + (3,)))
+
+        defects = []
+        for i, (x, y, w, h) in enumerate(regions.boxes):
+            if np.isnan(scores["score"][i]):
+                continue  # Too few valid depth pixels to judge
+            defects.append({"box": (int(x), int(y), int(w), int(h)), "score": round(float(scores["score"][i]), 4),
+                            "rms_mm": round(float(scores["rms_mm"][i]), 2), "max_mm": round(float(scores["max_mm"][i]), 2),
+                            "defective": bool(scores["defective"][i])})
+        return {"faulty_depth_image": overlay, "depth_defects": defects,
+                "depth_faulty_count": sum(d["defective"] for d in defects)}
+
+
+class FruitAnalysisPipeline:
+    """Fruit counting and defect detection without any GUI or camera dependency."""
+
+    def __init__(self, detectors=None, roi_defects=False, pyramid_scale=None, refine_pad=None, color_classes=None,
+                 profile=None, distance_peaks=False, watershed=False, buffer_pool=False):
+        """pyramid_scale (e.g. 0.5 or 0.25) enables coarse-to-fine segmentation; see PYRAMID_INTERMEDIATES.
+
+        Tolerance against full-resolution segmentation: a fruit is found as long as
+        it survives the 3x3 morphology at the coarse level, i.e. is at least about
+        3 / pyramid_scale pixels across; inside the refined regions the mask is
+        computed at full resolution, so contours match up to the coarse Otsu level
+        being estimated on the downscaled histogram. On Original_Image.jpg and the
+        synthetic trays at 0.5 and 0.25 the counts and contour areas matched exactly.
+
+        color_classes (color_lut.ColorClass tuples, e.g. color_lut.FRUIT_CLASSES) selects
+        the classes of the shared "color_labels" intermediate, which "hsv" segmentation
+        turns into the fruit mask; by default the profile's hsv_lower..hsv_upper range.
+
+        profile overrides the segmentation and Hough parameters; see tuning_profile.
+
+        distance_peaks replaces the Hough defect search with DistancePeakDetector, and
+        watershed replaces the contour count with WatershedCountDetector; both split
+        touching fruits that the mask merges. See benchmark.py --accuracy.
+
+        buffer_pool writes the intermediates and result images into arrays that are
+        reused from frame to frame (see buffer_pool), so a frame's images are only
+        valid until the pipeline's next context() or analyze(). Meant for callers
+        that keep just the summary, such as the worker processes; one thread only.
+        """
+        self.profile = make_profile(profile)
+        if pyramid_scale and self.profile["segmentation"] != "otsu":
+            raise ValueError("The segmentation pyramid only supports gray-level segmentation")
+        self.roi_defects = roi_defects
+        self.pyramid_scale = pyramid_scale
+        self.color_classes = tuple(color_classes) if color_classes else None
+        self.distance_peaks = distance_peaks
+        self.watershed = watershed
+        self.pool = BufferPool() if buffer_pool else None
+        self._pooled_context = None
+        if pyramid_scale:
+            # Cover the coarse rounding error plus the morphology kernel at full resolution
+            self.refine_pad = refine_pad if refine_pad is not None else int(np.ceil(2 / pyramid_scale)) + 2
+        if detectors is None:
+            p = self.profile
+            hough = {"min_dist": p["hough_min_dist"], "param1": p["hough_param1"], "param2": p["hough_param2"],
+                     "min_radius": p["min_radius"], "max_radius": p["max_radius"]}
+            if distance_peaks:
+                defects = DistancePeakDetector()
+            elif roi_defects:
+                defects = RoiCircleDefectDetector(blur_kernel=p["blur_kernel"], **hough)
+            else:
+                defects = CircleDefectDetector(**hough)
+            count = WatershedCountDetector() if watershed else FruitCountDetector()
+            detectors = [count, defects, DepthDefectDetector()]
+        self.detectors = detectors
+        self.intermediates = PYRAMID_INTERMEDIATES if pyramid_scale else INTERMEDIATES
+        for detector in self.detectors:
+            unknown = set(detector.requires) - set(self.intermediates)
+            if unknown:
+                raise ValueError(f"Detector {detector.name!r} requires unknown intermediates: {sorted(unknown)}")
+
+    def config(self):
+        """Keyword arguments that build the same default-detector pipeline, e.g. in a worker process."""
+        return {"roi_defects": self.roi_defects, "pyramid_scale": self.pyramid_scale,
+                "refine_pad": self.refine_pad if self.pyramid_scale else None,
+                "color_classes": self.color_classes, "profile": self.profile,
+                "distance_peaks": self.distance_peaks, "watershed": self.watershed,
+                "buffer_pool": self.pool is not None}
+
+    def detector(self, name):
+        for detector in self.detectors:
+            if detector.name == name:
+                return detector
+        raise KeyError(name)
+
+    def context(self, image, depth_image=None):
+        """Wrap a raw image in a FrameContext for this pipeline, passing an existing context through."""
+        if isinstance(image, FrameContext):
+            return image
+        options = dict(self.profile)
+        if self.color_classes:
+            options["color_classes"] = self.color_classes
+        if self.pyramid_scale:
+            options.update(coarse_scale=self.pyramid_scale, refine_pad=self.refine_pad)
+        if self.pool is not None:
+            # The previous frame's arrays go back to the pool; buffers of another frame size are dropped
+            previous = self._pooled_context
+            if previous is not None:
+                shape = previous.color.shape
+                previous.release()
+                if shape != image.shape:
+                    self.pool.clear()
+            self._pooled_context = FrameContext(image, depth_image, self.intermediates, options, self.pool)
+            return self._pooled_context
+        return FrameContext(image, depth_image, self.intermediates, options)
+
+    def process_and_label_fruits(self, color_image):
+        result = self.detector("count").run(self.context(color_image))
+        return result["threshold_image"], result["labeled_image"], result["fruit_count"]
+
+    def detect_faulty_fruits(self, color_image):
+        result = self.detector("faulty").run(self.context(color_image))
+        return result["faulty_image"], result["faulty_count"]
+
+    def detect_faulty_depth(self, color_image, depth_image=None):
+        """Depth defect overlay; the fruits are segmented from the color image. None without depth."""
+        result = self.detector("depth").run(self.context(color_image, depth_image))
+        return result.get("faulty_depth_image")
+
+    def set_camera(self, depth_scale, intrinsics=None):
+        """Pass the running camera's depth units and color intrinsics to the depth detector."""
+        for detector in self.detectors:
+            if isinstance(detector, DepthDefectDetector):
+                detector.depth_scale = depth_scale
+                detector.intrinsics = intrinsics
+
+    def analyze(self, color_image, depth_image=None):
+        """Run every detector on one frame, sharing intermediates, and return the images and counts."""
+        ctx = self.context(color_image, depth_image)
+        result = {}
+        for detector in self.detectors:
+            ctx.require(detector.requires)
+            if METRICS.enabled:
+                result.update(ctx.timed("detector." + detector.name, detector.run, ctx))
+            else:
+                result.update(detector.run(ctx))
+        return result
+
+
+def summarize(result):
+    """Strip the images from an analysis result so it can be serialized."""
+    return {key: value for key, value in result.items() if not isinstance(value, np.ndarray)}
+
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("--pyramid", type=float, metavar="SCALE",
+                        help="segment at this scale (e.g. 0.5) and refine at full resolution inside the fruits")
+    parser.add_argument("--roi-defects", action="store_true",
+                        help="run the Hough defect search only inside the fruit regions; faster on sparse trays only")
+    parser.add_argument("--profile", type=_profile_argument,
+                        help="JSON detection parameters saved by param_tuner.py")
+    parser.add_argument("--distance-peaks", action="store_true",
+                        help="find fruit circles from distance-transform peaks instead of Hough circles")
+    parser.add_argument("--watershed", action="store_true",
+                        help="count fruits by splitting the mask with a watershed seeded at the distance peaks")
+
+
+def _profile_argument(path):
+    # Loaded and checked while parsing, so a bad profile fails before any worker process starts
+    try:
+        return load_profile(path)
+    except (OSError, ValueError) as e:
+        raise argparse.ArgumentTypeError(f"{path}: {e}")
+
+
+def pipeline_from_args(args, buffer_pool=False):
+    return FruitAnalysisPipeline(roi_defects=getattr(args, "roi_defects", False), pyramid_scale=args.pyramid,
+                                 profile=getattr(args, "profile", None),
+                                 distance_peaks=getattr(args, "distance_peaks", False),
+                                 watershed=getattr(args, "watershed", False), buffer_pool=buffer_pool)
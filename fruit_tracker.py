@@ -0,0 +1,245 @@
+"""Cross-frame fruit tracking with stable IDs and line-crossing counts.
+
+    tracker = FruitTracker(max_distance=60, line=CountingLine("y", 240))
+    tracker.update(seq, summary)      # summary from FruitAnalysisPipeline.analyze()
+    tracker.crossed                   # unique fruits that crossed the line so far
+
+Detections are matched to tracks through a uniform grid of max_distance-sized
+cells, so each track only looks at the detections in its own and the eight
+neighbouring cells instead of every detection in the frame.
+"""
+import itertools
+
+import cv2
+import numpy as np
+
+
+class CountingLine:
+    """A horizontal ("y") or vertical ("x") line at `position` pixels.
+
+    direction is +1 to count only fruits moving towards larger coordinates,
+    -1 for the opposite way, or 0 for both.
+    """
+
+    def __init__(self, axis="y", position=240, direction=0):
+        if axis not in ("x", "y"):
+            raise ValueError(f"Unknown line axis {axis!r}; expected 'x' or 'y'")
+        self.axis = axis
+        self.position = position
+        self.direction = direction
+
+    @classmethod
+    def parse(cls, text):
+        """Build a line from "y=240", "x=320" or "y=240:+" / "y=240:-" for one direction."""
+        axis, _, rest = text.partition("=")
+        position, _, sign = rest.partition(":")
+        return cls(axis.strip(), int(position), {"": 0, "+": 1, "-": -1}[sign.strip()])
+
+    def side(self, point):
+        return point[0 if self.axis == "x" else 1] >= self.position
+
+    def crossed(self, before, after):
+        if self.side(before) == self.side(after):
+            return False
+        moving = 1 if self.side(after) else -1
+        return self.direction in (0, moving)
+
+    def draw(self, image, color=(255, 0, 255)):
+        h, w = image.shape[:2]
+        if self.axis == "y":
+            cv2.line(image, (0, self.position), (w, self.position), color, 2)
+        else:
+            cv2.line(image, (self.position, 0), (self.position, h), color, 2)
+
+
+class Track:
+    __slots__ = ("id", "centroid", "velocity", "box", "first_seq", "last_seq", "hits", "missed", "counted", "faulty")
+
+    def __init__(self, track_id, centroid, box, seq):
+        self.id = track_id
+        self.centroid = centroid
+        # Pixels moved per update, so a fruit on a conveyor is looked for where it is heading
+        self.velocity = (0, 0)
+        self.box = box
+        self.first_seq = seq
+        self.last_seq = seq
+        self.hits = 1
+        self.missed = 0
+        self.counted = False
+        # None until a defect result has been attached; kept for the life of the track
+        self.faulty = None
+
+    @property
+    def graded(self):
+        return self.faulty is not None
+
+    def predicted(self):
+        steps = self.missed + 1
+        return self.centroid[0] + self.velocity[0] * steps, self.centroid[1] + self.velocity[1] * steps
+
+
+def _box_area(box):
+    return max(box[2], 1) * max(box[3], 1)
+
+
+class FruitTracker:
+    """Assigns stable IDs to per-frame fruit detections and counts line crossings.
+
+    A detection joins the track whose predicted position (last centroid plus its
+    last per-update motion) is nearest, within max_distance pixels and with a box
+    area within max_area_ratio of its own; pairs are taken greedily from the
+    closest outward. Unmatched detections start new tracks, and a track that goes
+    unmatched for more than max_missed updates is dropped.
+    """
+
+    def __init__(self, max_distance=60, max_missed=5, max_area_ratio=2.5, line=None, min_hits=2):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.max_area_ratio = max_area_ratio
+        self.line = line
+        self.min_hits = min_hits
+
+        self.tracks = {}
+        self._ids = itertools.count(1)
+        self.total_tracks = 0
+        self.crossed = 0
+        self.last_seq = 0
+
+    def reset(self):
+        self.tracks.clear()
+        self._ids = itertools.count(1)
+        self.total_tracks = 0
+        self.crossed = 0
+        self.last_seq = 0
+
+    def _grid(self, points):
+        # Bucket detection indices by grid cell; cells are max_distance wide
+        cells = {}
+        size = self.max_distance
+        for j, (x, y) in enumerate(points):
+            cells.setdefault((x // size, y // size), []).append(j)
+        return cells
+
+    def _candidates(self, points, boxes):
+        """(distance, track id, detection index) for every gated pair, nearest first."""
+        cells = self._grid(points)
+        size = self.max_distance
+        limit = self.max_distance * self.max_distance
+        pairs = []
+        for track in self.tracks.values():
+            tx, ty = track.predicted()
+            cx, cy = tx // size, ty // size
+            track_area = _box_area(track.box)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j in cells.get((cx + dx, cy + dy), ()):
+                        x, y = points[j]
+                        d2 = (x - tx) ** 2 + (y - ty) ** 2
+                        if d2 > limit:
+                            continue
+                        ratio = _box_area(boxes[j]) / track_area
+                        if ratio > self.max_area_ratio or ratio * self.max_area_ratio < 1:
+                            continue
+                        pairs.append((d2, track.id, j))
+        pairs.sort()
+        return pairs
+
+    def update(self, seq, summary):
+        """Feed one analysis summary (with "centroids", "boxes" and optionally "circles").
+
+        Returns the list of tracks seen in this update.
+        """
+        points = [(cX, cY) for _, cX, cY in summary.get("centroids", [])]
+        boxes = summary.get("boxes") or [(x - 1, y - 1, 2, 2) for x, y in points]
+        self.last_seq = seq
+
+        # Greedy nearest-first association within the grid neighbourhood
+        matched_tracks = set()
+        matched_detections = set()
+        seen = []
+        for _, track_id, j in self._candidates(points, boxes):
+            if track_id in matched_tracks or j in matched_detections:
+                continue
+            matched_tracks.add(track_id)
+            matched_detections.add(j)
+            track = self.tracks[track_id]
+            if self.line is not None and not track.counted and self.line.crossed(track.centroid, points[j]):
+                track.counted = True
+                self.crossed += 1
+            steps = track.missed + 1
+            track.velocity = ((points[j][0] - track.centroid[0]) / steps, (points[j][1] - track.centroid[1]) / steps)
+            track.centroid = points[j]
+            track.box = tuple(boxes[j])
+            track.last_seq = seq
+            track.hits += 1
+            track.missed = 0
+            seen.append(track)
+
+        # Age out the tracks nobody matched
+        for track_id in list(self.tracks):
+            if track_id not in matched_tracks:
+                track = self.tracks[track_id]
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    del self.tracks[track_id]
+
+        # New fruits entering the view
+        for j, point in enumerate(points):
+            if j in matched_detections:
+                continue
+            track = Track(next(self._ids), point, tuple(boxes[j]), seq)
+            self.tracks[track.id] = track
+            self.total_tracks += 1
+            seen.append(track)
+
+        self._grade(seen, summary.get("circles"))
+        return seen
+
+    def _grade(self, tracks, circles):
+        # A fruit is graded the first time a defect result covers it and keeps that grade
+        if circles is None:
+            return
+        centers = np.asarray([(x, y) for x, y, _ in circles], np.int32).reshape(-1, 2)
+        for track in tracks:
+            if track.graded:
+                continue
+            x, y, w, h = track.box
+            inside = ((centers[:, 0] >= x) & (centers[:, 0] < x + w) &
+                      (centers[:, 1] >= y) & (centers[:, 1] < y + h))
+            track.faulty = bool(inside.any())
+
+    def active(self):
+        """Tracks matched in the latest update that have been seen at least min_hits times."""
+        return [t for t in self.tracks.values() if t.missed == 0 and t.hits >= self.min_hits]
+
+    def stats_text(self):
+        text = f"Tracked: {len(self.tracks)}  Unique: {self.total_tracks}"
+        if self.line is not None:
+            text += f"  Crossed: {self.crossed}"
+        return text
+
+
+def draw_tracks(image, tracker):
+    """Draw track IDs, grades and the counting line onto image in place."""
+    for track in tracker.active():
+        x, y, w, h = track.box
+        color = (0, 0, 255) if track.faulty else (0, 255, 0)
+        cv2.rectangle(image, (x, y), (x + w, y + h), color, 1)
+        cX, cY = track.centroid
+        cv2.putText(image, str(track.id), (cX - 10, cY - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+    if tracker.line is not None:
+        tracker.line.draw(image)
+    cv2.putText(image, tracker.stats_text(), (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    return image
+
+
+def add_tracker_arguments(parser):
+    parser.add_argument("--count-line", metavar="AXIS=POS[:+|-]",
+                        help="count unique fruits crossing this line, e.g. y=240 or x=320:+")
+    parser.add_argument("--track-distance", type=int, default=60,
+                        help="largest centroid movement in pixels between two analyzed frames")
+
+
+def tracker_from_args(args):
+    line = CountingLine.parse(args.count_line) if args.count_line else None
+    return FruitTracker(max_distance=args.track_distance, line=line)
@@ -0,0 +1,148 @@
+"""A navigable list of image files that decodes and analyzes the next few ahead of time.
+
+    images = ImageQueue(pipeline, ahead=3).start()
+    images.set_paths(collect_images(["samples/"]))
+    future = images.go(0)          # the current image; later ones are already in flight
+    entry = future.result()        # {"path", "result", "nbytes", "elapsed_s"} or raises
+    images.step(1)                 # usually done by now
+
+Decoding and analysis run on a small thread pool in the GUI process (cv2
+releases the GIL, so the window stays responsive). Finished entries are kept
+for the current image, `behind` images back and `ahead` images forward, and
+prefetching stops early once the kept results would exceed `max_bytes`.
+"""
+import concurrent.futures
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from instrumentation import METRICS
+
+
+def result_nbytes(result):
+    """Bytes held by the images of an analysis result, counting shared arrays once."""
+    arrays = {id(value): value for value in result.values() if isinstance(value, np.ndarray)}
+    return sum(array.nbytes for array in arrays.values())
+
+
+class ImageQueue:
+    def __init__(self, pipeline, ahead=3, behind=1, max_bytes=512 * 1024 * 1024, workers=2):
+        self.pipeline = pipeline
+        self.ahead = ahead
+        self.behind = behind
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.paths = []
+        self.index = 0
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._entry_bytes = 0  # Size of the last finished entry, to estimate the next one
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    @property
+    def path(self):
+        return self.paths[self.index] if self.paths else None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="prefetch")
+        return self
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            self._futures.clear()
+
+    def set_paths(self, paths, index=0):
+        """Replace the queue; returns the future of the first image shown, or None when empty."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self.paths = list(paths)
+        self.index = 0
+        return self.go(index) if self.paths else None
+
+    def step(self, delta):
+        return self.go(self.index + delta)
+
+    def go(self, index):
+        """Make index current and return its future; images around it are prefetched."""
+        self.start()
+        self.index = max(0, min(index, len(self.paths) - 1))
+        with self._lock:
+            future = self._futures.get(self.index)
+            if future is not None and future.done():
+                self.hits += 1
+                METRICS.incr("prefetch_hits")
+            else:
+                self.misses += 1
+                METRICS.incr("prefetch_misses")
+            if future is None:
+                future = self._submit(self.index)
+            self._evict()
+            self._prefetch()
+        return future
+
+    def _submit(self, index):
+        future = self._executor.submit(self._load, self.paths[index])
+        self._futures[index] = future
+        return future
+
+    def _load(self, path):
+        start = time.perf_counter()
+        color_image = cv2.imread(path)
+        if color_image is None:
+            raise ValueError(f"Could not decode {path}")
+        result = self.pipeline.analyze(color_image)
+        nbytes = result_nbytes(result)
+        self._entry_bytes = nbytes
+        elapsed = time.perf_counter() - start
+        METRICS.observe("prefetch.image", elapsed)
+        return {"path": path, "result": result, "nbytes": nbytes, "elapsed_s": elapsed}
+
+    def _kept_bytes(self):
+        # Work still in flight is counted at the size of the last finished entry
+        total = 0
+        for future in self._futures.values():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                total += future.result()["nbytes"]
+            else:
+                total += self._entry_bytes
+        return total
+
+    def _evict(self):
+        # Everything outside the window is dropped; queued work is cancelled, running work is let go
+        first, last = self.index - self.behind, self.index + self.ahead
+        for index in [i for i in self._futures if not first <= i <= last]:
+            self._futures.pop(index).cancel()
+
+    def _prefetch(self):
+        # Nearest first, so the next image is always started before the ones after it
+        for index in range(self.index + 1, min(self.index + self.ahead, len(self.paths) - 1) + 1):
+            if index in self._futures:
+                continue
+            if self._kept_bytes() + self._entry_bytes > self.max_bytes:
+                break
+            self._submit(index)
+        METRICS.gauge("prefetch_mb", round(self._kept_bytes() / 2 ** 20, 1))
+
+    def stats_text(self):
+        if not self.paths:
+            return "No images loaded"
+        with self._lock:
+            ready = sum(future.done() for future in self._futures.values())
+            kept = self._kept_bytes()
+        return (f"Image {self.index + 1}/{len(self.paths)}  |  prefetched {ready}/{len(self._futures)}  "
+                f"{kept / 2 ** 20:.0f} MB  |  hits {self.hits} misses {self.misses}")
@@ -0,0 +1,343 @@
+"""Headless HTTP service returning fruit and defect counts as JSON, for the other systems on the line.
+
+    python inference_server.py --port 8080 --workers 3
+    curl --data-binary @Original_Image.jpg -H "Content-Type: image/jpeg" http://127.0.0.1:8080/analyze
+    curl --data-binary @frame.bgr -H "Content-Type: application/octet-stream" \\
+         "http://127.0.0.1:8080/analyze?width=640&height=480"
+
+Endpoints:
+    POST /analyze   a JPEG or PNG, or raw BGR bytes with ?width=&height=; returns the counts,
+                    centroids, boxes and circles of process_and_label_fruits/detect_faulty_fruits
+    GET  /health    liveness and queue depth
+    GET  /metrics   request, queue and batch latencies in the Prometheus text format
+    GET  /stats     the same as JSON
+
+Requests wait in a bounded queue. Whenever a worker is free, the batcher takes
+the first waiting request plus whatever else arrives within --batch-wait-ms, up
+to --batch-size, and sends them to the process pool as one task; decoding runs
+in the worker too. Under load the queue fills while every worker is busy, so the
+batches grow by themselves and the per-task pickling and scheduling is paid once
+per batch. A request arriving at a full queue is refused at once with 503 and
+Retry-After, and one that waited longer than --max-queue-ms is answered 503
+instead of being analyzed too late to be useful.
+
+Only asyncio from the standard library is used, with a minimal HTTP/1.1 server
+(keep-alive, Content-Length bodies); measure it with load_generator.py.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import urllib.parse
+
+import cv2
+import numpy as np
+
+from fruit_pipeline import FruitAnalysisPipeline, add_pipeline_arguments, pipeline_from_args, summarize
+from instrumentation import METRICS, add_metrics_arguments, start_exporter
+
+IMAGE_TYPES = ("image/jpeg", "image/png")
+RAW_TYPE = "application/octet-stream"
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           415: "Unsupported Media Type", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+# One pipeline per worker process, created by _init_worker
+_pipeline = None
+
+
+def _init_worker(pipeline_config):
+    global _pipeline
+    cv2.setNumThreads(1)
+    # Workers keep only the summary, so every frame can reuse the previous frame's arrays
+    _pipeline = FruitAnalysisPipeline(**dict(pipeline_config, buffer_pool=True))
+
+
+def decode_frame(body, content_type, width=None, height=None):
+    """BGR image from a JPEG/PNG body, or from raw BGR bytes of the given size; raises ValueError."""
+    if content_type == RAW_TYPE:
+        if not width or not height:
+            raise ValueError("raw frames need width and height")
+        if len(body) != width * height * 3:
+            raise ValueError(f"expected {width * height * 3} bytes of BGR for {width}x{height}, got {len(body)}")
+        return np.frombuffer(body, np.uint8).reshape(height, width, 3)
+    image = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("could not decode image")
+    return image
+
+
+def _analyze_batch(items):
+    """Decode and analyze (content type, body, width, height) items; one result or error per item."""
+    results = []
+    for content_type, body, width, height in items:
+        start = time.perf_counter()
+        try:
+            image = decode_frame(body, content_type, width, height)
+        except ValueError as e:
+            results.append({"error": str(e)})
+            continue
+        try:
+            result = summarize(_pipeline.analyze(image))
+        except Exception as e:
+            # Only this request fails; the others batched with it still get their results
+            results.append({"error": f"analysis failed: {e!r}", "status": 500})
+            continue
+        result.update(width=image.shape[1], height=image.shape[0],
+                      analyze_ms=round((time.perf_counter() - start) * 1000, 3))
+        results.append(result)
+    return results
+
+
+class _Job:
+    __slots__ = ("item", "future", "enqueued")
+
+    def __init__(self, item, future):
+        self.item = item
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class InferenceService:
+    def __init__(self, pipeline_config=None, workers=None, batch_size=8, batch_wait_ms=5.0, queue_size=64,
+                 max_queue_ms=1000.0, max_body=32 * 1024 * 1024):
+        self.pipeline_config = pipeline_config or {}
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.queue_size = queue_size
+        self.max_queue = max_queue_ms / 1000.0
+        self.max_body = max_body
+
+        self._executor = None
+        self._queue = None
+        self._slots = None
+        self._batcher = None
+
+        self.served = 0
+        self.shed_full = 0
+        self.shed_late = 0
+        self.failed = 0
+
+    async def start(self):
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                               initargs=(self.pipeline_config,))
+        self._queue = asyncio.Queue(self.queue_size)
+        self._slots = asyncio.Semaphore(self.workers)  # At most one batch per worker in flight
+        self._batcher = asyncio.create_task(self._run_batches())
+
+    async def stop(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def analyze(self, item):
+        """(status, payload) for one (content type, body, width, height) item."""
+        if self._queue.full():
+            # Load shedding: refuse now rather than queue work that would only time out
+            self.shed_full += 1
+            METRICS.incr("server_shed_full")
+            return 503, {"error": "queue full"}
+        job = _Job(item, asyncio.get_running_loop().create_future())
+        self._queue.put_nowait(job)
+        METRICS.gauge("server_queue_depth", self._queue.qsize())
+        return await job.future
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free worker first, so requests keep collecting in the queue while all are busy
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            METRICS.gauge("server_queue_depth", self._queue.qsize())
+
+            now = time.perf_counter()
+            live = []
+            for job in batch:
+                if job.future.done():
+                    continue  # Cancelled with its connection's handler
+                if now - job.enqueued > self.max_queue:
+                    self.shed_late += 1
+                    METRICS.incr("server_shed_late")
+                    job.future.set_result((503, {"error": "waited too long in the queue"}))
+                else:
+                    live.append(job)
+            if not live:
+                self._slots.release()
+                continue
+            asyncio.create_task(self._run_batch(live))
+
+    async def _run_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self._executor, _analyze_batch,
+                                                                       [job.item for job in batch])
+        except Exception as e:
+            # A worker died or the pool is shutting down; fail the batch, not the service
+            results = [{"error": f"analysis failed: {e!r}", "status": 500} for _ in batch]
+        finally:
+            self._slots.release()
+        METRICS.observe("server.batch", time.perf_counter() - start)
+        METRICS.gauge("server_batch_size", len(batch))
+
+        for job, result in zip(batch, results):
+            if job.future.done():
+                continue
+            METRICS.observe("server.queue", start - job.enqueued)
+            if "error" in result:
+                status = result.pop("status", 400)
+                self.failed += status == 500
+                job.future.set_result((status, result))
+                continue
+            result.update(batch_size=len(batch), queue_ms=round((start - job.enqueued) * 1000, 3))
+            self.served += 1
+            job.future.set_result((200, result))
+
+    def stats(self):
+        return {"workers": self.workers, "queue_depth": self._queue.qsize() if self._queue else 0,
+                "served": self.served, "shed_full": self.shed_full, "shed_late": self.shed_late,
+                "failed": self.failed, "metrics": METRICS.snapshot()}
+
+    async def route(self, method, target, headers, body):
+        """(status, payload, content type) for one request; payload is a dict (JSON) or str."""
+        url = urllib.parse.urlsplit(target)
+        if url.path == "/analyze":
+            if method != "POST":
+                return 405, {"error": "use POST"}, None
+            content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type not in IMAGE_TYPES + (RAW_TYPE,):
+                return 415, {"error": f"send {', '.join(IMAGE_TYPES)} or {RAW_TYPE}"}, None
+            query = urllib.parse.parse_qs(url.query)
+            try:
+                width = int(query["width"][0]) if "width" in query else None
+                height = int(query["height"][0]) if "height" in query else None
+            except ValueError:
+                return 400, {"error": "width and height must be integers"}, None
+            status, payload = await self.analyze((content_type, body, width, height))
+            return status, payload, None
+        if method != "GET":
+            return 405, {"error": "use GET"}, None
+        if url.path == "/health":
+            return 200, {"status": "ok", "workers": self.workers, "queue_depth": self._queue.qsize()}, None
+        if url.path == "/metrics":
+            return 200, METRICS.to_prometheus(), "text/plain; version=0.0.4"
+        if url.path == "/stats":
+            return 200, self.stats(), None
+        return 404, {"error": f"no such endpoint {url.path}"}, None
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one keep-alive connection."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break  # Client closed the connection
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 400, {"error": "request head too large"}, keep_alive=False)
+                    break
+                start = time.perf_counter()
+                try:
+                    request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                    method, target, version = request_line.split(" ", 2)
+                    headers = {}
+                    for line in header_lines:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError("negative Content-Length")
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request"}, keep_alive=False)
+                    break
+                if length > self.max_body:
+                    await self._respond(writer, 413, {"error": f"body over {self.max_body} bytes"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload, content_type = await self.route(method, target, headers, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, content_type, keep_alive)
+                if method == "POST":
+                    METRICS.observe("server.request", time.perf_counter() - start)
+                    METRICS.incr(f"server_responses_{status}")
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, content_type=None, keep_alive=True):
+        if isinstance(payload, str):
+            body = payload.encode()
+        else:
+            body = json.dumps(payload).encode()
+            content_type = "application/json"
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            lines.append("Retry-After: 1")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+
+async def serve(service, host="127.0.0.1", port=8080):
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving on http://{host}:{port} with {service.workers} workers "
+          f"(batches of up to {service.batch_size}, queue {service.queue_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service for fruit counting and defect detection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, help="analysis processes (default: cores - 1)")
+    parser.add_argument("--batch-size", type=int, default=8, help="most requests sent to a worker as one task")
+    parser.add_argument("--batch-wait-ms", type=float, default=5.0,
+                        help="how long a batch waits for more requests after the first one")
+    parser.add_argument("--queue-size", type=int, default=64, help="waiting requests before new ones are refused")
+    parser.add_argument("--max-queue-ms", type=float, default=1000.0,
+                        help="refuse a request that waited longer than this for a worker")
+    add_pipeline_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    exporter = start_exporter(args)
+    service = InferenceService(pipeline_from_args(args).config(), args.workers, args.batch_size, args.batch_wait_ms,
+                               args.queue_size, args.max_queue_ms)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exporter is not None:
+            exporter.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
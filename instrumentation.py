@@ -0,0 +1,216 @@
+"""Low-overhead per-stage timers and counters.
+
+    with METRICS.stage("hough"):
+        ...
+    METRICS.incr("frames_dropped")
+
+Disable with FRUIT_METRICS=0 (or METRICS.enabled = False); stage() then returns a
+shared no-op context manager and the other calls return immediately.
+"""
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Rolling window of the latest latency samples plus lifetime count and sum."""
+
+    def __init__(self, window=1000):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count, "sum_s": self.total}
+        import numpy as np  # Only for reports, so importing the metrics stays cheap for the GUI
+
+        ms = np.fromiter(self.samples, np.float64, len(self.samples)) * 1000.0
+        p50, p90, p99 = np.percentile(ms, (50, 90, 99))
+        return {"count": self.count, "sum_s": round(self.total, 6), "p50_ms": round(float(p50), 3),
+                "p90_ms": round(float(p90), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3)}
+
+
+class Metrics:
+    def __init__(self, enabled=True, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = collections.Counter()
+        self.gauges = {}
+
+    def stage(self, name):
+        """Context manager timing one stage into the histogram `name`."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.window)
+            histogram.add(seconds)
+
+    def incr(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += amount
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "time": time.time(),
+                "stages": {name: h.summary() for name, h in sorted(self.histograms.items())},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def report_text(self):
+        """Human-readable table for the Reports tab."""
+        snap = self.snapshot()
+        lines = [f"{'stage':28s} {'count':>8s} {'p50 ms':>9s} {'p90 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}"]
+        for name, s in snap["stages"].items():
+            if "p50_ms" in s:
+                lines.append(f"{name:28s} {s['count']:8d} {s['p50_ms']:9.2f} {s['p90_ms']:9.2f} "
+                             f"{s['p99_ms']:9.2f} {s['max_ms']:9.2f}")
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"{name:28s} {value:8d}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"{name:28s} {value:8}")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix="fruit"):
+        snap = self.snapshot()
+        lines = []
+        for name, s in snap["stages"].items():
+            metric = f"{prefix}_stage_seconds"
+            label = f'stage="{name}"'
+            for q in ("50", "90", "99"):
+                key = f"p{q}_ms"
+                if key in s:
+                    lines.append(f'{metric}{{{label},quantile="0.{q}"}} {s[key] / 1000.0:.6f}')
+            lines.append(f"{metric}_count{{{label}}} {s['count']}")
+            lines.append(f"{metric}_sum{{{label}}} {s['sum_s']:.6f}")
+        for name, value in snap["counters"].items():
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in snap["gauges"].items():
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter(threading.Thread):
+    """Periodically flushes a Metrics snapshot to a JSON-lines (appended) or Prometheus-text (replaced) file."""
+
+    def __init__(self, metrics, path, fmt="jsonl", interval=5.0):
+        super().__init__(name="metrics-exporter", daemon=True)
+        if fmt not in ("jsonl", "prom"):
+            raise ValueError(f"Unknown metrics format {fmt!r}; expected 'jsonl' or 'prom'")
+        self.metrics = metrics
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def flush(self):
+        if self.fmt == "jsonl":
+            with open(self.path, "a") as f:
+                f.write(json.dumps(self.metrics.snapshot()) + "\n")
+        else:
+            # Write then rename so a scraper never reads a half-written file
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(self.metrics.to_prometheus())
+            os.replace(tmp, self.path)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=self.interval + 1)
+        self.flush()
+
+
+def timed(name):
+    """Decorator timing every call of a function as stage `name` in METRICS."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+            with _Stage(METRICS, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-file", help="periodically export stage timings and counters to this file")
+    parser.add_argument("--metrics-format", choices=("jsonl", "prom"), default="jsonl")
+    parser.add_argument("--metrics-interval", type=float, default=5.0, help="seconds between exports")
+
+
+def start_exporter(args, metrics=None):
+    """Start an exporter from parsed add_metrics_arguments options, or return None."""
+    if not args.metrics_file:
+        return None
+    exporter = MetricsExporter(metrics or METRICS, args.metrics_file, args.metrics_format, args.metrics_interval)
+    exporter.start()
+    return exporter
+
+
+# Process-wide registry used by the GUI, the pipeline and the batch runner
+METRICS = Metrics(enabled=os.environ.get("FRUIT_METRICS", "1") != "0")
@@ -0,0 +1,168 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+import cv2
+
+from frame_ring import FrameChannel, FrameOverwritten, attached_ring
+from fruit_pipeline import FruitAnalysisPipeline, summarize
+from instrumentation import METRICS
+
+# One pipeline per worker process, created by _init_worker
+_pipeline = None
+
+
+def _init_worker(pipeline_config):
+    global _pipeline
+    cv2.setNumThreads(1)
+    # Workers keep only the summary, so every frame can reuse the previous frame's arrays
+    _pipeline = FruitAnalysisPipeline(**dict(pipeline_config, buffer_pool=True))
+
+
+def _analyze_frame(color_image):
+    # Only counts and geometry travel back to the GUI process, never the annotated images
+    return summarize(_pipeline.analyze(color_image))
+
+
+def _analyze_slot(spec, index, seq):
+    # Only the slot index and sequence number were sent; the frame is read in place from shared memory
+    ring = attached_ring(spec)
+    frame = ring.read(index, seq)
+    if frame is None:
+        raise FrameOverwritten(f"Frame {seq} was overwritten before it was analyzed")
+    summary = summarize(_pipeline.analyze(frame[0]))
+    if not ring.intact(index, seq):
+        raise FrameOverwritten(f"Frame {seq} was overwritten while it was analyzed")
+    return summary
+
+
+def submit_frame(executor, channel, seq, color_image):
+    """Submit a frame for analysis, through shared memory when channel is a FrameChannel.
+
+    Returns (future, release); call release() once the future is done. None when
+    the channel has no free slot.
+    """
+    if channel is None:
+        return executor.submit(_analyze_frame, color_image), lambda: None
+    slot = channel.write(seq, color_image)
+    if slot is None:
+        return None
+    ring, index = slot
+    future = executor.submit(_analyze_slot, ring.spec(), index, seq)
+    return future, lambda: channel.release(ring, index, seq)
+
+
+class LiveAnalyzer:
+    """Sends a subset of live frames to a worker pool and keeps the newest finished result.
+
+    Frames are sampled every `every_n` frames or at `target_fps`, whichever is set.
+    At most `max_in_flight` frames are being analyzed at once; frames arriving while
+    the pool is saturated are skipped rather than queued, so a slow analysis never
+    builds a backlog or delays the display.
+
+    Frames reach the workers through a shared-memory FrameRing with a slot per
+    frame in flight, so only a slot index is pickled; shared_memory=False sends
+    the pickled frame instead.
+    """
+
+    def __init__(self, every_n=None, target_fps=5.0, workers=None, max_in_flight=None, pipeline_config=None,
+                 shared_memory=True):
+        """pipeline_config holds FruitAnalysisPipeline arguments for the workers, e.g. pipeline.config()."""
+        self.every_n = every_n
+        self.target_fps = target_fps
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_in_flight = max_in_flight or self.workers
+        self.pipeline_config = pipeline_config or {}
+        self.shared_memory = shared_memory
+
+        self._executor = None
+        self._channel = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_submit_time = 0.0
+        self._latest = None
+        self._latest_seq = 0
+
+        self.submitted = 0
+        self.skipped_busy = 0
+        self.completed = 0
+        self.last_latency = 0.0
+
+    @property
+    def running(self):
+        return self._executor is not None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                                   initargs=(self.pipeline_config,))
+            if self.shared_memory:
+                self._channel = FrameChannel(self.max_in_flight)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+    def _due(self, seq):
+        if self.every_n:
+            return seq % self.every_n == 0
+        if self.target_fps:
+            return time.perf_counter() - self._last_submit_time >= 1.0 / self.target_fps
+        return True
+
+    def submit(self, seq, color_image):
+        """Offer a frame for analysis; returns True if it was sent to a worker."""
+        if self._executor is None or not self._due(seq):
+            return False
+
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                # Backpressure: drop the frame instead of queueing it
+                self.skipped_busy += 1
+                METRICS.incr("live_skipped_busy")
+                return False
+            self._in_flight += 1
+            METRICS.gauge("live_in_flight", self._in_flight)
+
+        submitted = submit_frame(self._executor, self._channel, seq, color_image)
+        if submitted is None:
+            # Every shared-memory slot is still in use
+            with self._lock:
+                self._in_flight -= 1
+                self.skipped_busy += 1
+            return False
+        future, release = submitted
+        self._last_submit_time = time.perf_counter()
+        self.submitted += 1
+        future.add_done_callback(
+            lambda f, seq=seq, start=self._last_submit_time, release=release: self._finished(f, seq, start, release))
+        return True
+
+    def _finished(self, future, seq, start, release):
+        release()
+        with self._lock:
+            self._in_flight -= 1
+            METRICS.gauge("live_in_flight", self._in_flight)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self.completed += 1
+            # Workers can finish out of order; never replace a newer result with an older one
+            if seq > self._latest_seq:
+                self._latest_seq = seq
+                self._latest = future.result()
+                self.last_latency = time.perf_counter() - start
+                METRICS.observe("live.analysis", self.last_latency)
+
+    def latest(self):
+        """Return (frame seq, summary) of the newest finished analysis, or (0, None)."""
+        with self._lock:
+            return self._latest_seq, self._latest
+
+    def stats_text(self):
+        return (f"Analyzed: {self.completed}  Skipped (busy): {self.skipped_busy}  "
+                f"Analysis latency: {self.last_latency * 1000:.0f} ms")
@@ -0,0 +1,123 @@
+"""Requests/second and latency of inference_server.py at several concurrency levels.
+
+    python inference_server.py --port 8080 &
+    python load_generator.py --url http://127.0.0.1:8080/analyze --concurrency 1 4 16 64 --duration 10
+    python load_generator.py --raw --output load.json
+
+Each level opens that many keep-alive connections, each sending the same image
+back to back for --duration seconds. Latency percentiles are over the answered
+(200) requests; refused requests (503, load shedding) are counted separately,
+and a refused client waits --backoff seconds before trying again, as a client
+honoring Retry-After would, instead of hammering the server with retries.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+import urllib.parse
+
+import cv2
+import numpy as np
+
+
+async def read_response(reader):
+    """(status, body) of one HTTP/1.1 response with a Content-Length."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+    length = 0
+    for line in header_lines:
+        name, value = line.split(":", 1)
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    body = await reader.readexactly(length) if length else b""
+    return int(status_line.split(" ", 2)[1]), body
+
+
+async def _client(url, request, deadline, latencies, statuses, backoff):
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, _ = await read_response(reader)
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            elif status == 503:
+                await asyncio.sleep(backoff)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        statuses["connection_error"] += 1
+    finally:
+        writer.close()
+
+
+async def run_level(url, request, concurrency, duration, backoff=0.1):
+    latencies, statuses = [], collections.Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(url, request, start + duration, latencies, statuses, backoff)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000.0 if latencies else np.zeros(1)
+    return {"concurrency": concurrency, "elapsed_s": round(elapsed, 3), "ok": statuses[200],
+            "requests_per_s": statuses[200] / elapsed, "shed": statuses[503],
+            "errors": sum(count for status, count in statuses.items() if status not in (200, 503)),
+            "p50_ms": float(np.percentile(ms, 50)), "p90_ms": float(np.percentile(ms, 90)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+
+def build_request(url, image_path, raw=False):
+    """The bytes of one POST /analyze request carrying the image encoded as-is, or decoded to raw BGR."""
+    target = url.path or "/analyze"
+    if raw:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"could not read {image_path}")
+        target += f"?width={image.shape[1]}&height={image.shape[0]}"
+        body, content_type = image.tobytes(), "application/octet-stream"
+    else:
+        with open(image_path, "rb") as f:
+            body = f.read()
+        content_type = "image/png" if image_path.lower().endswith(".png") else "image/jpeg"
+    head = (f"POST {target} HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def run(url, request, levels, duration, warmup, backoff=0.1):
+    if warmup:
+        await run_level(url, request, max(levels), warmup, backoff)
+    results = []
+    for concurrency in levels:
+        r = await run_level(url, request, concurrency, duration, backoff)
+        results.append(r)
+        print(f"concurrency {concurrency:4d}  {r['requests_per_s']:8.1f} req/s  p50 {r['p50_ms']:8.2f} ms  "
+              f"p90 {r['p90_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  shed {r['shed']:6d}  errors {r['errors']}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the fruit inference service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/analyze")
+    parser.add_argument("--image", default="Original_Image.jpg")
+    parser.add_argument("--raw", action="store_true", help="send the decoded BGR frame instead of the file")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of load before measuring")
+    parser.add_argument("--backoff", type=float, default=0.1, help="seconds a client waits after a 503")
+    parser.add_argument("-o", "--output", help="save the results as JSON")
+    args = parser.parse_args(argv)
+
+    url = urllib.parse.urlsplit(args.url)
+    request = build_request(url, args.image, args.raw)
+    results = asyncio.run(run(url, request, args.concurrency, args.duration, args.warmup, args.backoff))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, "image": args.image, "raw": args.raw, "levels": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""Several cameras in one process: a capture thread per camera and one shared, fair analysis pool.
+
+    python multi_camera.py --list                              # serials of the connected RealSense devices
+    python multi_camera.py --serial 012345678 --serial 087654321
+    python multi_camera.py --all-cameras --workers 6
+    python multi_camera.py --synthetic 4 --headless --duration 20
+
+Every camera's capture thread hands its newest frame to a MultiCameraAnalyzer,
+which keeps at most one waiting frame per camera (a newer frame replaces it) and
+gives free workers to the cameras in turn. A fast camera can therefore never
+starve a slow one, and an idle camera's share of the pool goes to the others.
+With one worker per core the analyzed frames per second grow with the core
+count until the cameras' own frame rate is the limit.
+"""
+import argparse
+import collections
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+from frame_capture import CaptureThread
+from frame_ring import FrameChannel
+from frame_source import PLAYBACK_MODES, REALTIME, RESOLUTIONS, connected_serials, open_source
+from fruit_pipeline import add_pipeline_arguments, pipeline_from_args
+from instrumentation import METRICS, add_metrics_arguments, start_exporter
+from live_analysis import _init_worker, submit_frame
+
+
+class CameraStats:
+    """Counters and the newest analysis of one camera, updated by MultiCameraAnalyzer."""
+
+    def __init__(self, name):
+        self.name = name
+        self.offered = 0
+        self.replaced = 0  # Superseded by a newer frame before a worker was free
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_latency = 0.0
+        self.latest_seq = 0
+        self.latest = None
+        self.started = time.perf_counter()
+        self._done_times = collections.deque(maxlen=512)
+
+    def throughput(self, window=5.0):
+        """Analyzed frames per second over the last window seconds."""
+        now = time.perf_counter()
+        recent = sum(1 for t in self._done_times if now - t <= window)
+        elapsed = min(window, now - self.started)
+        return recent / elapsed if elapsed > 0 else 0.0
+
+    def text(self):
+        counts = ""
+        if self.latest is not None:
+            counts = f"Fruits: {self.latest.get('fruit_count', 0)}  Faulty: {self.latest.get('faulty_count', 0)}  "
+        return (f"{counts}Analyzed: {self.completed} ({self.throughput():.1f}/s)  "
+                f"Replaced: {self.replaced}  Latency: {self.last_latency * 1000:.0f} ms")
+
+
+class MultiCameraAnalyzer:
+    """One process pool shared by several cameras, handing free workers to the cameras in turn.
+
+    offer() never blocks the capture thread: the frame becomes the camera's only
+    waiting frame. A dispatcher thread fills free workers round-robin over the
+    cameras with a waiting frame, so with W workers and C busy cameras each
+    camera gets W / C of the pool whatever its frame rate.
+
+    Each camera has its own shared-memory FrameRing (see frame_ring), so workers
+    read the frames in place; shared_memory=False pickles them instead.
+    """
+
+    def __init__(self, names, workers=None, max_in_flight=None, pipeline_config=None, shared_memory=True):
+        """pipeline_config holds FruitAnalysisPipeline arguments for the workers, e.g. pipeline.config()."""
+        self.names = list(names)
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_in_flight = max_in_flight or self.workers
+        self.pipeline_config = pipeline_config or {}
+        self.shared_memory = shared_memory
+        self.stats = {name: CameraStats(name) for name in self.names}
+
+        self._executor = None
+        self._channels = {}
+        self._dispatcher = None
+        self._condition = threading.Condition()
+        self._waiting = {}  # Camera name -> (seq, color image)
+        self._turn = 0  # Camera asked first on the next dispatch
+        self._in_flight = 0
+        self._running = False
+        self.error = None  # Why the analyzer stopped on its own, e.g. a worker process died
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                                   initargs=(self.pipeline_config,))
+            self._running = True
+            if self.shared_memory:
+                # A camera never has more frames in flight than the whole pool
+                self._channels = {name: FrameChannel(self.max_in_flight) for name in self.names}
+            for stats in self.stats.values():
+                stats.started = time.perf_counter()
+            self._dispatcher = threading.Thread(target=self._dispatch, name="camera-dispatch", daemon=True)
+            self._dispatcher.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._waiting.clear()
+            self._condition.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=2)
+            self._dispatcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for channel in self._channels.values():
+            channel.close()
+        self._channels = {}
+
+    def offer(self, name, seq, color_image):
+        """Make this the next frame of camera name to analyze, replacing one still waiting."""
+        with self._condition:
+            if not self._running:
+                return
+            stats = self.stats[name]
+            stats.offered += 1
+            if name in self._waiting:
+                stats.replaced += 1
+                METRICS.incr("multi_camera_replaced")
+            self._waiting[name] = (seq, color_image)
+            self._condition.notify_all()
+
+    def _next_camera(self):
+        # Round-robin, starting after the camera served last
+        for i in range(len(self.names)):
+            name = self.names[(self._turn + i) % len(self.names)]
+            if name in self._waiting:
+                self._turn = (self._turn + i + 1) % len(self.names)
+                return name
+        return None
+
+    def _dispatch(self):
+        # Submitting from here rather than from the done callbacks keeps the pool's own thread out of it
+        while True:
+            with self._condition:
+                while self._running and (self._in_flight >= self.max_in_flight or not self._waiting):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                name = self._next_camera()
+                seq, color_image = self._waiting.pop(name)
+                self._in_flight += 1
+                self.stats[name].submitted += 1
+                METRICS.gauge("multi_camera_in_flight", self._in_flight)
+
+            start = time.perf_counter()
+            try:
+                submitted = submit_frame(self._executor, self._channels.get(name), seq, color_image)
+            except RuntimeError as e:
+                # The pool was shut down, or a worker died and broke it (BrokenProcessPool)
+                with self._condition:
+                    self._in_flight -= 1
+                    if self._running:
+                        self.error = e
+                        self._running = False
+                        self._waiting.clear()
+                        METRICS.incr("multi_camera_errors")
+                        print(f"Analysis stopped: {e!r}", file=sys.stderr)
+                return
+            if submitted is None:
+                # No free slot in the camera's ring; can't happen while it has a slot per worker
+                with self._condition:
+                    self._in_flight -= 1
+                    self.stats[name].replaced += 1
+                continue
+            future, release = submitted
+            future.add_done_callback(
+                lambda f, name=name, seq=seq, start=start, release=release: self._finished(f, name, seq, start, release))
+
+    def _finished(self, future, name, seq, start, release):
+        release()
+        now = time.perf_counter()
+        with self._condition:
+            self._in_flight -= 1
+            METRICS.gauge("multi_camera_in_flight", self._in_flight)
+            self._condition.notify_all()
+            if future.cancelled():
+                return
+            stats = self.stats[name]
+            if future.exception() is not None:
+                stats.failed += 1
+                return
+            stats.completed += 1
+            stats._done_times.append(now)
+            stats.last_latency = now - start
+            # Workers can finish out of order; never replace a newer result with an older one
+            if seq > stats.latest_seq:
+                stats.latest_seq = seq
+                stats.latest = future.result()
+        METRICS.observe("multi_camera.analysis", now - start)
+
+    def latest(self, name):
+        """Return (frame seq, summary) of the newest finished analysis of one camera, or (0, None)."""
+        with self._condition:
+            stats = self.stats[name]
+            return stats.latest_seq, stats.latest
+
+    def throughput(self):
+        return sum(stats.throughput() for stats in self.stats.values())
+
+    def stats_text(self):
+        text = (f"Cameras: {len(self.names)}  Workers: {self.workers}  "
+                f"Analyzed: {sum(s.completed for s in self.stats.values())} ({self.throughput():.1f}/s)")
+        if self.error is not None:
+            text += f"  Analysis stopped: {self.error!r}"
+        return text
+
+
+def open_cameras(serials=(), all_cameras=False, replays=(), synthetic=0, mode=REALTIME, width=640, height=480,
+                 fps=30):
+    """Frame sources by camera name: RealSense devices by serial, recordings by folder, synthetic feeds."""
+    if all_cameras:
+        serials = list(serials) + [serial for serial in connected_serials() if serial not in serials]
+    sources = collections.OrderedDict()
+    for serial in serials:
+        sources[serial] = open_source(width=width, height=height, fps=fps, serial=serial)
+    for path in replays:
+        sources[os.path.basename(os.path.normpath(path))] = open_source(path, mode=mode)
+    for i in range(synthetic):
+        # A different seed per feed, so the stations don't show the same tray
+        sources[f"synthetic-{i + 1}"] = open_source(synthetic=True, mode=mode, width=width, height=height, fps=fps,
+                                                    seed=i)
+    return sources
+
+
+def start_captures(sources):
+    """A started CaptureThread per source; a camera that fails to start is reported and left out."""
+    captures = collections.OrderedDict()
+    for name, source in sources.items():
+        capture = CaptureThread(source.width, source.height, source.fps, source=source, name=f"capture-{name}")
+        try:
+            capture.start()
+        except Exception as e:
+            print(f"Camera {name} not started: {e}", file=sys.stderr)
+            continue
+        captures[name] = capture
+    return captures
+
+
+def connect(captures, analyzer):
+    """Send every new frame of every camera to the analyzer, from the camera's own capture thread."""
+    for name, capture in captures.items():
+        capture.on_frame = lambda frame, name=name: analyzer.offer(name, frame.seq, frame.color)
+
+
+def run_headless(captures, analyzer, duration=None, interval=2.0):
+    """Print each camera's counts and throughput every interval until duration or every recording ends."""
+    start = time.perf_counter()
+    next_report = start + interval
+    try:
+        while duration is None or time.perf_counter() - start < duration:
+            if all(capture.finished for capture in captures.values()) or not analyzer.running:
+                break
+            time.sleep(0.05)
+            if time.perf_counter() >= next_report:
+                next_report += interval
+                for name in analyzer.names:
+                    print(f"{name:20s} {analyzer.stats[name].text()}")
+                print(analyzer.stats_text())
+    except KeyboardInterrupt:
+        pass
+
+    elapsed = time.perf_counter() - start
+    completed = sum(stats.completed for stats in analyzer.stats.values())
+    for name in analyzer.names:
+        stats = analyzer.stats[name]
+        print(f"{name:20s} captured {captures[name].frames_captured:6d}  analyzed {stats.completed:6d}  "
+              f"replaced {stats.replaced:6d}  failed {stats.failed}")
+    print(f"Analyzed {completed} frames from {len(captures)} cameras with {analyzer.workers} workers in "
+          f"{elapsed:.1f}s: {completed / elapsed if elapsed else 0:.1f} frames/second")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture and analyze several cameras in one process.")
+    parser.add_argument("--list", action="store_true", help="print the serials of the connected RealSense devices")
+    parser.add_argument("--serial", action="append", default=[], help="RealSense serial number (repeatable)")
+    parser.add_argument("--all-cameras", action="store_true", help="use every connected RealSense device")
+    parser.add_argument("--replay", action="append", default=[], metavar="DIR",
+                        help="replay a recording as one more camera (repeatable)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N", help="add N generated camera feeds")
+    parser.add_argument("--mode", choices=PLAYBACK_MODES, default=REALTIME, help="replay pacing")
+    parser.add_argument("--resolution", choices=sorted(RESOLUTIONS), default="640x480")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--workers", type=int, help="analysis processes shared by all cameras (default: cores - 1)")
+    parser.add_argument("--headless", action="store_true", help="print the statistics instead of showing the grid")
+    parser.add_argument("--duration", type=float, help="seconds to run headless (default: until interrupted)")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between headless reports")
+    parser.add_argument("--pickle-frames", action="store_true",
+                        help="send frames to the workers pickled instead of through shared memory")
+    add_pipeline_arguments(parser)
+    add_metrics_arguments(parser)
+    args, qt_args = parser.parse_known_args(argv)
+
+    if args.list:
+        for serial in connected_serials():
+            print(serial)
+        return 0
+
+    width, height = RESOLUTIONS[args.resolution]
+    sources = open_cameras(args.serial, args.all_cameras, args.replay, args.synthetic, args.mode, width, height,
+                           args.fps)
+    if not sources:
+        parser.error("no cameras: pass --serial, --all-cameras, --replay or --synthetic")
+
+    exporter = start_exporter(args)
+    captures = start_captures(sources)
+    if not captures:
+        print("No camera could be started", file=sys.stderr)
+        return 1
+    analyzer = MultiCameraAnalyzer(captures, args.workers, pipeline_config=pipeline_from_args(args).config(),
+                                   shared_memory=not args.pickle_frames)
+    analyzer.start()
+    connect(captures, analyzer)
+    try:
+        if args.headless:
+            status = run_headless(captures, analyzer, args.duration, args.interval)
+        else:
+            # Qt is only needed for the grid view
+            from PyQt5.QtWidgets import QApplication
+            from camera_grid import CameraGridWindow
+
+            app = QApplication(sys.argv[:1] + qt_args)
+            window = CameraGridWindow(captures, analyzer)
+            window.show()
+            status = app.exec_()
+    finally:
+        analyzer.stop()
+        for capture in captures.values():
+            capture.stop()
+        if exporter is not None:
+            exporter.stop()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Interactive tuner for the segmentation and Hough parameters, saved as a --profile for the GUI and batch runs.
+
+Usage:
+    python param_tuner.py Original_Image.jpg --profile tuned.json
+
+Moving a slider redraws the mask, contours and circles on a downscaled copy of
+the image; once the sliders have been still for a moment the same parameters
+are run at full resolution. OpenCV trackbars report no mouse release, so a
+short pause stands in for it. Only the stages downstream of the changed
+parameter are recomputed: a Hough slider leaves the mask alone, a threshold
+slider redoes everything after the gray image.
+
+Keys: s save the profile, r reset to defaults, q or Esc quit.
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from fruit_pipeline import FrameContext, FruitAnalysisPipeline
+from tuning_profile import load_profile, make_profile, save_profile, scaled_profile
+
+# Stage (or stages) each parameter feeds, and the stages computed from each stage
+PARAM_STAGE = {
+    "segmentation": "otsu", "threshold": "otsu", "dark_fruit": "otsu",
+    "hsv_lower": "color_labels", "hsv_upper": "color_labels",
+    "morph_kernel": "morphology", "min_region_area": "regions", "blur_kernel": "blurred",
+    "hough_min_dist": ("circles", "peaks"), "hough_param1": "circles", "hough_param2": "circles",
+    "min_radius": ("circles", "distance"), "max_radius": ("circles", "peaks"),
+}
+DOWNSTREAM = {
+    "color_labels": ("otsu",),
+    "otsu": ("morphology",),
+    "morphology": ("contours", "regions", "distance"),
+    "contours": ("boxes",),
+    "boxes": (),  # Plus "circles" when the Hough search is limited to the fruit boxes
+    "regions": (),
+    "distance": ("peaks",),
+    "peaks": (),  # Plus "circles" when the circles are the distance peaks
+    "blurred": ("circles",),
+    "circles": (),
+}
+
+# (trackbar, profile key, index into a list value, minimum, maximum)
+TRACKBARS = [
+    ("HSV mode", "segmentation", None, 0, 1),
+    ("Threshold (0=Otsu)", "threshold", None, 0, 255),
+    ("Dark fruit", "dark_fruit", None, 0, 1),
+    ("H low", "hsv_lower", 0, 0, 179),
+    ("S low", "hsv_lower", 1, 0, 255),
+    ("V low", "hsv_lower", 2, 0, 255),
+    ("H high", "hsv_upper", 0, 0, 179),
+    ("S high", "hsv_upper", 1, 0, 255),
+    ("V high", "hsv_upper", 2, 0, 255),
+    ("Morph kernel", "morph_kernel", None, 1, 21),
+    ("Min region area", "min_region_area", None, 0, 5000),
+    ("Blur kernel", "blur_kernel", None, 1, 31),
+    ("Hough min dist", "hough_min_dist", None, 1, 200),
+    ("Hough param1", "hough_param1", None, 1, 300),
+    ("Hough param2", "hough_param2", None, 1, 200),
+    ("Min radius", "min_radius", None, 0, 200),
+    ("Max radius", "max_radius", None, 1, 300),
+]
+
+
+def downstream_of(stage, roi_defects=False, distance_peaks=False):
+    """The stage (or tuple of stages) and everything computed from it."""
+    stages, pending = [], [stage] if isinstance(stage, str) else list(stage)
+    while pending:
+        name = pending.pop()
+        if name in stages:
+            continue
+        stages.append(name)
+        pending.extend(DOWNSTREAM[name])
+        if name == "boxes" and roi_defects and not distance_peaks:
+            pending.append("circles")
+        if name == "peaks" and distance_peaks:
+            pending.append("circles")
+    return stages
+
+
+class Tuner:
+    """Keeps one FrameContext per scale and recomputes only what a parameter change invalidated."""
+
+    def __init__(self, image, profile=None, preview_scale=0.5, roi_defects=False, distance_peaks=False):
+        self.image = image
+        self.profile = make_profile(profile)
+        self.preview_scale = preview_scale
+        self.roi_defects = roi_defects
+        self.distance_peaks = distance_peaks
+        self._contexts = {}
+        self._circles = {}
+
+    def _context(self, scale):
+        ctx = self._contexts.get(scale)
+        if ctx is None:
+            image = self.image if scale == 1 else cv2.resize(self.image, None, fx=scale, fy=scale,
+                                                             interpolation=cv2.INTER_AREA)
+            ctx = self._contexts[scale] = FrameContext(image, options=self._options(scale))
+        return ctx
+
+    def _options(self, scale):
+        # The tuned HSV range changes while dragging, so skip building a lookup table for each value
+        return dict(scaled_profile(self.profile, scale) if scale != 1 else self.profile, color_table=False)
+
+    def set(self, key, value, index=None):
+        """Change one parameter; returns the stages that will be recomputed on the next render."""
+        if index is not None:
+            value = [value if i == index else v for i, v in enumerate(self.profile[key])]
+        if key == "segmentation" and not isinstance(value, str):
+            value = "hsv" if value else "otsu"
+        if key == "dark_fruit":
+            value = bool(value)
+        if key == "blur_kernel":
+            value |= 1
+        if self.profile[key] == value:
+            return []
+        self.profile[key] = value
+        stale = downstream_of(PARAM_STAGE[key], self.roi_defects, self.distance_peaks)
+        for scale, ctx in self._contexts.items():
+            ctx.options = self._options(scale)
+            ctx.invalidate(stale)
+            if "circles" in stale:
+                self._circles.pop(scale, None)
+        return stale
+
+    def reset(self, profile=None):
+        self.profile = make_profile(profile)
+        self._contexts.clear()
+        self._circles.clear()
+
+    def render(self, scale):
+        """Mask with contours next to the image with circles, plus the counts and the stages recomputed."""
+        ctx = self._context(scale)
+        start = time.perf_counter()
+        before = set(ctx.computed())
+        mask = ctx.get("morphology")
+        contours = ctx.get("contours")
+        regions = ctx.get("regions")
+
+        error = None
+        circles = self._circles.get(scale)
+        fresh = circles is None
+        if fresh:
+            try:
+                # Build the detector from the (scaled) profile the same way the GUI and batch runs do
+                detector = FruitAnalysisPipeline(roi_defects=self.roi_defects, distance_peaks=self.distance_peaks,
+                                                 profile=scaled_profile(self.profile, scale) if scale != 1
+                                                 else self.profile).detector("faulty")
+                ctx.require(detector.requires)
+                circles = self._circles[scale] = detector.run(ctx)
+            except ValueError as e:
+                error = str(e)  # e.g. min radius above max radius while a slider is mid-way
+        recomputed = [name for name in ctx.computed() if name not in before]
+        if fresh and circles is not None:
+            recomputed.append("circles")
+        elapsed = time.perf_counter() - start
+
+        left = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+        cv2.drawContours(left, contours, -1, (0, 255, 0), 1)
+        for x, y, w, h in regions.boxes:
+            cv2.rectangle(left, (int(x), int(y)), (int(x + w), int(y + h)), (255, 0, 0), 1)
+        right = circles["faulty_image"] if circles is not None else ctx.color.copy()
+        view = np.hstack([left, right])
+
+        label = "preview %.2gx" % scale if scale != 1 else "full resolution"
+        lines = [f"{label}  {elapsed * 1000:.1f} ms  recomputed: {', '.join(recomputed) or 'nothing'}",
+                 f"contours {len(contours)}  regions {len(regions)}  circles "
+                 f"{circles['faulty_count'] if circles is not None else '-'}"]
+        if error:
+            lines.append(error)
+        for i, line in enumerate(lines):
+            cv2.putText(view, line, (10, 20 + 20 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+        return view, recomputed
+
+
+def _trackbar_value(profile, key, index):
+    value = profile[key]
+    if index is not None:
+        value = value[index]
+    if key == "segmentation":
+        value = int(value == "hsv")
+    return int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the detection parameters on one image.")
+    parser.add_argument("image", nargs="?", default="Original_Image.jpg")
+    parser.add_argument("--profile", default="detection_profile.json", help="profile to load (if it exists) and save")
+    parser.add_argument("--preview-scale", type=float, default=0.5, help="image scale while a slider moves")
+    parser.add_argument("--settle", type=float, default=0.3,
+                        help="seconds without slider changes before the full-resolution pass")
+    parser.add_argument("--roi-defects", action="store_true",
+                        help="tune the fruit-region Hough search instead of the whole-frame one")
+    parser.add_argument("--distance-peaks", action="store_true",
+                        help="tune the distance-transform peaks instead of the Hough search")
+    args = parser.parse_args(argv)
+
+    image = cv2.imread(args.image)
+    if image is None:
+        parser.error(f"could not read {args.image}")
+    try:
+        profile = load_profile(args.profile) if os.path.exists(args.profile) else None
+    except (OSError, ValueError) as e:
+        parser.error(f"{args.profile}: {e}")
+    tuner = Tuner(image, profile, args.preview_scale, roi_defects=args.roi_defects,
+                  distance_peaks=args.distance_peaks)
+
+    cv2.namedWindow("Tuner", cv2.WINDOW_NORMAL)
+    cv2.namedWindow("Parameters", cv2.WINDOW_NORMAL)
+    state = {"changed": time.perf_counter(), "full_pending": True, "preview_pending": True}
+
+    def on_change(key, index, minimum):
+        def callback(value):
+            if tuner.set(key, max(minimum, value), index):
+                state["changed"] = time.perf_counter()
+                state["preview_pending"] = state["full_pending"] = True
+        return callback
+
+    def sync_trackbars():
+        for name, key, index, minimum, maximum in TRACKBARS:
+            cv2.setTrackbarPos(name, "Parameters", _trackbar_value(tuner.profile, key, index))
+
+    for name, key, index, minimum, maximum in TRACKBARS:
+        cv2.createTrackbar(name, "Parameters", _trackbar_value(tuner.profile, key, index), maximum,
+                           on_change(key, index, minimum))
+
+    try:
+        while True:
+            # Render from the loop, not the callbacks, so a burst of slider events costs one redraw
+            now = time.perf_counter()
+            if state["preview_pending"]:
+                state["preview_pending"] = False
+                state["view"] = tuner.render(args.preview_scale)[0]
+                cv2.imshow("Tuner", state["view"])
+            elif state["full_pending"] and now - state["changed"] >= args.settle:
+                state["full_pending"] = False
+                state["view"] = tuner.render(1)[0]
+                cv2.imshow("Tuner", state["view"])
+
+            key = cv2.waitKey(15) & 0xFF
+            if key in (ord("q"), 27):
+                break
+            if key == ord("s"):
+                try:
+                    save_profile(args.profile, tuner.profile)
+                except (ValueError, OSError) as e:
+                    # e.g. min radius above max radius; show it and keep tuning
+                    print(f"Not saved: {e}")
+                    view = state["view"].copy()
+                    cv2.putText(view, f"Not saved: {e}", (10, view.shape[0] - 12), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                                (0, 0, 255), 1)
+                    cv2.imshow("Tuner", view)
+                else:
+                    print(f"Saved {args.profile}")
+            elif key == ord("r"):
+                tuner.reset()
+                sync_trackbars()
+                state["preview_pending"] = state["full_pending"] = True
+    finally:
+        cv2.destroyAllWindows()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+"""Thumbnail cache for the runner previews.
+
+Entries are keyed on (path, mtime, file size, thumbnail size, annotation), so an
+unchanged file is served from memory after a single os.stat() and a rewritten
+result image is decoded again. JPEGs are decoded with PIL's draft mode, which
+lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding instead of producing the
+full-size bitmap first. The cache is bounded by entry count and by decoded
+bytes, evicting the least recently used previews first.
+"""
+import collections
+import os
+
+from PIL import Image
+
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class PreviewCache:
+    def __init__(self, max_items=32, max_bytes=32 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, path, size=(300, 300), annotate=None):
+        """Return a PIL thumbnail of path no larger than size.
+
+        annotate(image, scale) may draw on the thumbnail before it is cached;
+        scale maps full-resolution coordinates onto it. Raises FileNotFoundError
+        like Image.open when the file is missing.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size, tuple(size), annotate)
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        # A changed file makes every older preview of it stale
+        for stale in [k for k in self._entries if k[0] == path and k[1:3] != key[1:3]]:
+            self._drop(stale)
+
+        image = self._decode(path, size, annotate)
+        self._entries[key] = image
+        self._bytes += _image_bytes(image)
+        while self._entries and (len(self._entries) > self.max_items or self._bytes > self.max_bytes):
+            if len(self._entries) == 1:
+                break  # Always keep the preview that was just asked for
+            self._drop(next(iter(self._entries)))
+        return image
+
+    def _decode(self, path, size, annotate):
+        image = Image.open(path)
+        full_width, full_height = image.size
+        # The thumbnail's actual size, so the draft scale isn't limited by the box's other side
+        ratio = min(size[0] / full_width, size[1] / full_height, 1.0)
+        target = (max(1, round(full_width * ratio)), max(1, round(full_height * ratio)))
+        # JPEG only: decode straight to the smallest DCT scale still at least `target`
+        image.draft("RGB", target)
+        image.load()
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail(size, reducing_gap=None)
+        if annotate is not None:
+            annotate(image, image.width / full_width)
+        return image
+
+    def _drop(self, key):
+        image = self._entries.pop(key)
+        self._bytes -= _image_bytes(image)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
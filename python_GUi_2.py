@@ -1,17 +1,14 @@
 import tkinter as tk
 from tkinter import filedialog
-import subprocess
+
+from script_worker import ScriptRunner, run_in_text_widget
 
 
 def run_script():
     script_path = script_entry.get()
     if script_path:
-        result = subprocess.run(['python', script_path],
-                                capture_output=True, text=True)
-        output_text.config(state='normal')
-        output_text.delete('1.0', tk.END)
-        output_text.insert(tk.END, result.stdout)
-        output_text.config(state='disabled')
+        # Runs on the warm worker process; output streams in while the window stays responsive
+        run_in_text_widget(window, runner, script_path, output_text)
 
 
 def browse_script():
@@ -22,9 +19,22 @@ def browse_script():
         script_entry.insert(tk.END, file_path)
 
 
+def cancel_script():
+    runner.cancel()
+
+
+def close_window():
+    runner.stop()
+    window.destroy()
+
+
 # Create the main window
 window = tk.Tk()
 window.title("Python Script Runner")
+window.protocol("WM_DELETE_WINDOW", close_window)
+
+# Worker process that keeps cv2 and numpy imported between runs; starts warming up now
+runner = ScriptRunner().start()
 
 # Script path entry
 script_label = tk.Label(window, text="Script Path:")
@@ -37,6 +47,8 @@ browse_button.grid(row=0, column=2, padx=5, pady=5)
 # Run button
 run_button = tk.Button(window, text="Run Script", command=run_script)
 run_button.grid(row=1, column=2, pady=10)
+cancel_button = tk.Button(window, text="Cancel", command=cancel_script)
+cancel_button.grid(row=1, column=1, sticky="e", pady=10)
 
 # Output text area
 output_label = tk.Label(window, text="Output:")
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+
+class Regions:
+    """Labeled fruit regions from one connected-components pass over a binary mask."""
+
+    def __init__(self, labels, areas, boxes, centroids, label_ids):
+        self.labels = labels        # int32 label image, 0 is background
+        self.areas = areas          # pixel area per region
+        self.boxes = boxes          # (x, y, w, h) per region
+        self.centroids = centroids  # (cx, cy) per region
+        self.label_ids = label_ids  # label value of each region in self.labels
+
+    def __len__(self):
+        return len(self.label_ids)
+
+
+def label_regions(mask, min_area=0, connectivity=8, labels=None):
+    """Label a binary mask and keep the components larger than min_area; labels is an optional int32 dst."""
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, labels, connectivity=connectivity,
+                                                                       ltype=cv2.CV_32S)
+
+    # Row 0 is the background component
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    keep = np.flatnonzero(areas > min_area)
+    label_ids = keep + 1
+
+    if len(keep) < count - 1:
+        # Relabel so that dropped components become background in the label image
+        remap = np.zeros(count, np.int32)
+        remap[label_ids] = label_ids
+        labels = remap[labels]
+
+    boxes = stats[label_ids][:, [cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP, cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT]]
+    return Regions(labels, areas[keep], boxes, centroids[label_ids], label_ids)
+
+
+def depth_stats(regions, depth_image, depth_scale=0.001):
+    """Masked per-region depth mean, min, max and median in meters.
+
+    Only pixels inside each region with a valid (non-zero) depth contribute. All
+    regions are reduced together: the valid pixels are sorted once by (label, depth),
+    which puts each region's depths in a contiguous, ordered run.
+    Returns a dict of arrays aligned with the regions; regions without valid depth get NaN.
+    """
+    n = len(regions)
+    stats = {key: np.full(n, np.nan) for key in ("mean", "min", "max", "median")}
+    stats["valid_pixels"] = np.zeros(n, np.int64)
+    if n == 0:
+        return stats
+
+    # Map label values to region indices 1..n, everything else to 0
+    index_of_label = np.zeros(int(regions.label_ids.max()) + 1, np.int32)
+    index_of_label[regions.label_ids] = np.arange(1, n + 1, dtype=np.int32)
+    region_index = index_of_label[regions.labels]
+
+    valid = (region_index > 0) & (depth_image > 0)
+    idx = region_index[valid] - 1
+    depth = depth_image[valid]
+    if depth.size == 0:
+        return stats
+
+    order = np.lexsort((depth, idx))
+    idx = idx[order]
+    depth = depth[order].astype(np.float64) * depth_scale
+
+    counts = np.bincount(idx, minlength=n)
+    sums = np.bincount(idx, weights=depth, minlength=n)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has = counts > 0
+    first = starts[has]
+    last = first + counts[has] - 1
+
+    stats["valid_pixels"] = counts
+    stats["mean"][has] = sums[has] / counts[has]
+    stats["min"][has] = depth[first]
+    stats["max"][has] = depth[last]
+    # Average the two middle elements so even-sized runs match np.median
+    stats["median"][has] = 0.5 * (depth[first + (counts[has] - 1) // 2] + depth[first + counts[has] // 2])
+    return stats
+
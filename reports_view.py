@@ -0,0 +1,102 @@
+import time
+
+from PyQt5.QtWidgets import (QComboBox, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QVBoxLayout, QWidget)
+
+# View name -> (title, column headers)
+VIEWS = {
+    "minutes": ("Counts per minute", ["Minute", "Results", "Fruits", "Faulty", "Depth defects", "Defect rate"]),
+    "batches": ("Defect rate per batch", ["Batch", "First", "Last", "Results", "Fruits", "Faulty", "Depth defects",
+                                          "Defect rate"]),
+    "recent": ("Recent results", ["Time", "Batch", "Kind", "Source", "Fruits", "Faulty", "Depth defects"]),
+}
+
+
+def _time(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def _rate(faulty, fruits):
+    return f"{faulty / fruits:.1%}" if fruits else "-"
+
+
+class ReportsView(QWidget):
+    """One page of a ResultsStore view in a table; only the visible page is ever queried or drawn."""
+
+    def __init__(self, store, page_size=50, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.page_size = page_size
+        self.page = 0
+
+        self.view_box = QComboBox()
+        for name, (title, _) in VIEWS.items():
+            self.view_box.addItem(title, name)
+        self.view_box.currentIndexChanged.connect(self._view_changed)
+
+        self.prev_button = QPushButton("Newer")
+        self.prev_button.clicked.connect(lambda: self._turn(-1))
+        self.next_button = QPushButton("Older")
+        self.next_button.clicked.connect(lambda: self._turn(1))
+        self.page_label = QLabel()
+
+        self.table = QTableWidget(0, 0)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.view_box)
+        controls.addStretch()
+        controls.addWidget(self.prev_button)
+        controls.addWidget(self.page_label)
+        controls.addWidget(self.next_button)
+
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    @property
+    def view(self):
+        return self.view_box.currentData()
+
+    def _view_changed(self):
+        self.page = 0
+        self.refresh()
+
+    def _turn(self, step):
+        self.page = max(0, self.page + step)
+        self.refresh()
+
+    def _rows(self):
+        offset = self.page * self.page_size
+        if self.view == "minutes":
+            return [(_time(minute), results, fruits, faulty, depth, _rate(faulty, fruits))
+                    for minute, results, fruits, faulty, depth in self.store.counts_per_minute(self.page_size, offset)]
+        if self.view == "batches":
+            return [(batch, _time(first), _time(last), results, fruits, faulty, depth, _rate(faulty, fruits))
+                    for batch, first, last, results, fruits, faulty, depth in self.store.batches(self.page_size, offset)]
+        return [(_time(ts), batch, kind, source or "", fruits, faulty, depth)
+                for ts, batch, kind, source, fruits, faulty, depth in self.store.recent(self.page_size, offset)]
+
+    def refresh(self):
+        if self.store is None:
+            return
+        pages = max(1, -(-self.store.count(self.view) // self.page_size))
+        self.page = min(self.page, pages - 1)
+        rows = self._rows()
+
+        headers = VIEWS[self.view][1]
+        self.table.setUpdatesEnabled(False)
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                self.table.setItem(r, c, QTableWidgetItem(str(value)))
+        self.table.setUpdatesEnabled(True)
+
+        self.page_label.setText(f"Page {self.page + 1} / {pages}")
+        self.prev_button.setEnabled(self.page > 0)
+        self.next_button.setEnabled(self.page < pages - 1)
@@ -0,0 +1,238 @@
+"""Analysis results in a local SQLite database, written in batches from a background thread.
+
+    store = ResultsStore("fruit_results.db", batch="lot-17")
+    store.start()
+    store.record("capture", fruit_count=12, faulty_count=1)
+    store.counts_per_minute(limit=50)       # newest minutes first
+    store.stop()                            # flushes what is still queued
+
+Every flush inserts the queued rows and folds them into the per-minute and
+per-batch totals in one transaction, so the report queries read small
+aggregate tables through their primary keys no matter how many results a
+session has accumulated.
+
+The queue is bounded (queue_size records): if the disk cannot keep up, new
+records are dropped and counted rather than piling up in memory. If a write
+fails, the error is printed and kept in error, and the store stops taking
+records; the results already committed stay readable.
+"""
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from instrumentation import METRICS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    minute INTEGER NOT NULL,
+    batch TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    source TEXT,
+    fruit_count INTEGER NOT NULL,
+    faulty_count INTEGER NOT NULL,
+    depth_faulty_count INTEGER NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS results_ts ON results (ts);
+CREATE INDEX IF NOT EXISTS results_batch_ts ON results (batch, ts);
+
+CREATE TABLE IF NOT EXISTS minute_totals (
+    minute INTEGER PRIMARY KEY,
+    results INTEGER NOT NULL,
+    fruits INTEGER NOT NULL,
+    faulty INTEGER NOT NULL,
+    depth_faulty INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS batch_totals (
+    batch TEXT PRIMARY KEY,
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    results INTEGER NOT NULL,
+    fruits INTEGER NOT NULL,
+    faulty INTEGER NOT NULL,
+    depth_faulty INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batch_totals_last_ts ON batch_totals (last_ts);
+"""
+
+_STOP = object()
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    # WAL lets the GUI read reports while the writer thread commits
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def default_batch_name():
+    return time.strftime("%Y%m%d-%H%M")
+
+
+class ResultsStore:
+    """Queues result records and commits them from a writer thread every flush_interval
+    seconds or batch_size records, whichever comes first.
+    """
+
+    def __init__(self, path="fruit_results.db", batch=None, batch_size=200, flush_interval=1.0, queue_size=10000):
+        self.path = path
+        self.batch = batch or default_batch_name()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with connect(path) as conn:
+            conn.executescript(SCHEMA)
+        # Reads happen on the caller's thread; the writer thread opens its own connection
+        self._reader = connect(path)
+        self._reader_lock = threading.Lock()
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.error = None  # The write error that stopped the store, if any
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="results-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._reader.close()
+
+    def record(self, kind, fruit_count=0, faulty_count=0, depth_faulty_count=0, source=None, detail=None,
+               ts=None, batch=None):
+        """Queue one result; never blocks on the database. Returns False if the record was dropped."""
+        if self.error is not None:
+            return self._drop()
+        ts = time.time() if ts is None else ts
+        try:
+            self._queue.put_nowait((ts, int(ts // 60), batch or self.batch, kind, source, int(fruit_count),
+                                    int(faulty_count), int(depth_faulty_count),
+                                    json.dumps(detail) if detail is not None else None))
+        except queue.Full:
+            return self._drop()
+        METRICS.gauge("store_queue", self._queue.qsize())
+        return True
+
+    def _drop(self):
+        self.dropped += 1
+        METRICS.incr("store_dropped")
+        return False
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            stopping = False
+            while not stopping:
+                rows = []
+                deadline = time.monotonic() + self.flush_interval
+                # Collect until the batch is full, the interval has passed or we are told to stop
+                while len(rows) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    rows.append(item)
+                if rows and self.error is None:
+                    try:
+                        with METRICS.stage("store.flush"):
+                            self._write(conn, rows)
+                    except (sqlite3.Error, OSError) as e:
+                        # e.g. disk full or the file removed; keep draining the queue so stop() still returns
+                        self.error = e
+                        print(f"Results store {self.path} failed, no longer recording: {e}", file=sys.stderr)
+                if self.error is not None:
+                    self.dropped += len(rows)
+                    METRICS.incr("store_dropped", len(rows))
+        finally:
+            conn.close()
+
+    def _write(self, conn, rows):
+        minutes = {}
+        batches = {}
+        # Fold the rows into per-minute and per-batch totals before touching the database
+        for ts, minute, batch, _, _, fruits, faulty, depth_faulty, _ in rows:
+            m = minutes.setdefault(minute, [0, 0, 0, 0])
+            b = batches.setdefault(batch, [ts, ts, 0, 0, 0, 0])
+            for k, value in enumerate((1, fruits, faulty, depth_faulty)):
+                m[k] += value
+                b[k + 2] += value
+            b[0], b[1] = min(b[0], ts), max(b[1], ts)
+        with conn:
+            conn.executemany(
+                "INSERT INTO results (ts, minute, batch, kind, source, fruit_count, faulty_count, "
+                "depth_faulty_count, detail) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT INTO minute_totals VALUES (?, ?, ?, ?, ?) ON CONFLICT (minute) DO UPDATE SET "
+                "results = results + excluded.results, fruits = fruits + excluded.fruits, "
+                "faulty = faulty + excluded.faulty, depth_faulty = depth_faulty + excluded.depth_faulty",
+                [(minute, *totals) for minute, totals in minutes.items()])
+            conn.executemany(
+                "INSERT INTO batch_totals VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (batch) DO UPDATE SET "
+                "first_ts = min(first_ts, excluded.first_ts), last_ts = max(last_ts, excluded.last_ts), "
+                "results = results + excluded.results, fruits = fruits + excluded.fruits, "
+                "faulty = faulty + excluded.faulty, depth_faulty = depth_faulty + excluded.depth_faulty",
+                [(batch, *totals) for batch, totals in batches.items()])
+        self.written += len(rows)
+        METRICS.incr("store_rows", len(rows))
+
+    def _query(self, sql, args=()):
+        with self._reader_lock:
+            return self._reader.execute(sql, args).fetchall()
+
+    def recent(self, limit=50, offset=0):
+        """Newest individual results: (ts, batch, kind, source, fruits, faulty, depth_faulty)."""
+        return self._query(
+            "SELECT ts, batch, kind, source, fruit_count, faulty_count, depth_faulty_count FROM results "
+            "ORDER BY ts DESC LIMIT ? OFFSET ?", (limit, offset))
+
+    def counts_per_minute(self, limit=50, offset=0):
+        """Newest minutes first: (minute start ts, results, fruits, faulty, depth_faulty)."""
+        return self._query(
+            "SELECT minute * 60, results, fruits, faulty, depth_faulty FROM minute_totals "
+            "ORDER BY minute DESC LIMIT ? OFFSET ?", (limit, offset))
+
+    def batches(self, limit=50, offset=0):
+        """Most recently active batches first: (batch, first ts, last ts, results, fruits, faulty, depth_faulty)."""
+        return self._query(
+            "SELECT batch, first_ts, last_ts, results, fruits, faulty, depth_faulty FROM batch_totals "
+            "ORDER BY last_ts DESC LIMIT ? OFFSET ?", (limit, offset))
+
+    def count(self, view):
+        """Number of rows a view has, for the pager."""
+        table = {"recent": "results", "minutes": "minute_totals", "batches": "batch_totals"}[view]
+        # MAX(rowid) is an O(1) lookup; results are never deleted, so it equals COUNT(*) there
+        sql = f"SELECT MAX(rowid) FROM {table}" if table == "results" else f"SELECT COUNT(*) FROM {table}"
+        return self._query(sql)[0][0] or 0
+
+
+def add_store_arguments(parser, default="fruit_results.db"):
+    parser.add_argument("--db", default=default, help="SQLite file for analysis results "
+                        + ("('' to disable)" if default else "(off by default)"))
+    parser.add_argument("--batch", help="label for this run's results (default: start time)")
+
+
+def store_from_args(args):
+    """Open and start the store selected by add_store_arguments options, or return None."""
+    if not args.db:
+        return None
+    return ResultsStore(args.db, args.batch).start()
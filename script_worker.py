@@ -0,0 +1,281 @@
+"""A warm Python process that runs scripts for the tkinter runners.
+
+The worker imports the heavy modules (numpy, cv2, PIL) once and then runs each
+submitted script in-process with runpy, so repeated runs skip interpreter
+start-up and imports. Output is streamed back line by line while the script
+runs. A cancel or timeout kills the worker and starts a fresh one in the
+background, since arbitrary script code cannot be interrupted safely.
+
+Modules a script imports stay loaded between runs; edit a helper module and
+the next run still uses the old copy until the worker is restarted.
+
+    runner = ScriptRunner().start()
+    runner.run("Try.py", timeout=60)
+    for kind, job, payload in runner.events():   # poll from the UI loop
+        ...
+"""
+import json
+import os
+import queue
+import runpy
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+DEFAULT_PRELOAD = ("numpy", "cv2", "PIL.Image")
+DEFAULT_TIMEOUT = 300.0
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+
+class _StreamToParent:
+    """File-like object that forwards a script's prints to the parent as messages."""
+
+    def __init__(self, send, job, stream):
+        self._send = send
+        self._job = job
+        self._stream = stream
+
+    def write(self, text):
+        if text:
+            self._send({"job": self._job, "kind": "output", "stream": self._stream, "text": text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def _serve(preload):
+    # Keep a private copy of stdout for the protocol and send everything else
+    # (C-level writes from OpenCV included) to stderr, so it can't corrupt messages
+    protocol = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+    os.dup2(2, 1)
+    lock = threading.Lock()
+
+    def send(message):
+        with lock:
+            protocol.write(json.dumps(message) + "\n")
+
+    start = time.perf_counter()
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError as e:
+            send({"kind": "warning", "text": f"could not preload {name}: {e}"})
+    send({"kind": "ready", "preload_s": round(time.perf_counter() - start, 3)})
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        job, script, cwd = request["job"], request["script"], request.get("cwd")
+        start = time.perf_counter()
+        status, error = 0, None
+
+        saved = sys.stdout, sys.stderr, sys.argv[:], sys.path[:], os.getcwd()
+        sys.stdout = _StreamToParent(send, job, "stdout")
+        sys.stderr = _StreamToParent(send, job, "stderr")
+        sys.argv = [script] + request.get("args", [])
+        # Like `python script.py`: the script's folder comes first on the import path
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+        try:
+            if cwd:
+                os.chdir(cwd)
+            runpy.run_path(script, run_name="__main__")
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            # Report the traceback from the script's own frames down, without the runpy plumbing
+            etype, value, tb = sys.exc_info()
+            while tb is not None and tb.tb_frame.f_code.co_filename != script:
+                tb = tb.tb_next
+            status, error = 1, "".join(traceback.format_exception(etype, value, tb))
+        finally:
+            sys.stdout, sys.stderr, sys.argv, sys.path, cwd_before = saved
+            os.chdir(cwd_before)
+        send({"job": job, "kind": "done", "status": status, "error": error,
+              "elapsed_s": round(time.perf_counter() - start, 3)})
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+
+class ScriptRunner:
+    """Owns one warm worker process and runs one script at a time on it.
+
+    Results arrive as (kind, job, payload) tuples from events():
+      ("output", job, text)     a chunk of the script's stdout/stderr
+      ("done", job, info)       info has "status" ("ok", "failed", "timeout" or
+                                "cancelled"), "exit_code", "error" and "elapsed_s"
+      ("ready", None, info)     a worker finished preloading
+    events() never blocks, so it can be called from a Tk after() callback.
+    """
+
+    def __init__(self, preload=DEFAULT_PRELOAD, python=None):
+        self.preload = tuple(preload)
+        self.python = python or sys.executable
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._proc = None
+        self._job = None
+        self._deadline = None
+        self._started = None
+        self._next_job = 0
+
+    @property
+    def busy(self):
+        return self._job is not None
+
+    def start(self):
+        """Launch the worker without waiting for its imports to finish."""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._spawn()
+        return self
+
+    def _spawn(self):
+        self._proc = subprocess.Popen(
+            [self.python, os.path.abspath(__file__), "--serve", *self.preload],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8", bufsize=1)
+        threading.Thread(target=self._read, args=(self._proc,), name="script-worker-reader", daemon=True).start()
+
+    def _read(self, proc):
+        for line in proc.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            kind = message.get("kind")
+            if kind == "output":
+                self._events.put(("output", message["job"], message["text"]))
+            elif kind == "done":
+                self._finish(message["job"], "ok" if message["status"] == 0 else "failed", message["status"],
+                             message.get("error"), message["elapsed_s"])
+            else:
+                self._events.put((kind, None, message))
+        # The worker exited on its own (crash, os._exit in a script): fail the running job
+        with self._lock:
+            job = self._job if proc is self._proc else None
+        if job is not None:
+            self._finish(job, "failed", proc.wait(), "The worker process exited unexpectedly.", None)
+
+    def _finish(self, job, status, exit_code=None, error=None, elapsed=None):
+        with self._lock:
+            if job != self._job:
+                return  # Already reported, e.g. cancelled before the worker answered
+            if elapsed is None and self._started is not None:
+                elapsed = round(time.perf_counter() - self._started, 3)
+            self._job = self._deadline = None
+        self._events.put(("done", job, {"status": status, "exit_code": exit_code, "error": error,
+                                        "elapsed_s": elapsed}))
+
+    def run(self, script_path, args=(), timeout=DEFAULT_TIMEOUT, cwd=None):
+        """Submit a script; returns its job id. Raises RuntimeError while another script runs."""
+        self.start()
+        with self._lock:
+            if self._job is not None:
+                raise RuntimeError("A script is already running")
+            self._next_job += 1
+            self._job = self._next_job
+            self._started = time.perf_counter()
+            self._deadline = self._started + timeout if timeout else None
+            request = {"job": self._job, "script": os.path.abspath(script_path), "args": list(args),
+                       "cwd": cwd or os.getcwd()}
+            self._proc.stdin.write(json.dumps(request) + "\n")
+            self._proc.stdin.flush()
+            return self._job
+
+    def cancel(self, status="cancelled"):
+        """Stop the running script by replacing the worker; a no-op when idle."""
+        with self._lock:
+            job = self._job
+            if job is None:
+                return
+            proc = self._proc
+            self._proc = None
+        proc.kill()
+        proc.wait()
+        self._finish(job, status)
+        self.start()
+
+    def events(self):
+        """Drain pending events, enforcing the timeout of the running script."""
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            self.cancel("timeout")
+        drained = []
+        while True:
+            try:
+                drained.append(self._events.get_nowait())
+            except queue.Empty:
+                return drained
+
+    def stop(self):
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            proc.stdin.close()
+            try:
+                proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def run_in_text_widget(window, runner, script_path, output_text, on_done=None, timeout=DEFAULT_TIMEOUT,
+                       poll_ms=30):
+    """Run a script on runner and stream its output into a tk.Text without blocking the Tk loop.
+
+    on_done(info) is called on the Tk thread when the script finishes, fails or is cancelled.
+    """
+    import tkinter as tk
+
+    output_text.config(state='normal')
+    output_text.delete('1.0', tk.END)
+    output_text.config(state='disabled')
+    try:
+        job = runner.run(script_path, timeout=timeout)
+    except RuntimeError as e:
+        output_text.config(state='normal')
+        output_text.insert(tk.END, f"{e}\n")
+        output_text.config(state='disabled')
+        return None
+
+    def poll():
+        finished = None
+        chunks = []
+        for kind, event_job, payload in runner.events():
+            if event_job != job:
+                continue
+            if kind == "output":
+                chunks.append(payload)
+            elif kind == "done":
+                finished = payload
+        if finished is not None:
+            if finished["error"]:
+                chunks.append(finished["error"])
+            if finished["status"] != "ok":
+                chunks.append(f"\n[{finished['status']}]\n")
+        if chunks:
+            # One insert per poll keeps chatty scripts from flooding the widget
+            output_text.config(state='normal')
+            output_text.insert(tk.END, "".join(chunks))
+            output_text.see(tk.END)
+            output_text.config(state='disabled')
+        if finished is None:
+            window.after(poll_ms, poll)
+        elif on_done is not None:
+            on_done(finished)
+
+    window.after(poll_ms, poll)
+    return job
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        _serve(sys.argv[2:])
+    else:
+        print("usage: script_worker.py --serve [module ...]  (started by ScriptRunner)", file=sys.stderr)
+        sys.exit(2)
@@ -1,37 +1,37 @@
 import tkinter as tk
 from tkinter import filedialog
-import subprocess
-from PIL import Image, ImageTk
+from PIL import ImageTk
+
+from preview_cache import PreviewCache
+from script_worker import ScriptRunner, run_in_text_widget
 
 
 def run_script():
     script_path = script_entry.get()
     if script_path:
-        result = subprocess.run(['python', script_path],
-                                capture_output=True, text=True)
-        output_text.config(state='normal')
-        output_text.delete('1.0', tk.END)
-        output_text.insert(tk.END, result.stdout)
-        output_text.config(state='disabled')
-
-        # Check if result images exist
-        try:
-            image_path1 = "result_image.jpg"
-            image1 = Image.open(image_path1)
-            image1.thumbnail((300, 300))  # Resize image if necessary
-            photo1 = ImageTk.PhotoImage(image1)
-            image_label1.config(image=photo1)
-            image_label1.image = photo1  # Keep reference to prevent garbage collection
-
-            image_path2 = "Original_Image.jpg"
-            image2 = Image.open(image_path2)
-            image2.thumbnail((300, 300))  # Resize image if necessary
-            photo2 = ImageTk.PhotoImage(image2)
-            image_label2.config(image=photo2)
-            image_label2.image = photo2  # Keep reference to prevent garbage collection
-        except FileNotFoundError:
-            image_label1.config(image=None)
-            image_label2.config(image=None)
+        # Runs on the warm worker process; output streams in while the window stays responsive
+        run_in_text_widget(window, runner, script_path, output_text,
+                           on_done=show_results)
+
+
+def show_results(info):
+    # Check if result images exist
+    try:
+        image_path1 = "result_image.jpg"
+        # Decoded at thumbnail size and reused until the file changes
+        image1 = previews.get(image_path1, (300, 300))
+        photo1 = ImageTk.PhotoImage(image1)
+        image_label1.config(image=photo1)
+        image_label1.image = photo1  # Keep reference to prevent garbage collection
+
+        image_path2 = "Original_Image.jpg"
+        image2 = previews.get(image_path2, (300, 300))
+        photo2 = ImageTk.PhotoImage(image2)
+        image_label2.config(image=photo2)
+        image_label2.image = photo2  # Keep reference to prevent garbage collection
+    except FileNotFoundError:
+        image_label1.config(image=None)
+        image_label2.config(image=None)
 
 
 def browse_script():
@@ -42,9 +42,23 @@ def browse_script():
         script_entry.insert(tk.END, file_path)
 
 
+def cancel_script():
+    runner.cancel()
+
+
+def close_window():
+    runner.stop()
+    window.destroy()
+
+
 # Create the main window
 window = tk.Tk()
 window.title("Python Script Runner")
+window.protocol("WM_DELETE_WINDOW", close_window)
+
+# Worker process that keeps cv2 and numpy imported between runs; starts warming up now
+runner = ScriptRunner().start()
+previews = PreviewCache()
 
 # Script path entry
 script_label = tk.Label(window, text="Script Path:")
@@ -57,6 +71,8 @@ browse_button.grid(row=0, column=2, padx=5, pady=5)
 # Run button
 run_button = tk.Button(window, text="Run Script", command=run_script)
 run_button.grid(row=1, column=2, pady=10)
+cancel_button = tk.Button(window, text="Cancel", command=cancel_script)
+cancel_button.grid(row=1, column=1, sticky="e", pady=10)
 
 # Output text area
 output_label = tk.Label(window, text="Output:")
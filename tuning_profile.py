@@ -0,0 +1,106 @@
+"""Detection parameters as a JSON profile, written by param_tuner.py and loaded with --profile.
+
+A profile holds any subset of DEFAULT_PROFILE; missing keys keep their defaults,
+so profiles stay valid when new parameters are added.
+"""
+import json
+
+DEFAULT_PROFILE = {
+    # "otsu" thresholds the gray image; "hsv" keeps the pixels inside hsv_lower..hsv_upper
+    "segmentation": "otsu",
+    "threshold": 0,  # Fixed gray level for "otsu" segmentation; 0 lets Otsu pick it per frame
+    "dark_fruit": True,  # Fruit darker than the tray; False for bright fruit on a dark tray
+    "hsv_lower": [10, 14, 128],
+    "hsv_upper": [33, 238, 255],
+    "morph_kernel": 3,
+    "min_region_area": 100,
+    "blur_kernel": 15,
+    "hough_min_dist": 30,
+    "hough_param1": 50,
+    "hough_param2": 30,
+    "min_radius": 10,
+    "max_radius": 60,
+}
+
+# Allowed (minimum, maximum) of each numeric parameter; None for no upper bound
+_RANGES = {
+    "threshold": (0, 255),
+    "morph_kernel": (1, None),
+    "min_region_area": (0, None),
+    "blur_kernel": (1, None),
+    "hough_min_dist": (1, None),
+    "hough_param1": (1, None),
+    "hough_param2": (1, None),
+    "min_radius": (0, None),
+    "max_radius": (1, None),
+}
+# OpenCV 8-bit HSV: hue is 0..179, saturation and value 0..255
+_HSV_MAX = (179, 255, 255)
+# OpenCV takes these as doubles; everything else must be a whole number of pixels or levels
+_REAL = ("hough_min_dist", "hough_param1", "hough_param2")
+
+# Parameters measured in pixels, and how they change when the image is scaled by s
+_LENGTHS = ("morph_kernel", "blur_kernel", "hough_min_dist", "min_radius", "max_radius")
+
+
+def make_profile(overrides=None):
+    """DEFAULT_PROFILE updated with overrides; raises ValueError on unknown keys or values."""
+    profile = {key: list(value) if isinstance(value, list) else value for key, value in DEFAULT_PROFILE.items()}
+    overrides = {} if overrides is None else overrides
+    if not isinstance(overrides, dict):
+        raise ValueError(f"A profile must be a JSON object of parameters, not {type(overrides).__name__}")
+    unknown = set(overrides) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown profile parameters: {sorted(unknown)}")
+    profile.update(overrides)
+    if profile["segmentation"] not in ("otsu", "hsv"):
+        raise ValueError(f"segmentation must be 'otsu' or 'hsv', not {profile['segmentation']!r}")
+    if not isinstance(profile["dark_fruit"], bool):
+        raise ValueError("dark_fruit must be true or false")
+    for key, (minimum, maximum) in _RANGES.items():
+        _check_number(key, profile[key], minimum, maximum, real=key in _REAL)
+    for key in ("hsv_lower", "hsv_upper"):
+        value = profile[key]
+        if not isinstance(value, (list, tuple)) or len(value) != 3:
+            raise ValueError(f"{key} must be a list of 3 values (H, S, V), not {value!r}")
+        for channel, (item, maximum) in zip("HSV", zip(value, _HSV_MAX)):
+            _check_number(f"{key} {channel}", item, 0, maximum)
+        profile[key] = list(value)
+    if profile["blur_kernel"] % 2 == 0:
+        raise ValueError("blur_kernel must be odd")
+    if profile["min_radius"] > profile["max_radius"]:
+        raise ValueError("min_radius must not exceed max_radius")
+    return profile
+
+
+def _check_number(name, value, minimum, maximum=None, real=False):
+    # bool is an int subclass, but true/false in a profile is never meant as a number
+    kinds = (int, float) if real else int
+    if isinstance(value, bool) or not isinstance(value, kinds):
+        raise ValueError(f"{name} must be {'a number' if real else 'an integer'}, not {value!r}")
+    if value < minimum or (maximum is not None and value > maximum):
+        bound = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+        raise ValueError(f"{name} must be {bound}, not {value!r}")
+
+
+def load_profile(path):
+    with open(path) as f:
+        return make_profile(json.load(f))
+
+
+def save_profile(path, profile):
+    # Only what differs from the defaults, so the file shows what was actually tuned
+    changed = {key: value for key, value in make_profile(profile).items() if DEFAULT_PROFILE[key] != value}
+    with open(path, "w") as f:
+        json.dump(changed, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def scaled_profile(profile, scale):
+    """The profile for an image resized by scale, e.g. a downscaled preview."""
+    scaled = dict(profile)
+    for key in _LENGTHS:
+        scaled[key] = max(1, int(round(profile[key] * scale)))
+    scaled["blur_kernel"] |= 1  # GaussianBlur needs an odd size
+    scaled["min_region_area"] = int(profile["min_region_area"] * scale * scale)
+    return scaled